@@ -3,7 +3,7 @@ bl_info = {
     "author": "ousttrue",
     "version": (0, 1),
     "blender": (2, 83, 0),
-    "location": "File > Export > yup gltf-2.0(.gltf)",
+    "location": "File > Import-Export > yup gltf-2.0(.gltf)",
     "description": "yup gltf exporter",
     "warning": "",
     "support": "COMMUNITY",
@@ -12,75 +12,38 @@ bl_info = {
     "category": "Import-Export",
 }
 
-if "bpy" in locals():
+if "operators" in locals():
     import importlib
 
+    importlib.reload(operators)  # type: ignore
     if "yup" in locals():
         importlib.reload(yup)  # type: ignore
 
-import bpy
-from bpy.props import BoolProperty
-from bpy.props import EnumProperty
-from bpy.props import StringProperty
 
-
-class ExportYUP(bpy.types.Operator):
-    """Export selection to YUP"""
-
-    bl_idname = "export_scene.yup"
-    bl_label = "Export YUP GLTF"
-
-    filepath = StringProperty(subtype="FILE_PATH")
-
-    # Export options
-
-    selectedonly = BoolProperty(
-        name="Export Selected Objects Only",
-        description="Export only selected objects",
-        default=True,
-    )
-
-    def execute(self, context):
-        import os
-        import pathlib
-
-        ext = os.path.splitext(self.filepath)[1].lower()
-        if ext != ".gltf" and ext != ".glb":
-            self.filepath = bpy.path.ensure_ext(self.filepath, ".gltf")
-        path = pathlib.Path(self.filepath).absolute()
-
-        from . import yup
-
-        yup.export(path, self.selectedonly)
-
-        return {"FINISHED"}
-
-    def invoke(self, context, event):
-        if not self.filepath:
-            self.filepath = bpy.path.ensure_ext(bpy.data.filepath, ".gltf")
-        context.window_manager.fileselect_add(self)
-        return {"RUNNING_MODAL"}
-
-
-def menu_func(self, context):
-    self.layout.operator(ExportYUP.bl_idname, text="YUP GLTF (.gltf)")
-
-
-CLASSES = [ExportYUP]
+# bpy is imported lazily, so the bpy independent backend
+# (scene, to_gltf, writer) can be imported outside of blender.
 
 
 def register():
-    for c in CLASSES:
+    import bpy
+    from . import operators
+
+    for c in operators.CLASSES:
         bpy.utils.register_class(c)
 
-    bpy.types.TOPBAR_MT_file_export.append(menu_func)
+    bpy.types.TOPBAR_MT_file_export.append(operators.menu_func)
+    bpy.types.TOPBAR_MT_file_import.append(operators.menu_func_import)
 
 
 def unregister():
-    for c in CLASSES:
+    import bpy
+    from . import operators
+
+    for c in operators.CLASSES:
         bpy.utils.unregister_class(c)
 
-    bpy.types.TOPBAR_MT_file_export.remove(menu_func)
+    bpy.types.TOPBAR_MT_file_export.remove(operators.menu_func)
+    bpy.types.TOPBAR_MT_file_import.remove(operators.menu_func_import)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,208 @@
+'''
+pack small, non-repeating color textures into power-of-two atlases.
+
+a texture does not repeat if its wrap is not REPEAT(Image.repeat),
+or if the uvs of every primitive that samples it stay within the unit square.
+the atlases are sampled with CLAMP_TO_EDGE.
+'''
+from typing import List, Dict, Tuple, Optional, NamedTuple
+import numpy as np
+
+from .scene import Scene, Image, Material, Mesh
+from . import gltf
+
+# uvs this far outside of the unit square still count as inside
+UV_EPSILON = 1e-4
+
+
+class Placement(NamedTuple):
+    atlas: int
+    # pixel rect in the atlas, bottom-up rows like Image.pixels
+    x: int
+    y: int
+
+
+class AtlasResult(NamedTuple):
+    images: int
+    atlases: int
+    materials: int
+    atlas_materials: int
+
+
+def next_power_of_two(n: int)->int:
+    return 1 << max(0, n - 1).bit_length()
+
+
+def pack(sizes: List[Tuple[int, int]], atlas_size: int)->Tuple[List[Placement], List[Tuple[int, int]]]:
+    '''
+    shelf packer. tall rects first.
+
+    sizes: (width, height) including padding
+    return: placement of each rect and the (width, height) of each atlas
+    '''
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    placements: List[Optional[Placement]] = [None] * len(sizes)
+    atlases: List[Tuple[int, int]] = []
+    atlas = -1
+    x = y = shelf_height = 0
+    for i in order:
+        w, h = sizes[i]
+        if atlas < 0 or x + w > atlas_size:
+            # next shelf
+            x = 0
+            y += shelf_height
+            shelf_height = h
+            if atlas < 0 or y + h > atlas_size:
+                # next atlas
+                atlas += 1
+                atlases.append((0, 0))
+                y = 0
+        placements[i] = Placement(atlas, x, y)
+        used_w, used_h = atlases[atlas]
+        atlases[atlas] = (max(used_w, x + w), max(used_h, y + h))
+        x += w
+    return placements, [(next_power_of_two(w), next_power_of_two(h)) for w, h in atlases]  # type: ignore
+
+
+def get_uvs_inside(scene: Scene)->Dict[Material, bool]:
+    '''
+    material => the uvs of all its primitives are within the unit square
+    '''
+    inside: Dict[Material, bool] = {}
+    for mesh in scene.meshes:
+        for submesh in mesh.submeshes:
+            if not submesh.material:
+                continue
+            result = True
+            if mesh.uvs is not None and len(submesh.indices):
+                # uv is stored as (u, -v)
+                uvs = mesh.uvs[np.unique(submesh.indices)] * (1, -1)
+                result = bool(np.all((uvs >= -UV_EPSILON) & (uvs <= 1 + UV_EPSILON)))
+            inside[submesh.material] = inside.get(submesh.material, True) and result
+    return inside
+
+
+def is_atlas_target(material: Optional[Material], max_texture_size: int, uvs_inside: bool=False)->bool:
+    '''
+    a color texture without normal map, not larger than max_texture_size,
+    not repeating or repeating with all uvs inside the unit square
+    '''
+    if not material or not material.color_texture or material.normal_texture:
+        return False
+    image = material.color_texture
+    if image.repeat and not uvs_inside:
+        return False
+    return max(image.width, image.height) <= max_texture_size
+
+
+def remap_mesh_uvs(mesh: Mesh, rects: Dict[Material, np.ndarray]):
+    '''
+    rects: material => (u offset, v offset, u scale, v scale) in blender uv space
+
+    vertices shared with other submeshes are duplicated before remapping.
+    '''
+    if mesh.uvs is None:
+        return
+
+    # owner submesh of each vertex. -2 for shared
+    owners = np.full(mesh.vertex_count, -1, dtype=np.int64)
+    for i, submesh in enumerate(mesh.submeshes):
+        used = np.unique(submesh.indices)
+        owner = owners[used]
+        owners[used] = np.where((owner == -1) | (owner == i), i, -2)
+
+    for i, submesh in enumerate(mesh.submeshes):
+        if submesh.material not in rects:
+            continue
+        used = np.unique(submesh.indices)
+        shared = used[owners[used] == -2]
+        if len(shared):
+            # duplicate
+            remap = np.arange(mesh.vertex_count, dtype=np.int64)
+            remap[shared] = np.arange(mesh.vertex_count, mesh.vertex_count + len(shared))
+            mesh.positions = np.concatenate([mesh.positions, mesh.positions[shared]])
+            mesh.normals = np.concatenate([mesh.normals, mesh.normals[shared]])
+            mesh.uvs = np.concatenate([mesh.uvs, mesh.uvs[shared]])
+            if mesh.joints is not None:
+                mesh.joints = np.concatenate([mesh.joints, mesh.joints[shared]])
+            if mesh.weights is not None:
+                mesh.weights = np.concatenate([mesh.weights, mesh.weights[shared]])
+            if mesh.morph_targets is not None:
+                mesh.morph_targets = np.concatenate([mesh.morph_targets, mesh.morph_targets[:, shared]], axis=1)
+            owners = np.concatenate([owners, np.full(len(shared), i, dtype=np.int64)])
+            submesh.indices = remap[submesh.indices].astype(submesh.indices.dtype)
+            used = np.unique(submesh.indices)
+
+        # uv is stored as (u, -v), see Vector2_from_faceUV
+        u_offset, v_offset, u_scale, v_scale = rects[submesh.material]
+        uvs = mesh.uvs[used]
+        u = np.clip(uvs[:, 0], 0, 1)
+        v = np.clip(-uvs[:, 1], 0, 1)
+        mesh.uvs[used, 0] = u_offset + u * u_scale
+        mesh.uvs[used, 1] = -(v_offset + v * v_scale)
+
+
+def create_atlases(scene: Scene,
+                   atlas_size: int=2048, max_texture_size: int=512, padding: int=2)->AtlasResult:
+    '''
+    replace the color texture of simple materials(no normal map, non-repeating small texture, see is_atlas_target)
+    with atlases, rewrite the uvs of their primitives,
+    and merge materials that end up on the same atlas with the same alpha mode.
+    '''
+    max_texture_size = min(max_texture_size, atlas_size - padding * 2)
+    uvs_inside = get_uvs_inside(scene)
+    materials: List[Material] = []
+    for mesh in scene.meshes:
+        for submesh in mesh.submeshes:
+            material = submesh.material
+            if material not in materials and is_atlas_target(
+                    material, max_texture_size, uvs_inside.get(material, False)):  # type: ignore
+                materials.append(material)  # type: ignore
+    images: List[Image] = []
+    for material in materials:
+        if material.color_texture not in images:
+            images.append(material.color_texture)  # type: ignore
+    if len(images) < 2:
+        return AtlasResult(len(images), 0, len(materials), len(materials))
+
+    placements, atlas_sizes = pack(
+        [(image.width + padding * 2, image.height + padding * 2) for image in images], atlas_size)
+
+    atlases: List[Image] = []
+    for i, (width, height) in enumerate(atlas_sizes):
+        atlases.append(Image(f'atlas{i}', np.zeros((height, width, 4), dtype=np.float32), repeat=False))
+    image_rects: Dict[Image, Tuple[int, np.ndarray]] = {}
+    for image, placement in zip(images, placements):
+        atlas = atlases[placement.atlas]
+        # padding repeats the edge texels
+        padded = np.pad(image.pixels, ((padding, padding), (padding, padding), (0, 0)), mode='edge')
+        atlas.pixels[placement.y:placement.y + padded.shape[0],
+                     placement.x:placement.x + padded.shape[1]] = padded
+        image_rects[image] = (placement.atlas, np.array([
+            (placement.x + padding) / atlas.width,
+            (placement.y + padding) / atlas.height,
+            image.width / atlas.width,
+            image.height / atlas.height,
+        ]))
+
+    # one material for each atlas and alpha mode
+    atlas_materials: Dict[Tuple[int, gltf.AlphaMode], Material] = {}
+    replace: Dict[Material, Material] = {}
+    rects: Dict[Material, np.ndarray] = {}
+    for material in materials:
+        atlas_index, rect = image_rects[material.color_texture]  # type: ignore
+        key = (atlas_index, material.alpha_mode)
+        if key not in atlas_materials:
+            atlas_materials[key] = Material(f'atlas{atlas_index}.{material.alpha_mode.value}',
+                                            color_texture=atlases[atlas_index],
+                                            alpha_mode=material.alpha_mode)
+        replace[material] = atlas_materials[key]
+        rects[material] = rect
+
+    for mesh in scene.meshes:
+        remap_mesh_uvs(mesh, rects)
+        for submesh in mesh.submeshes:
+            if submesh.material in replace:
+                submesh.material = replace[submesh.material]  # type: ignore
+
+    return AtlasResult(len(images), len(atlases), len(materials), len(atlas_materials))
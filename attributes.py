@@ -0,0 +1,50 @@
+'''
+which optional vertex attributes a primitive needs, planned from its material.
+
+planned before extraction, so unused uvs neither split vertices at their seams nor get written.
+POSITION and NORMAL are always needed, skinning follows the skin.
+'''
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from .scene import Material
+
+
+class AttributePlan(NamedTuple):
+    # TEXCOORD_0
+    uvs: bool = False
+    # TANGENT
+    tangents: bool = False
+
+    def union(self, other: 'AttributePlan')->'AttributePlan':
+        return AttributePlan(self.uvs or other.uvs, self.tangents or other.tangents)
+
+    def select(self, attributes: Dict[str, int])->Dict[str, int]:
+        '''
+        drop the attributes of a shared set that this primitive does not use
+        '''
+        unused = set()
+        if not self.uvs:
+            unused.add('TEXCOORD_0')
+        if not self.tangents:
+            unused.add('TANGENT')
+        return {semantic: index for semantic, index in attributes.items() if semantic not in unused}
+
+
+def plan_material(material: Optional[Material])->AttributePlan:
+    '''
+    None is the untextured default material
+    '''
+    if not material:
+        return AttributePlan()
+    return AttributePlan(uvs=bool(material.color_texture or material.normal_texture),
+                         tangents=bool(material.normal_texture))
+
+
+def plan_materials(materials: Iterable[Optional[Material]])->AttributePlan:
+    '''
+    what any of materials needs
+    '''
+    plan = AttributePlan()
+    for material in materials:
+        plan = plan.union(plan_material(material))
+    return plan
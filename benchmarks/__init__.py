@@ -0,0 +1,3 @@
+'''
+synthetic-scene benchmarks for the export stages. see run.py
+'''
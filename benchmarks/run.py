@@ -0,0 +1,260 @@
+'''
+time and measure every export stage on synthetic scenes.
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --compare results.json
+
+stages:
+    MeshStore.__init__, freeze: bpy front end, fed with stub bpy data
+    image_to_png: texture encoding
+    push_bytes: packing frozen meshes into BufferManager
+    to_gltf: scene to gltf, for .gltf + .bin and .glb
+    to_json: GLTF.to_json
+    write: writer.write as .gltf + .bin and .glb
+'''
+import argparse
+import importlib
+import json
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+if __name__ == '__main__' and not __package__:
+    # python benchmarks/run.py
+    _here = pathlib.Path(__file__).resolve().parent
+    sys.path.insert(0, str(_here.parent.parent))
+    __package__ = f'{_here.parent.name}.{_here.name}'
+    importlib.import_module(__package__)
+
+from . import stub
+stub.install()
+
+import numpy as np
+
+from .. import scene
+from .. import gltf
+from ..meshstore import MeshStore
+from ..materialstore import MaterialStore, image_to_png
+from ..attributes import plan_materials
+from ..buffermanager import BufferManager
+from ..to_gltf import to_gltf, to_mesh
+from ..writer import write
+from .scenes import CASES, SyntheticScene, SyntheticMesh
+
+STAGES = ['MeshStore.__init__', 'freeze',
+          'image_to_png', 'push_bytes', 'to_gltf', 'to_json', 'write']
+
+
+class StageResult:
+    def __init__(self)->None:
+        self.seconds = 0.0
+        self.peak_bytes = 0
+
+    def to_dict(self)->Dict[str, Any]:
+        return {'seconds': self.seconds, 'peak_bytes': self.peak_bytes}
+
+
+class Recorder:
+    '''
+    accumulate the time(or peak traced memory) of each stage.
+    '''
+
+    def __init__(self, trace_memory: bool)->None:
+        self.trace_memory = trace_memory
+        self.stages: Dict[str, StageResult] = {name: StageResult() for name in STAGES}
+
+    def run(self, stage: str, f: Callable[[], Any])->Any:
+        result = self.stages[stage]
+        if self.trace_memory:
+            tracemalloc.start()
+            value = f()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            result.peak_bytes = max(result.peak_bytes, peak)
+        else:
+            start = time.perf_counter()
+            value = f()
+            result.seconds += time.perf_counter() - start
+        return value
+
+
+def extract(recorder: Recorder, src: SyntheticMesh)->scene.Mesh:
+    '''
+    same as GLTFBuilder.export_mesh
+    '''
+    plan = plan_materials(src.materials)
+    store = recorder.run('MeshStore.__init__', lambda: MeshStore(
+        src.name, src.mesh, src.vertex_groups, src.bone_names, plan.uvs))
+
+    return recorder.run('freeze', lambda: store.freeze(src.materials))
+
+
+def create_skin(dst: scene.Scene, mesh_node: scene.Node, bone_names: List[str])->scene.Skin:
+    parent = mesh_node
+    for bone_name in bone_names[1:]:
+        node = scene.Node(bone_name, parent.position + np.array((1, 0, 0), dtype=np.float32), parent)
+        parent.children.append(node)
+        dst.nodes.append(node)
+        parent = node
+    skin = scene.Skin(mesh_node)
+    dst.skins.append(skin)
+    return skin
+
+
+def build_scene(recorder: Recorder, src: SyntheticScene)->scene.Scene:
+    '''
+    extract the meshes of src into a scene, a root node each
+    '''
+    dst = scene.Scene()
+    for mesh_src in src.meshes:
+        mesh = extract(recorder, mesh_src)
+        # the first joint is the mesh node itself, see to_gltf
+        name = mesh_src.bone_names[0] if mesh_src.bone_names else mesh.name
+        node = scene.Node(name, np.zeros(3, dtype=np.float32), None)
+        node.mesh = mesh
+        dst.nodes.append(node)
+        dst.root_nodes.append(node)
+        dst.meshes.append(mesh)
+        if mesh_src.bone_names:
+            node.skin = create_skin(dst, node, mesh_src.bone_names)
+    return dst
+
+
+def run_scene(src: SyntheticScene, trace_memory: bool, output_dir: pathlib.Path)->Dict[str, StageResult]:
+    recorder = Recorder(trace_memory)
+    dst = build_scene(recorder, src)
+
+    buffer = BufferManager()
+    material_store = MaterialStore()
+    materials: List[scene.Material] = []
+    for mesh in dst.meshes:
+        for submesh in mesh.submeshes:
+            if submesh.material and submesh.material not in materials:
+                materials.append(submesh.material)
+    # MaterialStore encodes each texture with image_to_png
+    recorder.run('image_to_png', lambda: [
+        material_store.get_material_index(material, buffer) for material in materials])
+
+    def push():
+        for node in dst.nodes:
+            if node.mesh:
+                joint_map = scene.SkinTable(node.skin).joint_map if node.skin else {}
+                to_mesh(node.mesh, joint_map, buffer, material_store)
+    recorder.run('push_bytes', push)
+
+    gltf_path = output_dir / f'{src.name}.gltf'
+    gltf_root, buffers = recorder.run('to_gltf', lambda: to_gltf(dst, gltf_path, output_dir / f'{src.name}.bin'))
+    glb_root, glb_buffers = recorder.run('to_gltf', lambda: to_gltf(dst, output_dir / f'{src.name}.glb', None))
+    recorder.run('to_json', gltf_root.to_json)
+
+    def write_files():
+        write(gltf_path, gltf_root, buffers)
+        write(output_dir / f'{src.name}.glb', glb_root, glb_buffers)
+    recorder.run('write', write_files)
+
+    return recorder.stages
+
+
+def git_commit()->Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=pathlib.Path(__file__).parent,
+                                       stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(cases: List[str], scale: float, repeat: int)->Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for name in cases:
+        src = CASES[name](scene, scale)
+        with tempfile.TemporaryDirectory() as tmp:
+            output_dir = pathlib.Path(tmp)
+            # best of repeat
+            timings = [run_scene(src, False, output_dir) for _ in range(repeat)]
+            memory = run_scene(src, True, output_dir)
+        case: Dict[str, Any] = {}
+        for stage in STAGES:
+            case[stage] = {
+                'seconds': min(t[stage].seconds for t in timings),
+                'peak_bytes': memory[stage].peak_bytes,
+            }
+        results[name] = case
+        print_case(name, case)
+
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scale': scale,
+        'repeat': repeat,
+        'cases': results,
+    }
+
+
+def print_case(name: str, case: Dict[str, Any]):
+    print(f'{name}:')
+    for stage in STAGES:
+        r = case[stage]
+        print(f'  {stage:20} {r["seconds"] * 1000:10.2f} ms {r["peak_bytes"] / 1024 / 1024:10.2f} MiB')
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float)->List[str]:
+    '''
+    return the stages slower than baseline by more than threshold(ratio)
+    '''
+    regressions: List[str] = []
+    print(f'compare with {baseline.get("commit")}')
+    for name, case in current['cases'].items():
+        if name not in baseline['cases']:
+            continue
+        for stage, r in case.items():
+            base = baseline['cases'][name].get(stage)
+            if not base or base['seconds'] <= 0:
+                continue
+            ratio = r['seconds'] / base['seconds']
+            memory_ratio = r['peak_bytes'] / base['peak_bytes'] if base['peak_bytes'] else 1.0
+            mark = ''
+            if ratio > 1 + threshold:
+                mark = ' <- slower'
+                regressions.append(f'{name}.{stage}')
+            print(f'  {name}.{stage:20} time x{ratio:6.2f} memory x{memory_ratio:6.2f}{mark}')
+    return regressions
+
+
+def main(argv: Optional[List[str]]=None)->int:
+    parser = argparse.ArgumentParser(description='yup export stage benchmarks')
+    parser.add_argument('--case', action='append', choices=list(CASES.keys()),
+                        help='run only these cases. default all')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='scene size factor')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='take the best time of repeat runs')
+    parser.add_argument('--output', type=pathlib.Path,
+                        help='write results as json')
+    parser.add_argument('--compare', type=pathlib.Path,
+                        help='compare with the json of a previous run')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='time ratio over baseline reported as regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.case or list(CASES.keys()), args.scale, args.repeat)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if compare(baseline, results, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+'''
+parameterized synthetic scenes built from stub bpy data.
+'''
+from typing import List, NamedTuple, Optional, Any, Callable, Dict
+import numpy as np
+
+from .stub import MeshVertex, VertexGroup, VertexGroupElement, PropCollection, MeshUVLoopLayer, Mesh
+
+
+class SyntheticMesh(NamedTuple):
+    name: str
+    mesh: Mesh
+    vertex_groups: List[VertexGroup]
+    bone_names: List[str]
+    materials: List[Any]  # scene.Material
+
+
+class SyntheticScene(NamedTuple):
+    name: str
+    meshes: List[SyntheticMesh]
+    images: List[Any]  # scene.Image
+    bone_count: int
+
+
+def create_grid(scene_module: Any, name: str, n: int,
+                uv_seams: bool=False,
+                materials: Optional[List[Any]]=None,
+                bone_count: int=0)->SyntheticMesh:
+    '''
+    n x n quads on a wavy plane, two loop triangles each.
+
+    uv_seams: every quad has its own uv island, so no face vertex is shared.
+    bone_count: every vertex is weighted to the two nearest of bone_count bones along x.
+    '''
+    rows = np.arange(n + 1, dtype=np.float32)
+    x, y = np.meshgrid(rows, rows)
+    x = x.ravel()
+    y = y.ravel()
+    z = np.sin(x * 0.1) * np.cos(y * 0.1)
+    vertex_count = len(x)
+
+    bone_names = [f'{name}.bone{i}' for i in range(bone_count)]
+    vertex_groups = [VertexGroup(bone_name) for bone_name in bone_names]
+
+    items: List[MeshVertex] = []
+    if bone_count:
+        for i in range(vertex_count):
+            t = x[i] / max(n, 1) * (bone_count - 1)
+            b0 = int(t)
+            b1 = min(b0 + 1, bone_count - 1)
+            w1 = float(t - b0)
+            groups = [VertexGroupElement(b0, 1.0 - w1)]
+            if b1 != b0 and w1 > 0:
+                groups.append(VertexGroupElement(b1, w1))
+            items.append(MeshVertex(groups))
+    up = np.zeros((vertex_count, 3), dtype=np.float32)
+    up[:, 2] = 1
+    vertices = PropCollection(vertex_count, {
+        'co': np.stack([x, y, z], axis=1).astype(np.float32),
+        'normal': up,
+    }, items)
+
+    if not materials:
+        materials = [None]
+
+    # quad loops
+    j, i = np.meshgrid(np.arange(n), np.arange(n), indexing='ij')
+    v0 = (j * (n + 1) + i).ravel()
+    quads = np.stack([v0, v0 + 1, v0 + n + 2, v0 + n + 1], axis=1).astype(np.int32)
+    quad_count = len(quads)
+    loop_vertices = quads.ravel()
+    loops = PropCollection(len(loop_vertices), {'vertex_index': loop_vertices})
+
+    quad_loops = np.arange(quad_count * 4, dtype=np.int32).reshape(-1, 4)
+    triangle_loops = np.stack([quad_loops[:, [0, 1, 2]], quad_loops[:, [0, 2, 3]]], axis=1).reshape(-1, 3)
+    quad_materials = np.arange(quad_count, dtype=np.int32) % len(materials)
+    triangle_count = len(triangle_loops)
+    triangle_normals = np.zeros((triangle_count, 3), dtype=np.float32)
+    triangle_normals[:, 2] = 1
+    loop_triangles = PropCollection(triangle_count, {
+        'vertices': loop_vertices[triangle_loops],
+        'loops': triangle_loops,
+        'material_index': np.repeat(quad_materials, 2),
+        'use_smooth': np.ones(triangle_count, dtype=np.bool_),
+        'normal': triangle_normals,
+    })
+
+    if uv_seams:
+        quad_uvs = np.array([(0, 0), (1, 0), (1, 1), (0, 1)], dtype=np.float32)
+        uvs = np.tile(quad_uvs, (quad_count, 1))
+    else:
+        uvs = np.stack([x / n, y / n], axis=1).astype(np.float32)[loop_vertices]
+    uv_layer = MeshUVLoopLayer(PropCollection(len(uvs), {'uv': uvs}))
+
+    mesh = Mesh(name, vertices, loops, loop_triangles, uv_layer, materials)
+    return SyntheticMesh(name, mesh, vertex_groups, bone_names, materials)
+
+
+def create_image(scene_module: Any, name: str, size: int)->Any:
+    rng = np.random.default_rng(len(name))
+    # smooth gradient with some noise, compresses like a real texture
+    u = np.linspace(0, 1, size, dtype=np.float32)
+    pixels = np.empty((size, size, 4), dtype=np.float32)
+    pixels[:, :, 0] = u[np.newaxis, :]
+    pixels[:, :, 1] = u[:, np.newaxis]
+    pixels[:, :, 2] = rng.random((size, size), dtype=np.float32) * 0.1
+    pixels[:, :, 3] = 1.0
+    return scene_module.Image(name, pixels)
+
+
+def dense(scene_module: Any, scale: float)->SyntheticScene:
+    n = int(256 * scale)
+    return SyntheticScene('dense', [create_grid(scene_module, 'dense', n)], [], 0)
+
+
+def uv_seams(scene_module: Any, scale: float)->SyntheticScene:
+    n = int(128 * scale)
+    return SyntheticScene('uv_seams', [create_grid(scene_module, 'uv_seams', n, uv_seams=True)], [], 0)
+
+
+def many_objects(scene_module: Any, scale: float)->SyntheticScene:
+    count = int(500 * scale)
+    return SyntheticScene('many_objects',
+                          [create_grid(scene_module, f'prop{i}', 4) for i in range(count)], [], 0)
+
+
+def skinned(scene_module: Any, scale: float, bone_count: int=64)->SyntheticScene:
+    n = int(128 * scale)
+    return SyntheticScene('skinned',
+                          [create_grid(scene_module, 'skinned', n, bone_count=bone_count)], [], bone_count)
+
+
+def materials(scene_module: Any, scale: float, material_count: int=32, texture_size: int=256)->SyntheticScene:
+    size = max(4, int(texture_size * scale))
+    images = [create_image(scene_module, f'texture{i}', size)
+              for i in range(material_count)]
+    mats = [scene_module.Material(f'material{i}', color_texture=image)
+            for i, image in enumerate(images)]
+    n = int(64 * scale)
+    return SyntheticScene('materials',
+                          [create_grid(scene_module, 'materials', n, materials=mats)], images, 0)
+
+
+CASES: Dict[str, Callable[[Any, float], SyntheticScene]] = {
+    'dense': dense,
+    'uv_seams': uv_seams,
+    'many_objects': many_objects,
+    'skinned': skinned,
+    'materials': materials,
+}
@@ -0,0 +1,118 @@
+'''
+minimal bpy and mathutils stand-in, enough for the extraction stages(MeshStore) to run without blender.
+'''
+import sys
+import types
+from typing import List, Any, Dict, Optional
+import numpy as np
+
+
+class Vector:
+    __slots__ = ('x', 'y', 'z')
+
+    def __init__(self, values)->None:
+        values = tuple(values) + (0.0, 0.0, 0.0)
+        self.x = values[0]
+        self.y = values[1]
+        self.z = values[2]
+
+    def __getitem__(self, i: int)->float:
+        return (self.x, self.y, self.z)[i]
+
+    def __len__(self)->int:
+        return 3
+
+
+class VertexGroupElement:
+    __slots__ = ('group', 'weight')
+
+    def __init__(self, group: int, weight: float)->None:
+        self.group = group
+        self.weight = weight
+
+
+class MeshVertex:
+    __slots__ = ('groups',)
+
+    def __init__(self, groups: List[VertexGroupElement])->None:
+        self.groups = groups
+
+
+class PropCollection:
+    '''
+    bpy_prop_collection backed by numpy arrays.
+    items: the elements for iteration, if any
+    '''
+
+    def __init__(self, count: int, attributes: Dict[str, np.ndarray], items: Optional[List[Any]]=None)->None:
+        self.count = count
+        self.attributes = attributes
+        self.items = items if items is not None else []
+
+    def __len__(self)->int:
+        return self.count
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def foreach_get(self, attr: str, values: np.ndarray):
+        values[:] = self.attributes[attr].ravel()
+
+
+class MeshUVLoopLayer:
+    def __init__(self, data: PropCollection)->None:
+        self.data = data
+
+
+class UVLoopLayers:
+    def __init__(self, active: Optional[MeshUVLoopLayer])->None:
+        self.active = active
+
+
+class Mesh:
+    def __init__(self, name: str,
+                 vertices: PropCollection,
+                 loops: PropCollection,
+                 loop_triangles: PropCollection,
+                 uv_layer: Optional[MeshUVLoopLayer],
+                 materials: List[Any])->None:
+        self.name = name
+        self.vertices = vertices
+        self.loops = loops
+        self.loop_triangles = loop_triangles
+        self.uv_layers = UVLoopLayers(uv_layer)
+        self.materials = materials
+        self.use_auto_smooth = False
+
+    def calc_loop_triangles(self):
+        pass
+
+
+class VertexGroup:
+    __slots__ = ('name',)
+
+    def __init__(self, name: str)->None:
+        self.name = name
+
+
+def install():
+    '''
+    register stub modules as bpy and mathutils. do nothing inside blender.
+    '''
+    if 'bpy' in sys.modules:
+        return
+
+    mathutils = types.ModuleType('mathutils')
+    mathutils.Vector = Vector  # type: ignore
+    mathutils.Matrix = object  # type: ignore
+
+    bpy = types.ModuleType('bpy')
+    bpy_types = types.ModuleType('bpy.types')
+    for name in ['Object', 'Mesh', 'MeshVertex', 'VertexGroup', 'Material',
+                 'Image', 'Bone', 'Operator']:
+        setattr(bpy_types, name, object)
+    bpy.types = bpy_types  # type: ignore
+
+    sys.modules['mathutils'] = mathutils
+    sys.modules['bpy'] = bpy
+    sys.modules['bpy.types'] = bpy_types
@@ -1,17 +1,96 @@
-from typing import Optional, List
+import contextlib
+from typing import Optional, List, Iterator
+import numpy as np
 from . import gltf
 from .binarybuffer import BinaryBuffer
 
 
+# BufferManager.partition
+PARTITIONS = ['single', 'mesh', 'texture', 'size']
+
+
 class BufferManager:
-    def __init__(self):
+    '''
+    partition:
+        single: one buffer
+        mesh: one buffer per mesh, the rest in the first buffer
+        texture: one buffer per texture set(textures of a material), the rest in the first buffer
+        size: start a new buffer when a view would exceed max_size
+    '''
+
+    def __init__(self, partition: str='single', max_size: int=0):
+        if partition not in PARTITIONS:
+            raise ValueError(f'unknown partition: {partition}')
+        self.partition = partition
+        self.max_size = max_size
         self.views: List[gltf.GLTFBufferView] = []
         self.accessors: List[gltf.GLTFAccessor] = []
-        self.buffer = BinaryBuffer(0)
+        self.buffers: List[BinaryBuffer] = [BinaryBuffer(0)]
+        # buffer of views outside of groups
+        self.default_index = 0
+        # buffer of the open group. -1 until its first view
+        self.group_index: Optional[int] = None
+
+    @property
+    def buffer(self)->BinaryBuffer:
+        '''
+        first buffer
+        '''
+        return self.buffers[0]
+
+    @property
+    def byte_length(self)->int:
+        return sum(len(b.data) for b in self.buffers)
+
+    @contextlib.contextmanager
+    def group(self, kind: str)->Iterator[None]:
+        '''
+        kind: 'mesh' or 'texture'.
+        if the partition is kind, views in the block share a buffer of their own.
+        otherwise they go to the default buffer, even inside a group of the other kind
+        '''
+        outer = self.group_index
+        self.group_index = -1 if kind == self.partition else None
+        try:
+            yield
+        finally:
+            self.group_index = outer
+
+    def get_buffer(self, size: int)->BinaryBuffer:
+        if self.group_index is not None:
+            if self.group_index < 0:
+                self.group_index = self.get_empty_buffer()
+            return self.buffers[self.group_index]
+
+        buffer = self.buffers[self.default_index]
+        if self.partition == 'size' and self.max_size and buffer.data \
+                and len(buffer.data) + size > self.max_size:
+            self.default_index = self.get_empty_buffer()
+            buffer = self.buffers[self.default_index]
+        return buffer
+
+    def get_empty_buffer(self)->int:
+        index = len(self.buffers)
+        self.buffers.append(BinaryBuffer(index))
+        return index
+
+    def compact(self)->List[BinaryBuffer]:
+        '''
+        drop empty buffers and renumber the views. call after the last view
+        '''
+        buffers = [b for b in self.buffers if b.data] or self.buffers[:1]
+        index_map = {b.index: i for i, b in enumerate(buffers)}
+        for i, view in enumerate(self.views):
+            self.views[i] = view._replace(buffer=index_map[view.buffer])
+        for i, b in enumerate(buffers):
+            b.index = i
+        self.buffers = buffers
+        self.default_index = 0
+        return buffers
 
     def add_view(self, name: str, data: bytes)->int:
         view_index = len(self.views)
-        view = self.buffer.add_values(name, data)
+        view = self.get_buffer(len(data)).add_values(name, data)
         self.views.append(view)
         return view_index
 
@@ -38,3 +117,32 @@ class BufferManager:
         )
         self.accessors.append(accessor)
         return accessor_index
+
+    def push_array(self, name: str,
+                   values: np.ndarray,
+                   min: Optional[List[float]]=None,
+                   max: Optional[List[float]]=None)->int:
+        '''
+        values: (count,) or (count, element...)
+        '''
+        componentType = gltf.dtype_to_componentType(
+            values.dtype.kind, values.dtype.itemsize)
+        element_count = int(np.prod(values.shape[1:]))
+        # append view
+        view_index = self.add_view(name, np.ascontiguousarray(
+            values, dtype=values.dtype.newbyteorder('<')).tobytes())
+
+        # append accessor
+        accessor_index = len(self.accessors)
+        accessor = gltf.GLTFAccessor(
+            name=name,
+            bufferView=view_index,
+            byteOffset=0,
+            componentType=componentType,
+            type=gltf.accessortype_from_elementCount(element_count),
+            count=len(values),
+            min=min,
+            max=max
+        )
+        self.accessors.append(accessor)
+        return accessor_index
@@ -0,0 +1,135 @@
+'''
+split large submeshes into spatially compact chunks, so clients can frustum cull them.
+
+triangles are sorted by the morton code of their centroid,
+so every octree cell is a consecutive range of the sorted triangles.
+'''
+from typing import List, Tuple, NamedTuple, Optional
+import numpy as np
+
+from .merge import UINT16_MAX_VERTICES
+
+# quantization bits per axis. 3 * 10 bits fit uint32
+MORTON_BITS = 10
+
+
+class Chunk(NamedTuple):
+    # mesh vertex index of each chunk vertex
+    vertices: np.ndarray
+    # chunk local indices. uint16 if they fit
+    indices: np.ndarray
+
+
+def _spread_bits(values: np.ndarray)->np.ndarray:
+    '''
+    insert 2 zero bits after each bit
+    '''
+    spread = np.zeros(len(values), dtype=np.uint32)
+    for bit in range(MORTON_BITS):
+        spread |= ((values >> bit) & 1) << (3 * bit)
+    return spread
+
+
+# quantized coordinate => spread bits
+SPREAD_TABLE = _spread_bits(np.arange(1 << MORTON_BITS, dtype=np.uint32))
+
+
+def morton_codes(points: np.ndarray)->np.ndarray:
+    '''
+    points: (n, 3)
+    return uint32 (n,). codes in the bounding box of points
+    '''
+    lower = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - lower, 1e-30)
+    scale = (1 << MORTON_BITS) - 1
+    q = ((points - lower) * (scale / extent)).astype(np.int32)
+    np.clip(q, 0, scale, out=q)
+    return SPREAD_TABLE[q[:, 0]] | (SPREAD_TABLE[q[:, 1]] << 1) | (SPREAD_TABLE[q[:, 2]] << 2)
+
+
+def split_octree(codes: np.ndarray, max_triangles: int)->List[Tuple[int, int]]:
+    '''
+    codes: sorted morton codes
+    return [begin, end) ranges of the octree cells that hold max_triangles or less, in morton order.
+    triangles that share a leaf cell are cut into consecutive ranges
+    '''
+    ranges: List[Tuple[int, int]] = []
+    stack = [(0, len(codes), 0)]
+    while stack:
+        begin, end, level = stack.pop()
+        if end - begin <= max_triangles:
+            ranges.append((begin, end))
+            continue
+        if level == MORTON_BITS:
+            ranges.extend((i, min(i + max_triangles, end))
+                          for i in range(begin, end, max_triangles))
+            continue
+
+        # 8 child cells
+        shift = 3 * (MORTON_BITS - level - 1)
+        cell = int(codes[begin]) >> (shift + 3) << (shift + 3)
+        bounds = np.searchsorted(
+            codes[begin:end], cell + (np.arange(1, 8, dtype=np.int64) << shift)) + begin
+        edges = [begin] + bounds.tolist() + [end]
+        for child_begin, child_end in reversed(list(zip(edges[:-1], edges[1:]))):
+            if child_begin < child_end:
+                stack.append((child_begin, child_end, level + 1))
+    return ranges
+
+
+def split_submesh(positions: np.ndarray, indices: np.ndarray, max_triangles: int)->Optional[List[Chunk]]:
+    '''
+    positions: float32 (vertex count, 3)
+    indices: (triangle count * 3,)
+
+    return None if the submesh has max_triangles or less
+    '''
+    triangles = indices.reshape(-1, 3)
+    if len(triangles) <= max_triangles:
+        return None
+
+    # 3 * centroid. the scale does not change the codes
+    centroids = positions[triangles[:, 0]] + positions[triangles[:, 1]] + positions[triangles[:, 2]]
+    codes = morton_codes(centroids)
+    order = np.argsort(codes)
+    ranges = split_octree(codes[order], max_triangles)
+
+    # number the vertices of each chunk, all chunks at once.
+    # a vertex belongs to the first chunk that uses it(owner),
+    # the few others on chunk borders are copied into the other chunks too
+    chunk_count = len(ranges)
+    chunk_sizes = np.array([end - begin for begin, end in ranges], dtype=np.int64) * 3
+    chunk_ids = np.repeat(np.arange(chunk_count, dtype=np.int32), chunk_sizes)
+    corner_vertices = triangles[order].ravel()
+    owner = np.full(len(positions), chunk_count, dtype=np.int32)
+    owner[corner_vertices[::-1]] = chunk_ids[::-1]
+    owned = owner[corner_vertices] == chunk_ids
+
+    used = np.flatnonzero(owner < chunk_count)
+    owned_vertices = used[np.argsort(owner[used], kind='stable')]
+    owned_starts = np.zeros(chunk_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owner[owned_vertices], minlength=chunk_count), out=owned_starts[1:])
+    rank = np.empty(len(positions), dtype=np.int64)
+    rank[owned_vertices] = np.arange(len(owned_vertices)) - owned_starts[owner[owned_vertices]]
+
+    shared = ~owned
+    shared_keys = chunk_ids[shared].astype(np.int64) * len(positions) + corner_vertices[shared]
+    unique_keys, shared_inverse = np.unique(shared_keys, return_inverse=True)
+    shared_vertices = unique_keys % len(positions)
+    shared_starts = np.zeros(chunk_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(unique_keys // len(positions), minlength=chunk_count), out=shared_starts[1:])
+
+    local_indices = rank[corner_vertices]
+    shared_chunk_ids = chunk_ids[shared]
+    local_indices[shared] = (owned_starts[shared_chunk_ids + 1] - owned_starts[shared_chunk_ids]
+                             + shared_inverse.ravel() - shared_starts[shared_chunk_ids])
+
+    chunks: List[Chunk] = []
+    index_starts = np.zeros(chunk_count + 1, dtype=np.int64)
+    np.cumsum(chunk_sizes, out=index_starts[1:])
+    for i in range(chunk_count):
+        vertices = np.concatenate((owned_vertices[owned_starts[i]:owned_starts[i + 1]],
+                                   shared_vertices[shared_starts[i]:shared_starts[i + 1]]))
+        dtype = np.uint16 if len(vertices) <= UINT16_MAX_VERTICES else np.uint32
+        chunks.append(Chunk(vertices, local_indices[index_starts[i]:index_starts[i + 1]].astype(dtype)))
+    return chunks
@@ -0,0 +1,183 @@
+'''
+weld coincident vertices, drop degenerate and duplicate triangles, compact unused vertices.
+'''
+import itertools
+from typing import List, Optional, NamedTuple
+import numpy as np
+
+from .scene import Scene, Mesh
+from .rows import unique_rows
+
+# vertices weld only if their normals and uvs also match within these
+NORMAL_TOLERANCE = 1e-3
+UV_TOLERANCE = 1e-5
+WEIGHT_TOLERANCE = 1e-3
+
+# 13 of the 26 neighbour cells, the ones with a positive first non zero offset.
+# the other 13 are the same pairs seen from the other side
+NEIGHBOUR_OFFSETS = np.array([offset for offset in itertools.product((-1, 0, 1), repeat=3)
+                              if offset > (0, 0, 0)], dtype=np.int64)
+
+
+class CleanupResult(NamedTuple):
+    meshes: int
+    welded_vertices: int
+    degenerate_triangles: int
+    duplicate_triangles: int
+    unused_vertices: int
+
+
+def quantize(values: np.ndarray, tolerance: float)->np.ndarray:
+    '''
+    spatial hash cell of each value. values in a cell weld,
+    values closer than tolerance across a cell border are found by weld_neighbours
+    '''
+    return np.floor(values.astype(np.float64) / tolerance + 0.5).astype(np.int64).reshape(len(values), -1)
+
+
+def weld_neighbours(keys: np.ndarray, positions: np.ndarray, tolerance: float)->np.ndarray:
+    '''
+    keys: int64 (n, 3 + columns). unique rows, position cell first
+    positions: (n, 3)
+
+    connect the rows whose cells are neighbours, with the same other columns
+    and positions within tolerance.
+    return int64 (n,). the smallest row index of the connected rows for each row
+    '''
+    count = len(keys)
+    shifted = [keys]
+    for offset in NEIGHBOUR_OFFSETS:
+        neighbour = keys.copy()
+        neighbour[:, :3] += offset
+        shifted.append(neighbour)
+    # keys come first, the first row of a neighbour key that exists is that key
+    first, inverse = unique_rows(np.concatenate(shifted))
+    match = first[inverse[count:]]
+    found = match < count
+    a = np.tile(np.arange(count), len(NEIGHBOUR_OFFSETS))[found]
+    b = match[found]
+    p = positions.astype(np.float64)
+    close = np.linalg.norm(p[a] - p[b], axis=1) <= tolerance
+    a = a[close]
+    b = b[close]
+
+    # connected components. propagate the smallest label, then jump to the label of the label
+    labels = np.arange(count)
+    while True:
+        previous = labels
+        low = np.minimum(labels[a], labels[b])
+        labels = labels.copy()
+        np.minimum.at(labels, a, low)
+        np.minimum.at(labels, b, low)
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def weld_vertices(mesh: Mesh, tolerance: float)->np.ndarray:
+    '''
+    vertices in the same cell or closer than tolerance across a cell border weld.
+    welds chain, as in a single linkage clustering
+
+    return int64 (vertex count,). the representative vertex of each vertex
+    '''
+    columns = [quantize(mesh.positions, tolerance),
+               quantize(mesh.normals, NORMAL_TOLERANCE)]
+    if mesh.uvs is not None:
+        columns.append(quantize(mesh.uvs, UV_TOLERANCE))
+    if mesh.joints is not None:
+        columns.append(mesh.joints.astype(np.int64))
+    if mesh.weights is not None:
+        columns.append(quantize(mesh.weights, WEIGHT_TOLERANCE))
+    if mesh.morph_targets is not None:
+        # vertices that move apart do not weld
+        columns.append(quantize(mesh.morph_targets.transpose(1, 0, 2), tolerance))
+    keys = np.concatenate(columns, axis=1)
+    first, inverse = unique_rows(keys)
+    labels = weld_neighbours(keys[first], mesh.positions[first], tolerance)
+    return first[labels][inverse]
+
+
+def clean_triangles(positions: np.ndarray, triangles: np.ndarray, tolerance: float)->np.ndarray:
+    '''
+    triangles: int64 (n, 3) welded
+    return bool (n,). triangles to keep
+    '''
+    a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    keep = (a != b) & (b != c) & (c != a)
+    p = positions.astype(np.float64)
+    area2 = np.linalg.norm(np.cross(p[b] - p[a], p[c] - p[a]), axis=1)
+    keep &= area2 > tolerance * tolerance
+    return keep
+
+
+def remove_duplicates(triangles: np.ndarray)->np.ndarray:
+    '''
+    triangles: int64 (n, 3)
+    return bool (n,). the first of the triangles with the same corners in the same winding
+    '''
+    # rotate the smallest index first, keeping the winding
+    shift = np.argmin(triangles, axis=1)
+    rows = np.arange(len(triangles))[:, None]
+    rotated = triangles[rows, (shift[:, None] + np.arange(3)) % 3]
+    first, _ = unique_rows(rotated)
+    keep = np.zeros(len(triangles), dtype=np.bool_)
+    keep[first] = True
+    return keep
+
+
+def clean_mesh(mesh: Mesh, tolerance: float)->CleanupResult:
+    '''
+    tolerance: weld distance of positions. vertices also need the same normal, uv, skinning and morph deltas
+
+    the first vertex of welded ones is kept as is, mesh is updated in place.
+    a mesh without any valid triangle is left as it is
+    '''
+    vertex_count = mesh.vertex_count
+    if not vertex_count:
+        return CleanupResult(0, 0, 0, 0, 0)
+    welded = weld_vertices(mesh, tolerance)
+    welded_vertices = vertex_count - len(np.unique(welded))
+
+    degenerate = 0
+    duplicate = 0
+    submesh_triangles: List[np.ndarray] = []
+    for submesh in mesh.submeshes:
+        triangles = welded[submesh.indices.astype(np.int64)].reshape(-1, 3)
+        keep = clean_triangles(mesh.positions, triangles, tolerance)
+        degenerate += len(keep) - int(np.count_nonzero(keep))
+        triangles = triangles[keep]
+        keep = remove_duplicates(triangles)
+        duplicate += len(keep) - int(np.count_nonzero(keep))
+        submesh_triangles.append(triangles[keep])
+
+    if not any(len(triangles) for triangles in submesh_triangles):
+        return CleanupResult(0, 0, 0, 0, 0)
+
+    # compact. unused includes the welded vertices
+    used = np.zeros(vertex_count, dtype=np.bool_)
+    for triangles in submesh_triangles:
+        used[triangles.ravel()] = True
+    remap = np.cumsum(used) - 1
+    for submesh, triangles in zip(mesh.submeshes, submesh_triangles):
+        submesh.indices = remap[triangles.ravel()].astype(submesh.indices.dtype)
+    mesh.submeshes = [submesh for submesh in mesh.submeshes if len(submesh.indices)]
+
+    def compact(values: Optional[np.ndarray])->Optional[np.ndarray]:
+        return values[used] if values is not None else None
+
+    mesh.positions = mesh.positions[used]
+    mesh.normals = mesh.normals[used]
+    mesh.uvs = compact(mesh.uvs)
+    mesh.joints = compact(mesh.joints)
+    mesh.weights = compact(mesh.weights)
+    if mesh.morph_targets is not None:
+        mesh.morph_targets = mesh.morph_targets[:, used]
+
+    unused = vertex_count - mesh.vertex_count - welded_vertices
+    return CleanupResult(1, welded_vertices, degenerate, duplicate, unused)
+
+
+def clean_meshes(scene: Scene, tolerance: float)->CleanupResult:
+    results = [clean_mesh(mesh, tolerance) for mesh in scene.meshes]
+    return CleanupResult(*(sum(values) for values in zip(*results))) if results else CleanupResult(0, 0, 0, 0, 0)
@@ -87,10 +87,10 @@ class GLTFTexture(NamedTuple):
 
 class GLTFMaterialPBRMetallicRoughness(NamedTuple):
     baseColorFactor: Tuple[float, float, float, float] = (0.5, 0.5, 0.5, 1.0)
-    baseColorTexture: Any = None
+    baseColorTexture: Optional['TextureInfo'] = None
     metallicFactor: float = 0
     roughnessFactor: float = 0.9
-    metallicRoughnessTexture: Any = None
+    metallicRoughnessTexture: Optional['TextureInfo'] = None
 
 
 class TextureInfo(NamedTuple):
@@ -145,7 +145,8 @@ class GLTFBufferView(NamedTuple):
     buffer: Optional[int]
     byteOffset: int
     byteLength: int
-    #byteStride: int
+    # None for tightly packed
+    byteStride: Optional[int] = None
     # target:
 
 
@@ -177,6 +178,26 @@ def format_to_componentType(t: str)->Tuple[GLTFAccessorComponentType, int]:
         raise NotImplementedError()
 
 
+def dtype_to_componentType(kind: str, itemsize: int)->GLTFAccessorComponentType:
+    '''
+    kind, itemsize: numpy.dtype.kind, numpy.dtype.itemsize
+    '''
+    if kind == 'f' and itemsize == 4:
+        return GLTFAccessorComponentType.FLOAT
+    elif kind == 'u' and itemsize == 4:
+        return GLTFAccessorComponentType.UNSIGNED_INT
+    elif kind == 'u' and itemsize == 2:
+        return GLTFAccessorComponentType.UNSIGNED_SHORT
+    elif kind == 'u' and itemsize == 1:
+        return GLTFAccessorComponentType.UNSIGNED_BYTE
+    elif kind == 'i' and itemsize == 2:
+        return GLTFAccessorComponentType.SHORT
+    elif kind == 'i' and itemsize == 1:
+        return GLTFAccessorComponentType.BYTE
+    else:
+        raise NotImplementedError()
+
+
 class GLTFAccessorType(Enum):
     SCALAR = "SCALAR"
     VEC2 = "VEC2"
@@ -236,15 +257,31 @@ class GLTFMeshPrimitive(NamedTuple):
 class GLTFMesh(NamedTuple):
     name: str
     primitives: List[GLTFMeshPrimitive]
-    weights: List[int] = []
+    # default morph target weights
+    weights: List[float] = []
+
+
+class EXTMeshGpuInstancing(NamedTuple):
+    # TRANSLATION, ROTATION, SCALE => accessor index
+    attributes: Dict[str, int]
+
+
+class GLTFNodeExtensions(NamedTuple):
+    EXT_mesh_gpu_instancing: Optional[EXTMeshGpuInstancing] = None
 
 
 class GLTFNode(NamedTuple):
     name: str
     mesh: Optional[int] = None
     children: List[int] = []
-    translation: Tuple[float, float, float] = (0.0, 0.0, 0.0)
+    # None if matrix
+    translation: Optional[Tuple[float, float, float]] = (0.0, 0.0, 0.0)
+    rotation: Optional[Tuple[float, float, float, float]] = None
+    scale: Optional[Tuple[float, float, float]] = None
+    # column major. only if the transform can not be written as TRS
+    matrix: Optional[List[float]] = None
     skin: Optional[int] = None
+    extensions: Optional[GLTFNodeExtensions] = None
 
 
 class GLTFScene(NamedTuple):
@@ -259,8 +296,40 @@ class GLTFSkin(NamedTuple):
     joints: List[int]
 
 
+class GLTFAnimationInterpolation(Enum):
+    LINEAR = 'LINEAR'
+    STEP = 'STEP'
+    CUBICSPLINE = 'CUBICSPLINE'
+
+
+class GLTFAnimationSampler(NamedTuple):
+    # accessor of the key times
+    input: int
+    # accessor of the key values
+    output: int
+    interpolation: GLTFAnimationInterpolation = GLTFAnimationInterpolation.LINEAR
+
+
+class GLTFAnimationChannelTarget(NamedTuple):
+    node: int
+    # translation, rotation, scale or weights
+    path: str
+
+
+class GLTFAnimationChannel(NamedTuple):
+    sampler: int
+    target: GLTFAnimationChannelTarget
+
+
+class GLTFAnimation(NamedTuple):
+    name: str
+    channels: List[GLTFAnimationChannel]
+    samplers: List[GLTFAnimationSampler]
+
+
 class GLTF(NamedTuple):
     extensionsUsed: List[str] = []
+    extensionsRequired: List[str] = []
     asset: GLTFAsset = GLTFAsset()
     buffers: List[GLTFBUffer] = []
     bufferViews: List[GLTFBufferView] = []
@@ -273,6 +342,12 @@ class GLTF(NamedTuple):
     nodes: List[GLTFNode] = []
     scenes: List[GLTFScene] = []
     skins: List[GLTFSkin] = []
-
-    def to_json(self):
+    animations: List[GLTFAnimation] = []
+
+    def to_json(self, canonical: bool=False):
+        '''
+        canonical: sorted keys without whitespace, the same bytes for the same gltf
+        '''
+        if canonical:
+            return json.dumps(recursive_asdict(self), cls=GLTFEncoder, sort_keys=True, separators=(',', ':'))
         return json.dumps(recursive_asdict(self), cls=GLTFEncoder, indent=2)
@@ -1,139 +1,319 @@
-from typing import List, Optional, Iterable, Any
+from typing import List, Optional, Iterable, Iterator, Generator, Any, Dict, Tuple
 # blender
 import bpy
 import mathutils
-
-from .meshstore import MeshStore, Vector3_from_meshVertex, Vector3
+import numpy as np
+
+from .meshstore import MeshStore, z_up_to_y_up, _foreach_get
+from .attributes import plan_materials
+from .morph import MorphBake, Deformation, compress_deformation, max_motion
+from .scene import Scene, Node, Skin, Mesh, Material, Image, MorphAnimation
+from .profiler import Profiler
+from .to_gltf import MeshPacker
+from .transform import matrix_from_z_up
 from . import gltf
 
 
-class Node:
-    def __init__(self, name: str, position: mathutils.Vector, parent: Any)->None:
-        self.name = name
-        self.position = Vector3_from_meshVertex(position)
-        self.children: List[Node] = []
-        self.mesh: Optional[MeshStore] = None
-        self.skin: Optional[Skin] = None
-        self.parent = parent
+def position_from_meshVertex(v: mathutils.Vector)->np.ndarray:
+    return np.array((v.x, v.z, -v.y), dtype=np.float32)
 
-    def get_local_position(self)->Vector3:
-        if not self.parent:
-            return self.position
-        return self.position - self.parent.position
 
-    def __str__(self)->str:
-        return f'<{self.name}>'
+def has_deformation(o: bpy.types.Object)->bool:
+    '''
+    modifiers other than armature or animated shape keys.
+    may deform over time, the static ones are dropped after sampling, see sample_deformations
+    '''
+    if any(m.type != 'ARMATURE' for m in o.modifiers):
+        return True
+    shape_keys = o.data.shape_keys
+    return bool(shape_keys and shape_keys.animation_data)
 
-    def traverse(self)->Iterable[Any]:
-        yield self
 
-        for child in self.children:
-            for x in child.traverse():
-                yield x
+class GLTFBuilder:
+    '''
+    bpy front end. gather bpy objects into a bpy independent Scene.
 
+    with packer(streaming export), each mesh is packed into the output buffer
+    right after extraction and its vertex arrays are released.
 
-class Skin:
-    def __init__(self, root: Node, o: bpy.types.Object)->None:
-        self.root = root
-        self.object = o
+    with bake, deformation other than skinning is sampled over the scene frame range
+    and exported as morph targets with a weight animation.
 
+    sort_children: export children by name, not in bpy order
+    '''
 
-class GLTFBuilder:
-    def __init__(self):
-        self.gltf = gltf.GLTF()
+    def __init__(self, profiler: Optional[Profiler]=None, packer: Optional[MeshPacker]=None,
+                 bake: Optional[MorphBake]=None, sort_children: bool=False):
+        self.profiler = profiler if profiler else Profiler()
+        self.packer = packer
+        self.bake = bake
+        self.sort_children = sort_children
         self.indent = ' ' * 2
-        self.mesh_stores: List[MeshStore] = []
+        self.meshes: List[Mesh] = []
         self.nodes: List[Node] = []
         self.root_nodes: List[Node] = []
         self.skins: List[Skin] = []
-
-    def export_bone(self, parent: Node, matrix_world: mathutils.Matrix, bone: bpy.types.Bone)->Node:
-        node = Node(bone.name, bone.head_local, parent)
-        self.nodes.append(node)
-
-        for child in bone.children:
-            child_node = self.export_bone(node, matrix_world, child)
-            node.children.append(child_node)
-
-        return node
+        self.skin_map: Dict[bpy.types.Object, Skin] = {}
+        self.materials: List[Material] = []
+        self.material_map: Dict[bpy.types.Material, Material] = {}
+        self.image_map: Dict[bpy.types.Image, Image] = {}
+        self.object_count = 0
+        # (bpy mesh, vertex group names, bone names) => exported mesh
+        self.mesh_cache: Dict[Any, Mesh] = {}
+        # sampled before the export, see sample_deformations
+        self.deformations: Dict[bpy.types.Object, Deformation] = {}
+
+    def export_bones(self, parent: Node, matrix_world: mathutils.Matrix, bones: List[bpy.types.Bone]):
+        '''
+        depth first with a stack, deep rigs do not hit the recursion limit.
+        nodes are in the same order as a recursive export
+        '''
+        stack = [(parent, bone) for bone in reversed(bones)]
+        while stack:
+            parent_node, bone = stack.pop()
+            node = Node(bone.name, position_from_meshVertex(bone.head_local), parent_node)
+            self.nodes.append(node)
+            parent_node.children.append(node)
+            stack.extend((node, child) for child in reversed(bone.children))
 
     def get_or_create_skin(self, node: Node, armature_object: bpy.types.Object)->Skin:
-        for skin in self.skins:
-            if skin.object == armature_object:
-                return skin
+        if armature_object in self.skin_map:
+            return self.skin_map[armature_object]
 
-        skin = Skin(node, armature_object)
+        skin = Skin(node)
         self.skins.append(skin)
+        self.skin_map[armature_object] = skin
 
         armature = armature_object.data
-        for b in armature.bones:
-            if not b.parent:
-                root_bone = self.export_bone(node, armature_object.matrix_world, b)
-                node.children.append(root_bone)
+        self.export_bones(node, armature_object.matrix_world,
+                          [b for b in armature.bones if not b.parent])
 
         return skin
 
     def export_objects(self, objects: List[bpy.types.Object]):
-        for o in objects:
-            root_node = self.export_object(None, o)
-            self.root_nodes.append(root_node)
-
-    def export_object(self, parent: Optional[Node], o: bpy.types.Object, indent: str='')->Node:
-        node = Node(o.name, o.matrix_world.to_translation(), parent)
+        for _ in self.iter_export_objects(objects):
+            pass
+
+    def iter_export_objects(self, objects: List[bpy.types.Object])->Iterator[int]:
+        '''
+        yield the number of exported objects after each object, for time sliced extraction
+        '''
+        with self.profiler.span('gather', objects=len(objects)) as span:
+            if self.bake:
+                self.deformations = self.sample_deformations(self.collect_bake_objects(objects))
+            for o in objects:
+                root_node = yield from self.export_object(None, o)
+                self.root_nodes.append(root_node)
+            span.counts['nodes'] = len(self.nodes)
+            span.counts['meshes'] = len(self.meshes)
+
+    def export_object(self, parent: Optional[Node], o: bpy.types.Object, indent: str='')->Generator[int, None, Node]:
+        node = Node(o.name, position_from_meshVertex(o.matrix_world.to_translation()), parent,
+                    matrix_from_z_up(np.array(o.matrix_world, dtype=np.float64)))
+        node.animated = bool(o.animation_data and o.animation_data.action)
         self.nodes.append(node)
 
         # only mesh
         if o.type == 'MESH':
 
-            # copy
-            new_obj = o.copy()
-            new_obj.data = o.data.copy()
-            bpy.data.scenes[0].objects.link(new_obj)
-
-            mesh = new_obj.data
-
             # apply modifiers
-            for m in new_obj.modifiers:
+            bone_names: List[str] = []
+            for m in o.modifiers:
                 if m.type == 'ARMATURE':
                     # skin
                     node.skin = self.get_or_create_skin(node, m.object)
-
-            # export
-            bone_names = [
-                b.name for b in node.skin.object.data.bones] if node.skin else []
-            node.mesh = self.export_mesh(mesh, o.vertex_groups, bone_names)
+                    bone_names = [b.name for b in m.object.data.bones]
+
+            deformation = self.deformations.get(o)
+
+            # objects sharing a mesh share the exported mesh
+            key = (o.data, tuple(g.name for g in o.vertex_groups), tuple(bone_names))
+            if deformation:
+                # baked targets belong to this object only
+                node.mesh, node.morph_animation = self.export_object_mesh(o, bone_names, node.skin, deformation)
+                if node.morph_animation:
+                    node.animated = True
+            elif key in self.mesh_cache:
+                node.mesh = self.mesh_cache[key]
+            else:
+                node.mesh, _ = self.export_object_mesh(o, bone_names, node.skin)
+                self.mesh_cache[key] = node.mesh
 
         elif o.type == 'ARMATURE':
             skin = self.get_or_create_skin(node, o)
 
-        for child in o.children:
-            child_node = self.export_object(node, child, indent+self.indent)
+        self.object_count += 1
+        yield self.object_count
+
+        children = sorted(o.children, key=lambda child: child.name) if self.sort_children else o.children
+        for child in children:
+            child_node = yield from self.export_object(node, child, indent+self.indent)
             node.children.append(child_node)
 
         return node
 
-    def export_mesh(self, mesh: bpy.types.Mesh, vertex_groups: List[bpy.types.VertexGroup], bone_names: List[str])->MeshStore:
-
-        def get_texture_layer(layers):
-            for l in layers:
-                if l.active:
-                    return l
-
-        mesh.update(calc_tessface=True)
-        uv_texture_faces = get_texture_layer(mesh.tessface_uv_textures)
-        store = MeshStore(mesh.name, mesh.vertices,
-                          mesh.materials, vertex_groups, bone_names)
-        for i, face in enumerate(mesh.tessfaces):
-            submesh = store.get_or_create_submesh(face.material_index)
-            for triangle in store.add_face(face, uv_texture_faces.data[i] if uv_texture_faces else None):
-                for fv in triangle:
-                    submesh.indices.append(fv)
-
-        self.mesh_stores.append(store)
-        return store
-
-    def get_skin_for_store(self, store: MeshStore)->Optional[Skin]:
-        for node in self.nodes:
-            if node.mesh == store:
-                return node.skin
-        return None
+    def collect_bake_objects(self, objects: List[bpy.types.Object])->List[bpy.types.Object]:
+        '''
+        meshes of objects and their descendants with deformation to bake.
+        skinned deformation is left to the skin
+        '''
+        found: List[bpy.types.Object] = []
+        stack = list(reversed(objects))
+        while stack:
+            o = stack.pop()
+            if (o.type == 'MESH' and not any(m.type == 'ARMATURE' for m in o.modifiers)
+                    and has_deformation(o)):
+                found.append(o)
+            stack.extend(reversed(o.children))
+        return found
+
+    def sample_deformations(self, objects: List[bpy.types.Object])->Dict[bpy.types.Object, Deformation]:
+        '''
+        evaluated vertex positions of each sampled frame, all objects in one pass over the frames.
+        an object whose vertex count changes with a modifier is not baked,
+        nor one that does not move over the bake tolerance
+        '''
+        if not objects:
+            return {}
+        assert self.bake
+        scene = bpy.context.scene
+        frames = list(range(scene.frame_start, scene.frame_end + 1, max(1, self.bake.frame_step)))
+        positions = {o: np.empty((len(frames), len(o.data.vertices), 3), dtype=np.float32) for o in objects}
+        changed: List[str] = []
+        current = scene.frame_current
+        with self.profiler.span('sample_deformation', objects=len(objects), frames=len(frames),
+                                vertices=sum(len(o.data.vertices) for o in objects)) as span:
+            try:
+                for i, frame in enumerate(frames):
+                    scene.frame_set(frame)
+                    depsgraph = bpy.context.evaluated_depsgraph_get()
+                    for o, sampled in list(positions.items()):
+                        evaluated = o.evaluated_get(depsgraph)
+                        mesh = evaluated.to_mesh()
+                        try:
+                            vertex_count = sampled.shape[1]
+                            if len(mesh.vertices) != vertex_count:
+                                changed.append(o.name)
+                                del positions[o]
+                                continue
+                            sampled[i] = _foreach_get(mesh.vertices, 'co', np.float32, (vertex_count, 3))
+                        finally:
+                            evaluated.to_mesh_clear()
+            finally:
+                scene.frame_set(current)
+            static = [o for o, sampled in positions.items() if max_motion(sampled) <= self.bake.tolerance]
+            for o in static:
+                del positions[o]
+            # not baked
+            span.counts['topology_changed'] = len(changed)
+            span.counts['topology_changed_objects'] = changed
+            span.counts['static'] = len(static)
+        fps = scene.render.fps / scene.render.fps_base
+        times = ((np.array(frames, dtype=np.float64) - frames[0]) / fps).astype(np.float32)
+        return {o: Deformation(times, sampled) for o, sampled in positions.items()}
+
+    def export_object_mesh(self, o: bpy.types.Object, bone_names: List[str], skin: Optional[Skin],
+                           deformation: Optional[Deformation]=None)->Tuple[Mesh, Optional[MorphAnimation]]:
+        # copy
+        new_obj = o.copy()
+        new_obj.data = o.data.copy()
+        bpy.data.scenes[0].objects.link(new_obj)
+
+        mesh = new_obj.data
+
+        # export
+        frozen, animation = self.export_mesh(mesh, o.vertex_groups, bone_names, deformation)
+        if self.packer:
+            self.packer.pack_mesh(frozen, skin)
+            frozen.release()
+            # drop the working copy too
+            bpy.data.objects.remove(new_obj, do_unlink=True)
+            bpy.data.meshes.remove(mesh)
+        return frozen, animation
+
+    def get_or_create_texture(self, texture: bpy.types.ImageTexture)->Image:
+        image = self.get_or_create_image(texture.image)
+        if getattr(texture, 'extension', 'REPEAT') == 'REPEAT':
+            image.repeat = True
+        return image
+
+    def get_or_create_image(self, src: bpy.types.Image)->Image:
+        if src in self.image_map:
+            return self.image_map[src]
+
+        width = src.size[0]
+        height = src.size[1]
+        with self.profiler.span('extract_image', image=src.name, width=width, height=height):
+            pixels = np.array(src.pixels[:], dtype=np.float32).reshape(height, width, 4)
+        image = Image(src.name, pixels, repeat=False)
+        self.image_map[src] = image
+        return image
+
+    def get_or_create_material(self, src: bpy.types.Material)->Material:
+        if src in self.material_map:
+            return self.material_map[src]
+
+        material = Material(src.name)
+        for i, slot in enumerate(src.texture_slots):
+            if src.use_textures[i] and slot and slot.texture:
+                if slot.use_map_color_diffuse and slot.texture and slot.texture.image:
+                    material.color_texture = self.get_or_create_texture(
+                        slot.texture)
+                    if slot.use_map_alpha:
+                        if slot.use_stencil:
+                            material.alpha_mode = gltf.AlphaMode.MASK
+                        else:
+                            material.alpha_mode = gltf.AlphaMode.BLEND
+                elif slot.use_map_normal and slot.texture and slot.texture.image:
+                    material.normal_texture = self.get_or_create_texture(
+                        slot.texture)
+                    material.normal_scale = slot.normal_factor
+
+        self.materials.append(material)
+        self.material_map[src] = material
+        return material
+
+    def export_mesh(self, mesh: bpy.types.Mesh, vertex_groups: List[bpy.types.VertexGroup], bone_names: List[str],
+                    deformation: Optional[Deformation]=None)->Tuple[Mesh, Optional[MorphAnimation]]:
+
+        with self.profiler.span('extract_mesh', mesh=mesh.name) as span:
+            materials = [self.get_or_create_material(m) if m else None
+                         for m in mesh.materials]
+            # uvs only if some material samples a texture
+            plan = plan_materials(materials)
+            store = MeshStore(mesh.name, mesh, vertex_groups, bone_names, plan.uvs)
+            span.counts['vertices'] = len(store.positions)
+            span.counts['triangles'] = store.triangle_count
+            span.counts['weight_overflow'] = store.weight_overflow
+            with self.profiler.span('freeze', mesh=mesh.name) as freeze_span:
+                frozen = store.freeze(materials)
+                freeze_span.counts['unique_vertices'] = frozen.vertex_count
+            span.counts['unique_vertices'] = frozen.vertex_count
+
+            animation = self.bake_morph_targets(store, frozen, deformation) if deformation else None
+
+        self.meshes.append(frozen)
+        return frozen, animation
+
+    def bake_morph_targets(self, store: MeshStore, frozen: Mesh, deformation: Deformation)->Optional[MorphAnimation]:
+        '''
+        set the morph targets of frozen. None if nothing moves
+        '''
+        assert self.bake
+        with self.profiler.span('morph_targets', mesh=frozen.name, frames=len(deformation.times)) as span:
+            vertices = store.vertex_indices
+            deltas = z_up_to_y_up(deformation.positions[:, vertices] - store.positions[vertices])
+            result = compress_deformation(deltas, self.bake.max_targets, self.bake.tolerance)
+            span.counts['targets'] = len(result.targets) if result else 0
+        if not result:
+            return None
+        frozen.morph_targets = result.targets
+        return MorphAnimation(deformation.times, result.weights)
+
+    def to_scene(self)->Scene:
+        scene = Scene()
+        scene.nodes = self.nodes
+        scene.root_nodes = self.root_nodes
+        scene.meshes = self.meshes
+        scene.skins = self.skins
+        return scene
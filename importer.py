@@ -0,0 +1,137 @@
+'''
+bulk import into blender with foreach_set.
+'''
+import pathlib
+from typing import List, Optional, Dict, Tuple
+import numpy as np
+import bpy
+import mathutils
+
+from . import gltf
+from .reader import read, GLTFData
+from .transform import Z_UP_TO_Y_UP, rotation_from_quaternion
+
+
+def to_z_up(v: np.ndarray)->np.ndarray:
+    '''
+    (x, y, z) => (x, -z, y)
+    '''
+    return np.stack([v[:, 0], -v[:, 2], v[:, 1]], axis=1)
+
+
+def node_matrix(node: gltf.GLTFNode)->np.ndarray:
+    '''
+    local matrix in z-up
+    '''
+    if node.matrix:
+        m = np.array(node.matrix, dtype=np.float64).reshape(4, 4).T
+    else:
+        m = np.identity(4, dtype=np.float64)
+        if node.rotation:
+            m[:3, :3] = rotation_from_quaternion(np.array([node.rotation], dtype=np.float64))[0]
+        if node.scale:
+            m[:3, :3] *= np.array(node.scale, dtype=np.float64)
+        if node.translation:
+            m[:3, 3] = node.translation
+    return Z_UP_TO_Y_UP.T @ m @ Z_UP_TO_Y_UP
+
+
+def import_mesh(data: GLTFData, mesh: gltf.GLTFMesh, materials: List[bpy.types.Material])->bpy.types.Mesh:
+    '''
+    primitives that share the POSITION accessor share their vertices,
+    unless they use a different NORMAL or TEXCOORD_0
+    '''
+    positions: List[np.ndarray] = []
+    normals: List[np.ndarray] = []
+    uvs: List[np.ndarray] = []
+    indices: List[np.ndarray] = []
+    material_indices: List[np.ndarray] = []
+    slots: List[Optional[int]] = []
+    # POSITION accessor => (vertex offset, attributes) of the imported vertices
+    vertex_sets: Dict[int, Tuple[int, Dict[str, int]]] = {}
+    offset = 0
+    for prim in mesh.primitives:
+        if prim.mode not in (None, gltf.GLTFMeshPrimitiveTopology.TRIANGLES):
+            continue
+        position_index = prim.attributes['POSITION']
+        cached = vertex_sets.get(position_index)
+        if cached and all(prim.attributes.get(semantic) in (None, cached[1].get(semantic))
+                          for semantic in ('NORMAL', 'TEXCOORD_0')):
+            base, _ = cached
+            vertex_count = data.gltf.accessors[position_index].count
+        else:
+            p = data.accessor(position_index)
+            positions.append(p)
+            normals.append(data.accessor(prim.attributes['NORMAL'])
+                           if 'NORMAL' in prim.attributes else np.zeros_like(p))
+            uvs.append(data.accessor(prim.attributes['TEXCOORD_0']).astype(np.float32)
+                       if 'TEXCOORD_0' in prim.attributes else np.zeros((len(p), 2), dtype=np.float32))
+            base = offset
+            vertex_count = len(p)
+            vertex_sets[position_index] = (base, prim.attributes)
+            offset += len(p)
+        i = data.accessor(prim.indices).astype(np.int64) if prim.indices is not None \
+            else np.arange(vertex_count, dtype=np.int64)
+        indices.append(i + base)
+        if prim.material not in slots:
+            slots.append(prim.material)
+        material_indices.append(np.full(len(i) // 3, slots.index(prim.material), dtype=np.int32))
+
+    bl_mesh = bpy.data.meshes.new(mesh.name)
+    if not positions:
+        return bl_mesh
+    all_positions = np.concatenate(positions)
+    all_indices = np.concatenate(indices)
+    triangle_count = len(all_indices) // 3
+
+    bl_mesh.vertices.add(len(all_positions))
+    bl_mesh.vertices.foreach_set('co', to_z_up(all_positions).astype(np.float32).ravel())
+    bl_mesh.loops.add(len(all_indices))
+    bl_mesh.loops.foreach_set('vertex_index', all_indices.astype(np.int32))
+    bl_mesh.polygons.add(triangle_count)
+    bl_mesh.polygons.foreach_set('loop_start', np.arange(0, triangle_count * 3, 3, dtype=np.int32))
+    bl_mesh.polygons.foreach_set('loop_total', np.full(triangle_count, 3, dtype=np.int32))
+    bl_mesh.polygons.foreach_set('material_index', np.concatenate(material_indices))
+    bl_mesh.polygons.foreach_set('use_smooth', np.ones(triangle_count, dtype=bool))
+
+    # gltf uv origin is top left
+    loop_uvs = np.concatenate(uvs)[all_indices]
+    loop_uvs[:, 1] = 1 - loop_uvs[:, 1]
+    uv_layer = bl_mesh.uv_layers.new()
+    uv_layer.data.foreach_set('uv', loop_uvs.ravel())
+
+    for slot in slots:
+        bl_mesh.materials.append(materials[slot] if slot is not None else None)
+
+    bl_mesh.validate()
+    bl_mesh.update()
+
+    all_normals = to_z_up(np.concatenate(normals)).astype(np.float32)
+    if np.any(all_normals):
+        bl_mesh.use_auto_smooth = True
+        bl_mesh.normals_split_custom_set_from_vertices(all_normals.tolist())
+
+    return bl_mesh
+
+
+def import_gltf(path: pathlib.Path)->List[bpy.types.Object]:
+    data = read(path)
+    root = data.gltf
+
+    materials = [bpy.data.materials.new(m.name if m.name else f'material{i}')
+                 for i, m in enumerate(root.materials)]
+    meshes = [import_mesh(data, mesh, materials) for mesh in root.meshes]
+
+    objects: List[bpy.types.Object] = []
+    for i, node in enumerate(root.nodes):
+        o = bpy.data.objects.new(node.name if node.name else f'node{i}',
+                                 meshes[node.mesh] if node.mesh is not None else None)
+        bpy.context.scene.collection.objects.link(o)
+        objects.append(o)
+
+    for node, o in zip(root.nodes, objects):
+        for child in node.children:
+            objects[child].parent = o
+        o.matrix_basis = mathutils.Matrix(node_matrix(node).tolist())
+
+    return objects
@@ -0,0 +1,64 @@
+'''
+draw static nodes that share a mesh as instances of one node(EXT_mesh_gpu_instancing).
+'''
+from typing import List, Dict, NamedTuple
+import numpy as np
+
+from .scene import Scene, Node, Mesh
+from .transform import is_bakeable, get_world_matrices, decompose
+from .prune import remove_empty_nodes
+
+
+class InstancingResult(NamedTuple):
+    # nodes that became instances
+    instances: int
+    # created instancing nodes
+    instance_nodes: int
+    removed_nodes: int
+
+
+def create_instances(scene: Scene, min_instances: int=2)->InstancingResult:
+    '''
+    group non-skinned, non-animated mesh nodes by mesh.
+    each group of min_instances or more becomes a new root node with the world matrices as instances.
+    instances with a world matrix that is not TRS(shear) are left as they are.
+
+    the grouped nodes lose their mesh and are removed unless they still carry something.
+    '''
+    groups: Dict[Mesh, List[Node]] = {}
+    for node in scene.nodes:
+        if is_bakeable(node):
+            groups.setdefault(node.mesh, []).append(node)  # type: ignore
+    candidates = [group for group in groups.values() if len(group) >= min_instances]
+    if not candidates:
+        return InstancingResult(0, 0, 0)
+
+    # decompose every candidate at once
+    nodes = [node for group in candidates for node in group]
+    matrices = get_world_matrices(nodes)
+    exact = decompose(matrices).exact
+    offsets = np.cumsum([0] + [len(group) for group in candidates])
+
+    instanced: List[Node] = []
+    instance_nodes = 0
+    for group, start, end in zip(candidates, offsets[:-1], offsets[1:]):
+        group_exact = exact[start:end]
+        if np.count_nonzero(group_exact) < min_instances:
+            continue
+        mesh = group[0].mesh
+        assert mesh
+
+        node = Node(f'{mesh.name}.instances', np.zeros(3), None)
+        node.mesh = mesh
+        node.instances = matrices[start:end][group_exact]
+        scene.nodes.append(node)
+        scene.root_nodes.append(node)
+        instance_nodes += 1
+
+        for src, is_exact in zip(group, group_exact):
+            if is_exact:
+                src.mesh = None
+                instanced.append(src)
+
+    removed = remove_empty_nodes(scene, instanced)
+    return InstancingResult(len(instanced), instance_nodes, removed)
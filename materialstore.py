@@ -1,23 +1,27 @@
-import bpy
+import concurrent.futures
+from typing import List, Dict, Optional, Iterable, Callable
+import numpy as np
 from .buffermanager import BufferManager
+from .scene import Image, Material
+from .profiler import Profiler
 from . import gltf
 
 
-def image_to_png(image: bpy.types.Image)->bytes:
+def image_to_png(image: Image)->bytes:
     '''
     https://blender.stackexchange.com/questions/62072/does-blender-have-a-method-to-a-get-png-formatted-bytearray-for-an-image-via-pyt
     '''
     import struct
     import zlib
 
-    width = image.size[0]
-    height = image.size[1]
-    buf = bytearray([int(p * 255) for p in image.pixels])
+    width = image.width
+    height = image.height
+    buf = (np.clip(image.pixels, 0, 1) * 255).astype(np.uint8)
 
     # reverse the vertical line order and add null bytes at the start
-    width_byte_4 = width * 4
-    raw_data = b''.join(b'\x00' + buf[span:span + width_byte_4]
-                        for span in range((height - 1) * width_byte_4, -1, - width_byte_4))
+    lines = np.zeros((height, 1 + width * 4), dtype=np.uint8)
+    lines[:, 1:] = buf[::-1].reshape(height, width * 4)
+    raw_data = lines.tobytes()
 
     def png_pack(png_tag, data):
         chunk_head = png_tag + data
@@ -34,15 +38,40 @@ def image_to_png(image: bpy.types.Image)->bytes:
 
 
 class MaterialStore:
-    def __init__(self):
+    def __init__(self, profiler: Optional[Profiler]=None):
+        self.profiler = profiler if profiler else Profiler()
         self.images: List[gltf.GLTFImage] = []
         self.samplers: List[gltf.GLTFSampler] = []
+        self.sampler_map: Dict[gltf.GLTFSampler, int] = {}
         self.textures: List[gltf.GLTFTexture] = []
-        self.texture_map: Dict[bpy.tyeps.Image, int] = {}
+        self.texture_map: Dict[Image, int] = {}
         self.materials: List[gltf.GLTFMaterial] = []
-        self.material_map: Dict[bpy.types.Material, int] = {}
-
-    def get_texture_index(self, texture: bpy.types.Image, buffer: BufferManager)->int:
+        self.material_map: Dict[Optional[Material], int] = {}
+        # material without name => index. materials with the same content share one
+        self.fingerprint_map: Dict[gltf.GLTFMaterial, int] = {}
+        # encoded ahead by encode_textures
+        self.png_map: Dict[Image, bytes] = {}
+
+    def encode_textures(self, images: Iterable[Image], executor: concurrent.futures.Executor,
+                        check: Optional[Callable[[], None]]=None):
+        '''
+        encode images in parallel before packing. zlib releases the gil.
+        check: called between images, raise to stop
+        '''
+        futures = {image: executor.submit(image_to_png, image)
+                   for image in images if image not in self.texture_map and image not in self.png_map}
+        with self.profiler.span('encode_textures', images=len(futures)) as span:
+            try:
+                for image, future in futures.items():
+                    if check:
+                        check()
+                    self.png_map[image] = future.result()
+            finally:
+                for future in futures.values():
+                    future.cancel()
+            span.counts['bytes'] = sum(len(png) for png in self.png_map.values())
+
+    def get_texture_index(self, texture: Image, buffer: BufferManager)->int:
         if texture in self.texture_map:
             return self.texture_map[texture]
 
@@ -51,11 +80,14 @@ class MaterialStore:
         self.add_texture(texture, buffer)
         return gltf_texture_index
 
-    def add_texture(self, src: bpy.types.Image, buffer: BufferManager):
+    def add_texture(self, src: Image, buffer: BufferManager):
         image_index = len(self.images)
 
-        print(f'add_texture: {src.name}')
-        png = image_to_png(src)
+        png = self.png_map.pop(src, None)
+        if png is None:
+            with self.profiler.span('encode_texture', image=src.name, width=src.width, height=src.height) as span:
+                png = image_to_png(src)
+                span.counts['bytes'] = len(png)
         view_index = buffer.add_view(src.name, png)
 
         self.images.append(gltf.GLTFImage(
@@ -65,12 +97,13 @@ class MaterialStore:
             bufferView=view_index
         ))
 
-        sampler_index = len(self.samplers)
-        self.samplers.append(gltf.GLTFSampler(
+        # an atlas clamps, repeating would sample the neighbour tiles
+        wrap = gltf.WrapMode.REPEAT if src.repeat else gltf.WrapMode.CLAMP_TO_EDGE
+        sampler_index = self.get_sampler_index(gltf.GLTFSampler(
             magFilter=gltf.MagFilterType.NEAREST,
             minFilter=gltf.MinFilterType.NEAREST,
-            wrapS=gltf.WrapMode.REPEAT,
-            wrapT=gltf.WrapMode.REPEAT
+            wrapS=wrap,
+            wrapT=wrap
         ))
 
         dst = gltf.GLTFTexture(
@@ -80,45 +113,52 @@ class MaterialStore:
         )
         self.textures.append(dst)
 
-    def get_material_index(self, material: bpy.types.Material, bufferManager: BufferManager)->int:
+    def get_sampler_index(self, sampler: gltf.GLTFSampler)->int:
+        if sampler in self.sampler_map:
+            return self.sampler_map[sampler]
+
+        sampler_index = len(self.samplers)
+        self.sampler_map[sampler] = sampler_index
+        self.samplers.append(sampler)
+        return sampler_index
+
+    def get_material_index(self, material: Optional[Material], bufferManager: BufferManager)->int:
         if material in self.material_map:
             return self.material_map[material]
 
-        gltf_material_index = len(self.materials)
-        self.material_map[material] = gltf_material_index
         if material:
-            self.add_material(material, bufferManager)
+            with self.profiler.span('material', material=material.name):
+                with bufferManager.group('texture'):
+                    dst = self.create_material(material, bufferManager)
         else:
-            self.materials.append(gltf.create_default_material())
+            dst = gltf.create_default_material()
+
+        # textures are shared by Image, equal texture indices mean equal textures
+        fingerprint = dst._replace(name='')
+        gltf_material_index = self.fingerprint_map.get(fingerprint)
+        if gltf_material_index is None:
+            gltf_material_index = len(self.materials)
+            self.fingerprint_map[fingerprint] = gltf_material_index
+            self.materials.append(dst)
+        self.material_map[material] = gltf_material_index
         return gltf_material_index
 
-    def add_material(self, src: bpy.types.Material, bufferManager: BufferManager):
+    def create_material(self, src: Material, bufferManager: BufferManager)->gltf.GLTFMaterial:
         # texture
         color_texture = None
+        if src.color_texture:
+            color_texture = gltf.TextureInfo(
+                index=self.get_texture_index(src.color_texture, bufferManager),
+                texCoord=0
+            )
+
         normal_texture = None
-        alpha_mode = gltf.AlphaMode.OPAQUE
-        for i, slot in enumerate(src.texture_slots):
-            if src.use_textures[i] and slot and slot.texture:
-                if slot.use_map_color_diffuse and slot.texture and slot.texture.image:
-                    color_texture_index = self.get_texture_index(
-                        slot.texture.image, bufferManager)
-                    color_texture = gltf.TextureInfo(
-                        index=color_texture_index,
-                        texCoord=0
-                    )
-                    if slot.use_map_alpha:
-                        if slot.use_stencil:
-                            alpha_mode = gltf.AlphaMode.MASK
-                        else:
-                            alpha_mode = gltf.AlphaMode.BLEND
-                elif slot.use_map_normal and slot.texture and slot.texture.image:
-                    normal_texture_index = self.get_texture_index(
-                        slot.texture.image, bufferManager)
-                    normal_texture = gltf.GLTFMaterialNormalTextureInfo(
-                        index=normal_texture_index,
-                        texCoord=0,
-                        scale=slot.normal_factor,
-                    )
+        if src.normal_texture:
+            normal_texture = gltf.GLTFMaterialNormalTextureInfo(
+                index=self.get_texture_index(src.normal_texture, bufferManager),
+                texCoord=0,
+                scale=src.normal_scale,
+            )
 
         # material
         dst = gltf.GLTFMaterial(
@@ -134,8 +174,8 @@ class MaterialStore:
             occlusionTexture=None,
             emissiveTexture=None,
             emissiveFactor=(0, 0, 0),
-            alphaMode=alpha_mode,
+            alphaMode=src.alpha_mode,
             alphaCutoff=None,
             doubleSided=False
         )
-        self.materials.append(dst)
+        return dst
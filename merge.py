@@ -0,0 +1,118 @@
+'''
+merge static meshes that share a material into single primitives.
+'''
+from typing import List, Dict, Optional, Tuple, NamedTuple
+import numpy as np
+
+from .scene import Scene, Node, Mesh, Submesh, Material
+from .transform import is_bakeable, is_mirrored, reverse_winding, get_world_matrices, transform_points, transform_normals
+
+# the maximum index of unsigned short is reserved(primitive restart)
+UINT16_MAX_VERTICES = 65535
+
+
+class MergeResult(NamedTuple):
+    nodes: int
+    primitives: int
+    merged_primitives: int
+
+
+def split_batches(vertex_counts: np.ndarray, max_vertices: int)->List[Tuple[int, int]]:
+    '''
+    split consecutive items into [begin, end) ranges whose vertex count sum fit max_vertices.
+    an item over max_vertices becomes a batch by itself.
+    '''
+    batches: List[Tuple[int, int]] = []
+    begin = 0
+    total = 0
+    for i, count in enumerate(vertex_counts.tolist()):
+        if i > begin and total + count > max_vertices:
+            batches.append((begin, i))
+            begin = i
+            total = 0
+        total += count
+    if begin < len(vertex_counts):
+        batches.append((begin, len(vertex_counts)))
+    return batches
+
+
+def merge_meshes(scene: Scene, max_vertices: int=UINT16_MAX_VERTICES)->MergeResult:
+    '''
+    bake the world matrix of non-skinned, non-animated mesh nodes into the vertices
+    and concatenate their submeshes by material.
+
+    merged nodes lose their mesh and stay as empty nodes.
+    the merged meshes are added as new root nodes.
+    '''
+    nodes = [node for node in scene.nodes if is_bakeable(node)]
+    if not nodes:
+        return MergeResult(0, 0, 0)
+    meshes: List[Mesh] = [node.mesh for node in nodes]  # type: ignore
+
+    # all vertices in world space
+    vertex_counts = np.array([mesh.vertex_count for mesh in meshes], dtype=np.int64)
+    vertex_offsets = np.zeros(len(meshes), dtype=np.int64)
+    np.cumsum(vertex_counts[:-1], out=vertex_offsets[1:])
+    matrices = get_world_matrices(nodes)
+    per_vertex = np.repeat(matrices, vertex_counts, axis=0)
+    positions = transform_points(
+        per_vertex, np.concatenate([mesh.positions for mesh in meshes]))
+    normals = transform_normals(
+        per_vertex, np.concatenate([mesh.normals for mesh in meshes]))
+    uvs = None
+    if any(mesh.uvs is not None for mesh in meshes):
+        uvs = np.concatenate([mesh.uvs if mesh.uvs is not None else np.zeros(
+            (mesh.vertex_count, 2), dtype=np.float32) for mesh in meshes])
+
+    # group submeshes by material. a mirrored node is rewound, its faces stay outside
+    groups: Dict[Optional[Material], List[Tuple[np.ndarray, int]]] = {}
+    primitives = 0
+    for mesh, offset, flip in zip(meshes, vertex_offsets.tolist(), is_mirrored(matrices).tolist()):
+        for submesh in mesh.submeshes:
+            groups.setdefault(submesh.material, []).append(
+                (reverse_winding(submesh.indices) if flip else submesh.indices, offset))
+            primitives += 1
+
+    merged_primitives = 0
+    for material, items in groups.items():
+        # vertices used by each submesh
+        index_counts = np.array([len(indices) for indices, _ in items], dtype=np.int64)
+        indices = np.concatenate([indices for indices, _ in items]).astype(np.int64) + \
+            np.repeat(np.array([offset for _, offset in items], dtype=np.int64), index_counts)
+        item_ids = np.repeat(np.arange(len(items)), index_counts)
+        order = np.lexsort((indices, item_ids))
+        sorted_indices = indices[order]
+        sorted_ids = item_ids[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (sorted_indices[1:] != sorted_indices[:-1]) | (
+            sorted_ids[1:] != sorted_ids[:-1])
+        item_vertex_counts = np.bincount(sorted_ids[first], minlength=len(items))
+        index_offsets = np.zeros(len(items) + 1, dtype=np.int64)
+        np.cumsum(index_counts, out=index_offsets[1:])
+
+        for begin, end in split_batches(item_vertex_counts, max_vertices):
+            batch = indices[index_offsets[begin]:index_offsets[end]]
+            used, local_indices = np.unique(batch, return_inverse=True)
+            name = f'merged.{material.name if material else "default"}.{merged_primitives}'
+            mesh = Mesh(
+                name=name,
+                positions=positions[used],
+                normals=normals[used],
+                uvs=uvs[used] if uvs is not None else None,
+                submeshes=[Submesh(local_indices.astype(
+                    np.uint16 if len(used) <= UINT16_MAX_VERTICES else np.uint32), material)]
+            )
+            node = Node(name, np.zeros(3, dtype=np.float32), None)
+            node.mesh = mesh
+            scene.nodes.append(node)
+            scene.root_nodes.append(node)
+            scene.meshes.append(mesh)
+            merged_primitives += 1
+
+    # remove merged meshes, unless a remaining node still uses it
+    for node in nodes:
+        node.mesh = None
+    used_meshes = set(node.mesh for node in scene.nodes if node.mesh)
+    scene.meshes = [mesh for mesh in scene.meshes if mesh in used_meshes]
+
+    return MergeResult(len(nodes), primitives, merged_primitives)
@@ -1,314 +1,243 @@
-import array
-import mathutils
-import ctypes
-from typing import Any, List, Iterable, Dict, Generator, Tuple, Optional, NamedTuple
+'''
+bulk mesh extraction.
+
+MeshStore copies a bpy.types.Mesh into numpy arrays with foreach_get,
+freeze deduplicates the triangle corners into gltf vertices.
+'''
+from typing import Any, List, Tuple, Optional, Sequence
+import numpy as np
 import bpy
 
-
-class Vector2(ctypes.LittleEndianStructure):
-    _fields_ = [
-        ("x", ctypes.c_float),
-        ("y", ctypes.c_float),
-    ]
-
-
-def Vector2_from_faceUV(uv: mathutils.Vector)->Vector2:
-    return Vector2(uv.x, -uv.y)
-
-
-class Vector3(ctypes.LittleEndianStructure):
-    _fields_ = [
-        ("x", ctypes.c_float),
-        ("y", ctypes.c_float),
-        ("z", ctypes.c_float)
-    ]
-
-    def __sub__(self, rhs):
-        return Vector3(self.x-rhs.x, self.y-rhs.y, self.z-rhs.z)
-
-
-def Vector3_from_meshVertex(v: mathutils.Vector)->Vector3:
-    return Vector3(v.x, v.z, -v.y)
-
-
-def get_min_max2(list: Iterable[Vector2]):
-    min: List[float] = [float('inf')] * 2
-    max: List[float] = [float('-inf')] * 2
-    for v in list:
-        if v.x < min[0]:
-            min[0] = v.x
-        if v.x > max[0]:
-            max[0] = v.x
-        if v.y < min[1]:
-            min[1] = v.y
-        if v.y > max[1]:
-            max[1] = v.y
-    return min, max
-
-
-def get_min_max3(list: Iterable[Vector3]):
-    min: List[float] = [float('inf')] * 3
-    max: List[float] = [float('-inf')] * 3
-    for v in list:
-        if v.x < min[0]:
-            min[0] = v.x
-        if v.x > max[0]:
-            max[0] = v.x
-        if v.y < min[1]:
-            min[1] = v.y
-        if v.y > max[1]:
-            max[1] = v.y
-        if v.z < min[2]:
-            min[2] = v.z
-        if v.z > max[2]:
-            max[2] = v.z
-    return min, max
-
-
-def getFaceUV(mesh, i, faces, count=3):
-    active_uv_texture = None
-    for t in mesh.tessface_uv_textures:
-        if t.active:
-            active_uv_texture = t
-            break
-    if active_uv_texture and active_uv_texture.data[i]:
-        uvFace = active_uv_texture.data[i]
-        if count == 3:
-            return (uvFace.uv1, uvFace.uv2, uvFace.uv3)
-        elif count == 4:
-            return (uvFace.uv1, uvFace.uv2, uvFace.uv3, uvFace.uv4)
-        else:
-            print(count)
-            assert(False)
-    else:
-        return ((0, 0), (0, 0), (0, 0), (0, 0))
-
-
-class Submesh:
-    def __init__(self, material_index: int)->None:
-        self.indices: Any = array.array('I')
-        self.material_index = material_index
-
-
-class Values(NamedTuple):
-    values: memoryview
-    min: List[float]
-    max: List[float]
-
-
-class Vector4(ctypes.LittleEndianStructure):
-    _fields_ = [
-        ("x", ctypes.c_float),
-        ("y", ctypes.c_float),
-        ("z", ctypes.c_float),
-        ("w", ctypes.c_float)
-    ]
-
-
-class IVector4(ctypes.LittleEndianStructure):
-    _fields_ = [
-        ("x", ctypes.c_ushort),
-        ("y", ctypes.c_ushort),
-        ("z", ctypes.c_ushort),
-        ("w", ctypes.c_ushort)
-    ]
-
-
-class BoneWeight(ctypes.LittleEndianStructure):
-    _fields_ = [
-        ("i0", ctypes.c_int),
-        ("i1", ctypes.c_int),
-        ("i2", ctypes.c_int),
-        ("i3", ctypes.c_int),
-        ("weights", Vector4),
-    ]
-
-
-def PushBoneWeight(self: BoneWeight, i: int, w: float):
-    if self.weights.x == 0:
-        self.i0 = i
-        self.weights.x = w
-    elif self.weights.y == 0:
-        self.i1 = i
-        self.weights.y = w
-    elif self.weights.z == 0:
-        self.i2 = i
-        self.weights.z = w
-    elif self.weights.w == 0:
-        self.i3 = i
-        self.weights.w = w
-    else:
-        #raise NotImplementedError()
-        print('over 4')
-
-
-def GetBoneJoints(self: BoneWeight, group_index_to_joint_index: Dict[int, int]):
-    return IVector4(
-        group_index_to_joint_index[self.i0] if self.i0 in group_index_to_joint_index else 0,
-        group_index_to_joint_index[self.i1] if self.i1 in group_index_to_joint_index else 0,
-        group_index_to_joint_index[self.i2] if self.i2 in group_index_to_joint_index else 0,
-        group_index_to_joint_index[self.i3] if self.i3 in group_index_to_joint_index else 0
-    )
-
-
-class Mesh(NamedTuple):
-    name: str
-    positions: Values
-    normals: Values
-    uvs: Optional[Values]
-    materials: List[bpy.types.Material]
-    submeshes: List[Submesh]
-    joints: Optional[memoryview]
-    weights: Optional[memoryview]
-
-
-class FaceVertex(NamedTuple):
-    position_index: int
-    normal: Optional[Vector3]
-    uv: Optional[Vector2]
-
-    def __hash__(self):
-        return hash(self.position_index)
+from . import scene
+from .rows import unique_rows
+
+
+BoneWeightDtype = np.dtype([('groups', '<i4', (4,)), ('weights', '<f4', (4,))])
+
+
+def _foreach_get(collection: Any, attr: str, dtype: Any, shape: Tuple[int, ...])->np.ndarray:
+    values = np.empty(int(np.prod(shape)), dtype=dtype)
+    if len(values):
+        collection.foreach_get(attr, values)
+    return values.reshape(shape)
+
+
+def z_up_to_y_up(values: np.ndarray)->np.ndarray:
+    '''
+    (x, y, z) => (x, z, -y)
+    '''
+    converted = np.empty_like(values)
+    converted[..., 0] = values[..., 0]
+    converted[..., 1] = values[..., 2]
+    converted[..., 2] = -values[..., 1]
+    return converted
+
+
+def read_bone_weights(vertices: Sequence[bpy.types.MeshVertex],
+                      vertex_group_names: List[str], bone_names: List[str])->Tuple[np.ndarray, int]:
+    '''
+    the 4 largest positive weights of bone vertex groups, normalized to sum 1.
+    vertex groups have no bulk accessor, this is the only per vertex loop.
+
+    return (bone weights, number of vertices that had more than 4 weights)
+    '''
+    bone_groups = {i for i, name in enumerate(vertex_group_names) if name in bone_names}
+    vertex_list: List[int] = []
+    group_list: List[int] = []
+    weight_list: List[float] = []
+    for i, v in enumerate(vertices):
+        for ve in v.groups:
+            if ve.group in bone_groups and ve.weight > 0:
+                vertex_list.append(i)
+                group_list.append(ve.group)
+                weight_list.append(ve.weight)
+
+    vertex_indices = np.array(vertex_list, dtype=np.int64)
+    groups = np.array(group_list, dtype=np.int32)
+    weights = np.array(weight_list, dtype=np.float32)
+
+    # by vertex, the heaviest first
+    order = np.lexsort((-weights, vertex_indices))
+    vertex_indices = vertex_indices[order]
+    slots = np.arange(len(order)) - np.searchsorted(vertex_indices, vertex_indices)
+    keep = slots < 4
+    overflow = int(np.count_nonzero(np.bincount(vertex_indices, minlength=len(vertices)) > 4))
+
+    bone_weights = np.zeros(len(vertices), dtype=BoneWeightDtype)
+    bone_weights['groups'][vertex_indices[keep], slots[keep]] = groups[order][keep]
+    bone_weights['weights'][vertex_indices[keep], slots[keep]] = weights[order][keep]
+    total = bone_weights['weights'].sum(axis=1, keepdims=True)
+    np.divide(bone_weights['weights'], total, out=bone_weights['weights'], where=total > 0)
+    return bone_weights, overflow
 
 
 class MeshStore:
 
     def __init__(self, name: str,
-                 vertices: List[bpy.types.MeshVertex],
-                 materials: List[bpy.types.Material],
+                 mesh: bpy.types.Mesh,
                  vertex_groups: List[bpy.types.VertexGroup],
-                 bone_names: List[str]
+                 bone_names: List[str],
+                 use_uvs: bool=True
                  )->None:
+        '''
+        use_uvs: read the active uv layer. without it uv seams do not split vertices
+        '''
         self.name = name
-        self.positions: Any = (Vector3 * len(vertices))()
-        self.normals: Any = (Vector3 * len(vertices))()
-        for i, v in enumerate(vertices):
-            self.positions[i] = Vector3_from_meshVertex(v.co)
-            self.normals[i] = Vector3_from_meshVertex(v.normal)
-
-        self.submesh_map: Dict[int, Submesh] = {}
-
-        self.materials: List[bpy.types.Material] = materials
-
-        self.face_vertices: List[FaceVertex] = []
-        self.face_vertex_map: Dict[FaceVertex, int] = {}
+        self.materials: List[bpy.types.Material] = list(mesh.materials)
+
+        mesh.calc_loop_triangles()
+        use_split_normals = getattr(mesh, 'use_auto_smooth', False)
+        if use_split_normals:
+            mesh.calc_normals_split()
+
+        vertex_count = len(mesh.vertices)
+        triangle_count = len(mesh.loop_triangles)
+        self.positions = _foreach_get(mesh.vertices, 'co', np.float32, (vertex_count, 3))
+        self.vertex_normals = _foreach_get(mesh.vertices, 'normal', np.float32, (vertex_count, 3))
+
+        triangles = mesh.loop_triangles
+        self.triangle_vertices = _foreach_get(triangles, 'vertices', np.int32, (triangle_count, 3))
+        self.triangle_loops = _foreach_get(triangles, 'loops', np.int32, (triangle_count, 3))
+        self.material_indices = _foreach_get(triangles, 'material_index', np.int32, (triangle_count,))
+        self.smooth = _foreach_get(triangles, 'use_smooth', np.bool_, (triangle_count,))
+        self.triangle_normals = _foreach_get(triangles, 'normal', np.float32, (triangle_count, 3))
+        self.split_normals: Optional[np.ndarray] = None
+        if use_split_normals:
+            self.split_normals = _foreach_get(
+                triangles, 'split_normals', np.float32, (triangle_count, 3, 3))
+
+        self.uvs: Optional[np.ndarray] = None
+        uv_layer = mesh.uv_layers.active if use_uvs else None
+        if uv_layer:
+            self.uvs = _foreach_get(uv_layer.data, 'uv', np.float32, (len(mesh.loops), 2))
 
         self.vertex_group_names = [g.name for g in vertex_groups]
         self.bone_names = bone_names
-        self.bone_weights = (BoneWeight * len(vertices))()
-        for i, v in enumerate(vertices):
-            for ve in v.groups:
-                vg_name = self.vertex_group_names[ve.group]
-                if vg_name in self.bone_names:
-                    PushBoneWeight(self.bone_weights[i], ve.group, ve.weight)
-
-    def get_or_create_submesh(self, material_index: int)->Submesh:
-        if material_index not in self.submesh_map:
-            self.submesh_map[material_index] = Submesh(material_index)
-        return self.submesh_map[material_index]
-
-    def get_or_add_face(self, vertex_index: int, uv: mathutils.Vector, normal: Optional[mathutils.Vector])->int:
-        face = FaceVertex(vertex_index,
-                          Vector3_from_meshVertex(normal) if normal else None,
-                          Vector2_from_faceUV(uv) if uv else None)
-        if face not in self.face_vertex_map:
-            index = len(self.face_vertices)
-            self.face_vertex_map[face] = index
-            self.face_vertices.append(face)
-        return self.face_vertex_map[face]
-
-    def add_face(self, face: bpy.types.MeshTessFace, uv_texture_face: Optional[bpy.types.MeshTextureFace])->List[Tuple[int, int, int]]:
-
-        if len(face.vertices) == 3:
-            i0 = self.get_or_add_face(
-                face.vertices[0],
-                uv_texture_face.uv1 if uv_texture_face else None,
-                None if face.use_smooth else face.normal)
-
-            i1 = self.get_or_add_face(
-                face.vertices[1],
-                uv_texture_face.uv2 if uv_texture_face else None,
-                None if face.use_smooth else face.normal)
-
-            i2 = self.get_or_add_face(
-                face.vertices[2],
-                uv_texture_face.uv3 if uv_texture_face else None,
-                None if face.use_smooth else face.normal)
-            return [(i0, i1, i2)]
-
-        elif len(face.vertices) == 4:
-            i0 = self.get_or_add_face(
-                face.vertices[0],
-                uv_texture_face.uv1 if uv_texture_face else None,
-                None if face.use_smooth else face.normal)
-
-            i1 = self.get_or_add_face(
-                face.vertices[1],
-                uv_texture_face.uv2 if uv_texture_face else None,
-                None if face.use_smooth else face.normal)
-
-            i2 = self.get_or_add_face(
-                face.vertices[2],
-                uv_texture_face.uv3 if uv_texture_face else None,
-                None if face.use_smooth else face.normal)
-
-            i3 = self.get_or_add_face(
-                face.vertices[3],
-                uv_texture_face.uv4 if uv_texture_face else None,
-                None if face.use_smooth else face.normal)
-
-            return [(i0, i1, i2), (i2, i3, i0)]
-
+        self.bone_weights: Optional[np.ndarray] = None
+        # vertices with more than 4 bone weights, the lightest are dropped
+        self.weight_overflow = 0
+        if self.bone_names:
+            self.bone_weights, self.weight_overflow = read_bone_weights(
+                mesh.vertices, self.vertex_group_names, self.bone_names)
+
+    @property
+    def triangle_count(self)->int:
+        return len(self.triangle_vertices)
+
+    def get_corner_normals(self, corners: np.ndarray)->np.ndarray:
+        '''
+        corners: triangle index * 3 + corner
+        vertex normal if smooth else face normal
+        '''
+        if self.split_normals is not None:
+            return self.split_normals.reshape(-1, 3)[corners]
+        triangles = corners // 3
+        normals = self.vertex_normals[self.triangle_vertices.ravel()[corners]]
+        flat = ~self.smooth[triangles]
+        if flat.any():
+            normals[flat] = self.triangle_normals[triangles[flat]]
+        return normals
+
+    def get_corner_uvs(self, corners: np.ndarray)->Optional[np.ndarray]:
+        if self.uvs is None:
+            return None
+        return self.uvs[self.triangle_loops.ravel()[corners]]
+
+    def get_corner_keys(self, corners: np.ndarray)->np.ndarray:
+        '''
+        uint32 (len(corners), columns). (vertex, normal, uv) bits. + 0.0 folds -0.0 into 0.0
+        '''
+        uvs = self.get_corner_uvs(corners)
+        keys = np.empty((len(corners), 4 if uvs is None else 6), dtype=np.uint32)
+        keys[:, 0] = self.triangle_vertices.ravel()[corners]
+        keys[:, 1:4] = (self.get_corner_normals(corners) + np.float32(0)).view(np.uint32)
+        if uvs is not None:
+            keys[:, 4:6] = (uvs + np.float32(0)).view(np.uint32)
+        return keys
+
+    def unique_corners(self)->Tuple[np.ndarray, np.ndarray]:
+        '''
+        a gltf vertex is a unique (vertex, normal, uv) of the triangle corners.
+
+        return (first, inverse)
+        first: corner index of each gltf vertex, in order of appearance
+        inverse: uint32 gltf vertex index of each corner
+        '''
+        corner_vertices = self.triangle_vertices.ravel()
+        count = len(corner_vertices)
+        corners = np.arange(count, dtype=np.int32)
+
+        # most corners equal a representative corner of their vertex.
+        # only the others(uv seams, flat faces) are keyed and go through unique_rows
+        representative = np.zeros(len(self.positions), dtype=corners.dtype)
+        representative[corner_vertices[::-1]] = corners[::-1]
+        canonical = representative[corner_vertices]
+
+        if self.split_normals is not None:
+            normals = self.split_normals.reshape(-1, 3)
+            split = (normals != normals[canonical]).any(axis=1)
         else:
-            raise Exception(f'face.vertices: {len(face.vertices)}')
-
-    def freeze(self, skin_bone_names: List[str])->Mesh:
-
-        positions = (Vector3 * len(self.face_vertices))()
-        fv_to_v_index: Dict[int, int] = {}
-        for i, v in enumerate(self.face_vertices):
-            positions[i] = self.positions[v.position_index]
-            fv_to_v_index[i] = v.position_index
-        position_min, position_max = get_min_max3(positions)
-
-        normals = (Vector3 * len(self.face_vertices))()
-        for i, v in enumerate(self.face_vertices):
-            normals[i] = v.normal if v.normal else self.normals[v.position_index]
-        normal_min, normal_max = get_min_max3(normals)
-
-        uvs_values = None
-        if any(f.uv for f in self.face_vertices):
-            uvs = (Vector2 * len(self.face_vertices))()
-            for i, v in enumerate(self.face_vertices):
-                uvs[i] = v.uv
-            uvs_min, uvs_max = get_min_max2(uvs)
-            uvs_values = Values(memoryview(uvs), uvs_min,  # type: ignore
-                                uvs_max)
-
-        submeshes = [x for x in self.submesh_map.values()]
+            flat = np.repeat(~self.smooth, 3)
+            split = flat | flat[canonical]
+        if self.uvs is not None:
+            uv_bits = (self.uvs + np.float32(0)).view(np.uint64).ravel()
+            corner_uv_bits = uv_bits[self.triangle_loops.ravel()]
+            split |= corner_uv_bits != corner_uv_bits[canonical]
+        split_corners = np.flatnonzero(split)
+        if len(split_corners):
+            first, inverse = unique_rows(self.get_corner_keys(split_corners))
+            canonical[split_corners] = split_corners[first][inverse]
+
+        used = np.zeros(count, dtype=np.bool_)
+        used[canonical] = True
+        first = np.flatnonzero(used)
+        rank = np.empty(count, dtype=np.uint32)
+        rank[first] = np.arange(len(first), dtype=np.uint32)
+        return first, rank[canonical]
+
+    def freeze(self, materials: List[Optional[scene.Material]])->scene.Mesh:
+        '''
+        materials: converted self.materials
+        '''
+        first, inverse = self.unique_corners()
+
+        position_indices = self.triangle_vertices.ravel()[first]
+        # bpy vertex of each frozen vertex
+        self.vertex_indices = position_indices
+        positions = z_up_to_y_up(self.positions[position_indices])
+        normals = z_up_to_y_up(self.get_corner_normals(first))
+        uvs = self.get_corner_uvs(first)
+        if uvs is not None:
+            uvs[:, 1] *= -1
+
+        # stable sort keeps the triangle order inside each submesh
+        indices = inverse.reshape(-1, 3)
+        order = np.argsort(self.material_indices, kind='stable')
+        sorted_material_indices = self.material_indices[order]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_material_indices)) + 1))
+        ends = np.append(starts[1:], len(order))
+        submeshes: List[scene.Submesh] = []
+        for start, end in zip(starts, ends):
+            if start == end:
+                continue
+            material_index = sorted_material_indices[start]
+            material = materials[material_index] if 0 <= material_index < len(materials) else None
+            submeshes.append(scene.Submesh(indices[order[start:end]].ravel(), material))
 
         joints = None
         weights = None
-        if skin_bone_names and len(skin_bone_names) > 0:
-            group_index_to_joint_index = {i: skin_bone_names.index(
-                vertex_group) for i, vertex_group in enumerate(self.vertex_group_names) if vertex_group in skin_bone_names}
-            joints = (IVector4 * len(self.face_vertices))()
-            weights = (Vector4 * len(self.face_vertices))()
-            for i, v in enumerate(self.face_vertices):
-                index = fv_to_v_index[i]
-                joints[i] = GetBoneJoints(
-                    self.bone_weights[index], group_index_to_joint_index)
-                weights[i] = self.bone_weights[index].weights
-
-        return Mesh(
+        if self.bone_weights is not None:
+            bone_weights = self.bone_weights[position_indices]
+            joints = bone_weights['groups']
+            weights = bone_weights['weights']
+
+        return scene.Mesh(
             name=self.name,
-            positions=Values(memoryview(positions), position_min,  # type: ignore
-                             position_max),
-            normals=Values(memoryview(normals), normal_min,  # type: ignore
-                           normal_max),
-            uvs=uvs_values if uvs_values else None,
-            materials=self.materials,
+            positions=positions,
+            normals=normals,
+            uvs=uvs,
             submeshes=submeshes,
-            joints=memoryview(joints) if joints else None,  # type: ignore
-            weights=memoryview(weights) if weights else None  # type: ignore
+            joints=joints,
+            weights=weights,
+            vertex_group_names=self.vertex_group_names
         )
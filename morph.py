@@ -0,0 +1,83 @@
+'''
+compress baked deformation into a few morph targets and their weight animation.
+
+the per frame vertex deltas are factored with svd(PCA without centering,
+a zero weight is the rest pose). the smallest basis within the tolerance is kept.
+'''
+from typing import NamedTuple, Optional
+import numpy as np
+
+
+class MorphBake(NamedTuple):
+    # sample every frame_step frames of the scene frame range
+    frame_step: int = 1
+    max_targets: int = 16
+    # max vertex distance between the sampled and the reconstructed positions
+    tolerance: float = 1e-3
+
+
+class Deformation(NamedTuple):
+    # float32 (frame count,). seconds from the first sampled frame
+    times: np.ndarray
+    # float32 (frame count, bpy vertex count, 3). evaluated positions, z-up object space
+    positions: np.ndarray
+
+
+class MorphResult(NamedTuple):
+    # float32 (target count, vertex count, 3)
+    targets: np.ndarray
+    # float32 (frame count, target count). within [-1, 1]
+    weights: np.ndarray
+    # max vertex distance of the reconstruction
+    error: float
+
+
+def max_motion(positions: np.ndarray)->float:
+    '''
+    positions: (frame count, vertex count, 3). Deformation.positions
+
+    max vertex distance from the first frame. a static modifier(subdivision, bevel) does not move
+    '''
+    if not positions.size:
+        return 0.0
+    return float(np.sqrt(((positions - positions[:1]) ** 2).sum(axis=2).max()))
+
+
+def compress_deformation(deltas: np.ndarray, max_targets: int, tolerance: float)->Optional[MorphResult]:
+    '''
+    deltas: (frame count, vertex count, 3). sampled positions - rest positions
+
+    return None if no vertex moves over tolerance
+    '''
+    frame_count, vertex_count = deltas.shape[:2]
+    x = deltas.reshape(frame_count, vertex_count * 3).astype(np.float64)
+    residual = x.copy()
+
+    def max_error()->float:
+        if not residual.size:
+            return 0.0
+        return float(np.sqrt((residual.reshape(frame_count, vertex_count, 3) ** 2).sum(axis=2).max()))
+
+    error = max_error()
+    if error <= tolerance:
+        return None
+
+    u, s, vt = np.linalg.svd(x, full_matrices=False)
+    count = 0
+    for count in range(1, min(max_targets, len(s)) + 1):
+        i = count - 1
+        residual -= np.outer(u[:, i] * s[i], vt[i])
+        error = max_error()
+        if error <= tolerance:
+            break
+
+    weights = u[:, :count] * s[:count]
+    targets = vt[:count].copy()
+    # weights in [-1, 1], the targets take the scale
+    scale = np.abs(weights).max(axis=0)
+    scale[scale == 0] = 1
+    weights /= scale
+    targets *= scale[:, None]
+    return MorphResult(targets.reshape(count, vertex_count, 3).astype(np.float32),
+                       weights.astype(np.float32), error)
+
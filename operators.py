@@ -0,0 +1,361 @@
+import bpy
+from bpy.props import BoolProperty
+from bpy.props import EnumProperty
+from bpy.props import FloatProperty
+from bpy.props import IntProperty
+from bpy.props import StringProperty
+
+
+# seconds between modal steps of the background export
+TIMER_INTERVAL = 0.05
+# seconds of extraction in each step
+EXTRACT_SLICE = 0.05
+
+
+class ExportYUP(bpy.types.Operator):
+    """Export selection to YUP"""
+
+    bl_idname = "export_scene.yup"
+    bl_label = "Export YUP GLTF"
+
+    filepath = StringProperty(subtype="FILE_PATH")
+
+    # Export options
+
+    selectedonly = BoolProperty(
+        name="Export Selected Objects Only",
+        description="Export only selected objects",
+        default=True,
+    )
+
+    texture_max_size = IntProperty(
+        name="Max Texture Size",
+        description="Downscale textures larger than this. 0 for no limit",
+        default=0,
+        min=0,
+    )
+
+    color_texture_max_size = IntProperty(
+        name="Max Color Texture Size",
+        description="Downscale color textures larger than this. 0 for no limit",
+        default=0,
+        min=0,
+    )
+
+    normal_texture_max_size = IntProperty(
+        name="Max Normal Map Size",
+        description="Downscale normal maps larger than this. 0 for no limit",
+        default=0,
+        min=0,
+    )
+
+    texture_power_of_two = BoolProperty(
+        name="Power of Two Textures",
+        description="Resize textures to the nearest power of two",
+        default=False,
+    )
+
+    texture_filter = EnumProperty(
+        name="Texture Filter",
+        items=[
+            ("lanczos", "Lanczos", "Lanczos3 filter"),
+            ("box", "Box", "Box filter, faster"),
+        ],
+        default="lanczos",
+    )
+
+    texture_atlas = BoolProperty(
+        name="Texture Atlas",
+        description="Pack small color textures that do not repeat, or whose uvs stay within 0-1, into atlases",
+        default=False,
+    )
+
+    stream_meshes = BoolProperty(
+        name="Stream Meshes",
+        description="Pack and release each mesh right after extraction to cap memory. Disables texture, transform and merge passes",
+        default=False,
+    )
+
+    bake_deformation = BoolProperty(
+        name="Bake Deformation",
+        description="Sample modifier and shape key deformation over the frame range into morph targets and a weight animation",
+        default=False,
+    )
+
+    bake_frame_step = IntProperty(
+        name="Bake Frame Step",
+        description="Sample every n frames",
+        default=1,
+        min=1,
+    )
+
+    morph_max_targets = IntProperty(
+        name="Max Morph Targets",
+        description="Morph targets per baked mesh",
+        default=16,
+        min=1,
+    )
+
+    morph_tolerance = FloatProperty(
+        name="Morph Tolerance",
+        description="Max vertex error of the baked deformation",
+        default=1e-3,
+        min=1e-6,
+        precision=6,
+    )
+
+    cleanup_geometry = BoolProperty(
+        name="Clean Up Geometry",
+        description="Weld coincident vertices, remove degenerate and duplicate triangles and unused vertices",
+        default=False,
+    )
+
+    weld_tolerance = FloatProperty(
+        name="Weld Distance",
+        description="Vertices closer than this weld, if their normals and UVs match",
+        default=1e-5,
+        min=1e-7,
+        precision=6,
+    )
+
+    gpu_instancing = BoolProperty(
+        name="GPU Instancing",
+        description="Draw static objects sharing a mesh as EXT_mesh_gpu_instancing instances",
+        default=False,
+    )
+
+    apply_transforms = BoolProperty(
+        name="Apply Object Transforms",
+        description="Bake the world transform of static meshes into their vertices",
+        default=False,
+    )
+
+    merge_meshes = BoolProperty(
+        name="Merge Meshes",
+        description="Bake static meshes into world space and merge them by material",
+        default=False,
+    )
+
+    chunk_max_triangles = IntProperty(
+        name="Chunk Triangles",
+        description="Split larger submeshes into spatial chunks that can be culled. 0 to keep them whole",
+        default=0,
+        min=0,
+    )
+
+    remove_empty_nodes = BoolProperty(
+        name="Remove Empty Nodes",
+        description="Remove nodes without mesh or skin that are not bones",
+        default=False,
+    )
+
+    buffer_partition = EnumProperty(
+        name="Buffers",
+        items=[
+            ("single", "Single", "One .bin"),
+            ("mesh", "Per Mesh", "One .bin per mesh"),
+            ("texture", "Per Texture Set", "One .bin per material textures"),
+            ("size", "Size Cap", "Start a new .bin over Max Buffer Size"),
+        ],
+        default="single",
+    )
+
+    buffer_max_size = IntProperty(
+        name="Max Buffer Size (MB)",
+        description="Buffer size cap of the Size Cap partition",
+        default=256,
+        min=1,
+    )
+
+    validate = BoolProperty(
+        name="Validate",
+        description="Check the exported file and write <name>.validation.json",
+        default=False,
+    )
+
+    size_report = BoolProperty(
+        name="Size Report",
+        description="Write <name>.size.json with the bytes per attribute, mesh, texture and view",
+        default=False,
+    )
+
+    deterministic = BoolProperty(
+        name="Deterministic",
+        description="Same bytes for the same scene. Writes a hash manifest and skips unchanged files",
+        default=False,
+    )
+
+    background = BoolProperty(
+        name="Background",
+        description="Keep the UI responsive. Extract in time slices, encode and write on a worker thread. Esc cancels",
+        default=False,
+    )
+
+    profile = BoolProperty(
+        name="Write Profile",
+        description="Write per stage timings as <name>.profile.json",
+        default=False,
+    )
+
+    profile_chrome_trace = BoolProperty(
+        name="Write Chrome Trace",
+        description="Also write <name>.trace.json for chrome://tracing",
+        default=False,
+    )
+
+    profile_memory = BoolProperty(
+        name="Profile Memory",
+        description="Record tracemalloc peak of each stage (slow)",
+        default=False,
+    )
+
+    def execute(self, context):
+        import os
+        import pathlib
+
+        # .zip, .tar bundle the output, .glb.gz/.glb.zst and .tar.gz/.tar.zst compress it
+        ext = os.path.splitext(self.filepath)[1].lower()
+        if ext not in (".gltf", ".glb", ".zip", ".tar", ".gz", ".zst"):
+            self.filepath = bpy.path.ensure_ext(self.filepath, ".gltf")
+        path = pathlib.Path(self.filepath).absolute()
+
+        from . import yup
+        from .sink import check_path
+        try:
+            check_path(path, self.buffer_partition)
+        except (ValueError, ImportError) as ex:
+            self.report({"ERROR"}, str(ex))
+            return {"CANCELLED"}
+        from .settings import ExportSettings
+
+        settings = ExportSettings(
+            texture_max_size=self.texture_max_size,
+            color_texture_max_size=self.color_texture_max_size,
+            normal_texture_max_size=self.normal_texture_max_size,
+            texture_power_of_two=self.texture_power_of_two,
+            texture_filter=self.texture_filter,
+            texture_atlas=self.texture_atlas,
+            stream_meshes=self.stream_meshes,
+            bake_deformation=self.bake_deformation,
+            bake_frame_step=self.bake_frame_step,
+            morph_max_targets=self.morph_max_targets,
+            morph_tolerance=self.morph_tolerance,
+            cleanup_geometry=self.cleanup_geometry,
+            weld_tolerance=self.weld_tolerance,
+            gpu_instancing=self.gpu_instancing,
+            apply_transforms=self.apply_transforms,
+            merge_meshes=self.merge_meshes,
+            chunk_max_triangles=self.chunk_max_triangles,
+            remove_empty_nodes=self.remove_empty_nodes,
+            buffer_partition=self.buffer_partition,
+            buffer_max_size=self.buffer_max_size * 1024 * 1024,
+            validate=self.validate,
+            size_report=self.size_report,
+            deterministic=self.deterministic,
+            profile=self.profile,
+            profile_chrome_trace=self.profile_chrome_trace,
+            profile_memory=self.profile_memory,
+        )
+        if not self.background:
+            yup.export(path, self.selectedonly, settings)
+            return {"FINISHED"}
+
+        import concurrent.futures
+
+        self._job = yup.ExportJob(path, self.selectedonly, settings)
+        self._steps = self._job.extract()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._future = None
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(TIMER_INTERVAL, window=context.window)
+        wm.progress_begin(0, 100)
+        wm.modal_handler_add(self)
+        return {"RUNNING_MODAL"}
+
+    def modal(self, context, event):
+        import time
+
+        if event.type == "ESC":
+            self._job.cancel()
+        if event.type != "TIMER":
+            return {"PASS_THROUGH"}
+
+        if not self._future:
+            # extract on the main thread until the slice is used up
+            deadline = time.perf_counter() + EXTRACT_SLICE
+            try:
+                while time.perf_counter() < deadline:
+                    next(self._steps)
+            except StopIteration:
+                self._future = self._executor.submit(self._job.finish)
+            except Exception as ex:
+                return self._fail(context, ex)
+
+        elif self._future.done():
+            ex = self._future.exception()
+            if ex:
+                return self._fail(context, ex)
+            self._cleanup(context)
+            self.report({"INFO"}, f"exported {self._job.path}")
+            return {"FINISHED"}
+
+        context.window_manager.progress_update(int(self._job.progress * 100))
+        return {"PASS_THROUGH"}
+
+    def _fail(self, context, ex):
+        from . import yup
+
+        self._cleanup(context)
+        if isinstance(ex, yup.ExportCancelled):
+            self.report({"WARNING"}, "export cancelled")
+        else:
+            self.report({"ERROR"}, f"export failed: {ex}")
+        return {"CANCELLED"}
+
+    def _cleanup(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        self._steps.close()
+        self._executor.shutdown(wait=False)
+
+    def invoke(self, context, event):
+        if not self.filepath:
+            self.filepath = bpy.path.ensure_ext(bpy.data.filepath, ".gltf")
+        context.window_manager.fileselect_add(self)
+        return {"RUNNING_MODAL"}
+
+
+class ImportYUP(bpy.types.Operator):
+    """Import GLTF with YUP"""
+
+    bl_idname = "import_scene.yup"
+    bl_label = "Import YUP GLTF"
+
+    filepath = StringProperty(subtype="FILE_PATH")
+
+    filter_glob = StringProperty(default="*.gltf;*.glb", options={"HIDDEN"})
+
+    def execute(self, context):
+        import pathlib
+
+        from . import importer
+
+        importer.import_gltf(pathlib.Path(self.filepath).absolute())
+
+        return {"FINISHED"}
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {"RUNNING_MODAL"}
+
+
+def menu_func(self, context):
+    self.layout.operator(ExportYUP.bl_idname, text="YUP GLTF (.gltf)")
+
+
+def menu_func_import(self, context):
+    self.layout.operator(ImportYUP.bl_idname, text="YUP GLTF (.gltf/.glb)")
+
+
+CLASSES = [ExportYUP, ImportYUP]
@@ -0,0 +1,136 @@
+'''
+structured timing spans for the export stages.
+
+    profiler = Profiler(trace_memory=True)
+    with profiler.span('freeze', mesh=name) as span:
+        mesh = store.freeze(materials)
+        span.counts['unique_vertices'] = mesh.vertex_count
+    profiler.write_report(path)
+    profiler.write_chrome_trace(path)
+'''
+import contextlib
+import json
+import pathlib
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Iterator
+
+
+class Span:
+    def __init__(self, name: str, depth: int, start: float, counts: Dict[str, Any])->None:
+        self.name = name
+        self.depth = depth
+        self.start = start
+        self.end = start
+        self.counts = counts
+        # traced peak - traced at the start of span. None if not tracing
+        self.memory_peak_delta: Optional[int] = None
+
+    @property
+    def duration(self)->float:
+        return self.end - self.start
+
+    def to_dict(self)->Dict[str, Any]:
+        d: Dict[str, Any] = {
+            'name': self.name,
+            'depth': self.depth,
+            'start': self.start,
+            'duration': self.duration,
+        }
+        if self.counts:
+            d['counts'] = self.counts
+        if self.memory_peak_delta is not None:
+            d['memory_peak_delta'] = self.memory_peak_delta
+        return d
+
+
+class Profiler:
+    def __init__(self, trace_memory: bool=False)->None:
+        self.trace_memory = trace_memory
+        self.origin = time.perf_counter()
+        self.spans: List[Span] = []
+        # [traced at start, peak seen] of open spans
+        self.memory_stack: List[List[int]] = []
+        self.depth = 0
+
+    @contextlib.contextmanager
+    def span(self, name: str, **counts: Any)->Iterator[Span]:
+        span = Span(name, self.depth, time.perf_counter() - self.origin, counts)
+        self.spans.append(span)
+        self.depth += 1
+
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.memory_stack:
+                parent = self.memory_stack[-1]
+                parent[1] = max(parent[1], peak)
+            if hasattr(tracemalloc, 'reset_peak'):
+                # python3.9 or later
+                tracemalloc.reset_peak()
+            self.memory_stack.append([current, 0])
+
+        try:
+            yield span
+        finally:
+            if tracing:
+                start, child_peak = self.memory_stack.pop()
+                peak = max(tracemalloc.get_traced_memory()[1], child_peak)
+                span.memory_peak_delta = peak - start
+                if self.memory_stack:
+                    parent = self.memory_stack[-1]
+                    parent[1] = max(parent[1], peak)
+
+            self.depth -= 1
+            span.end = time.perf_counter() - self.origin
+
+    @contextlib.contextmanager
+    def tracing(self)->Iterator[None]:
+        '''
+        start tracemalloc during the block if trace_memory
+        '''
+        if not self.trace_memory or tracemalloc.is_tracing():
+            yield
+            return
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            tracemalloc.stop()
+
+    def get_totals(self)->Dict[str, Dict[str, Any]]:
+        totals: Dict[str, Dict[str, Any]] = {}
+        for span in self.spans:
+            total = totals.setdefault(span.name, {'count': 0, 'seconds': 0.0})
+            total['count'] += 1
+            total['seconds'] += span.duration
+        return totals
+
+    def to_report(self)->Dict[str, Any]:
+        return {
+            'spans': [span.to_dict() for span in self.spans],
+            'totals': self.get_totals(),
+        }
+
+    def write_report(self, path: pathlib.Path):
+        path.write_text(json.dumps(self.to_report(), indent=2))
+
+    def write_chrome_trace(self, path: pathlib.Path):
+        '''
+        chrome://tracing or https://ui.perfetto.dev
+        '''
+        events = []
+        for span in self.spans:
+            args = dict(span.counts)
+            if span.memory_peak_delta is not None:
+                args['memory_peak_delta'] = span.memory_peak_delta
+            events.append({
+                'name': span.name,
+                'ph': 'X',
+                'ts': span.start * 1000000,
+                'dur': span.duration * 1000000,
+                'pid': 1,
+                'tid': 1,
+                'args': args,
+            })
+        path.write_text(json.dumps({'traceEvents': events}))
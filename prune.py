@@ -0,0 +1,69 @@
+'''
+remove nodes that carry nothing but a transform.
+'''
+from typing import List, Set, Optional, Iterable
+from .scene import Scene, Node
+
+
+def get_joints(scene: Scene)->Set[Node]:
+    joints: Set[Node] = set()
+    for skin in scene.skins:
+        for joint in skin.root.traverse():
+            joints.add(joint)
+    return joints
+
+
+def is_removable(node: Node, joints: Set[Node])->bool:
+    if node.mesh or node.skin or node.animated:
+        return False
+    if node in joints:
+        return False
+    return True
+
+
+def expand(nodes: List[Node], removed: Set[Node])->List[Node]:
+    '''
+    replace removed nodes with their children, keeping the order.
+    '''
+    result: List[Node] = []
+    stack = list(reversed(nodes))
+    while stack:
+        node = stack.pop()
+        if node in removed:
+            stack.extend(reversed(node.children))
+        else:
+            result.append(node)
+    return result
+
+
+def remove_empty_nodes(scene: Scene, candidates: Optional[Iterable[Node]]=None)->int:
+    '''
+    remove mesh-less, skin-less nodes that are not joints.
+    leaves are dropped, pass-through nodes hand their children to the nearest kept ancestor.
+
+    Node.matrix is in world space,
+    so the transform of a removed node is folded into the local transform of its children.
+
+    candidates: remove only these if removable
+
+    return the removed node count
+    '''
+    joints = get_joints(scene)
+    removed = set(node for node in (scene.nodes if candidates is None else candidates)
+                  if is_removable(node, joints))
+    if not removed:
+        return 0
+
+    kept = [node for node in scene.nodes if node not in removed]
+    children = {node: expand(node.children, removed) for node in kept}
+    for node in kept:
+        node.children = children[node]
+        for child in node.children:
+            child.parent = node
+
+    scene.root_nodes = expand(scene.root_nodes, removed)
+    for node in scene.root_nodes:
+        node.parent = None
+
+    scene.nodes = kept
+    return len(removed)
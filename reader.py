@@ -0,0 +1,177 @@
+'''
+read .glb or .gltf + .bin without copying the binary.
+
+    data = read(path)
+    positions = data.accessor(data.gltf.meshes[0].primitives[0].attributes['POSITION'])
+
+accessors are numpy views(strided if the bufferView has byteStride) into read-only memory maps.
+'''
+import base64
+import json
+import pathlib
+import struct
+import typing
+import urllib.parse
+from enum import Enum
+from typing import Any, Dict, List, Optional, Union
+import numpy as np
+
+from . import gltf
+
+
+def _from_json(t: Any, value: Any)->Any:
+    if value is None:
+        return None
+
+    origin = getattr(t, '__origin__', None)
+    args = getattr(t, '__args__', ())
+    if origin is Union:
+        # Optional[X]
+        for arg in args:
+            if arg is not type(None):
+                return _from_json(arg, value)
+        return value
+    if origin in (list, List):
+        return [_from_json(args[0], x) for x in value] if args else list(value)
+    if origin in (dict, Dict):
+        return {k: _from_json(args[1], v) for k, v in value.items()} if args else dict(value)
+    if origin in (tuple, typing.Tuple):
+        return tuple(value)
+    if isinstance(t, type):
+        if issubclass(t, Enum):
+            return t(value)
+        if issubclass(t, tuple) and hasattr(t, '_fields'):
+            return from_json(t, value)
+    return value
+
+
+def from_json(t: Any, d: Dict[str, Any])->Any:
+    '''
+    json dict to gltf NamedTuple. unknown keys are dropped.
+    missing keys without default are empty for List and Dict, otherwise None.
+    '''
+    hints = typing.get_type_hints(t)
+    kw: Dict[str, Any] = {}
+    for field in t._fields:
+        if field in d:
+            kw[field] = _from_json(hints[field], d[field])
+        elif field not in t._field_defaults:
+            origin = getattr(hints[field], '__origin__', None)
+            if origin in (list, List):
+                kw[field] = []
+            elif origin in (dict, Dict):
+                kw[field] = {}
+            else:
+                kw[field] = None
+    return t(**kw)
+
+
+def component_dtype(component_type: gltf.GLTFAccessorComponentType)->np.dtype:
+    return np.dtype({
+        gltf.GLTFAccessorComponentType.BYTE: '<i1',
+        gltf.GLTFAccessorComponentType.UNSIGNED_BYTE: '<u1',
+        gltf.GLTFAccessorComponentType.SHORT: '<i2',
+        gltf.GLTFAccessorComponentType.UNSIGNED_SHORT: '<u2',
+        gltf.GLTFAccessorComponentType.UNSIGNED_INT: '<u4',
+        gltf.GLTFAccessorComponentType.FLOAT: '<f4',
+    }[component_type])
+
+
+ELEMENT_COUNT = {
+    gltf.GLTFAccessorType.SCALAR: 1,
+    gltf.GLTFAccessorType.VEC2: 2,
+    gltf.GLTFAccessorType.VEC3: 3,
+    gltf.GLTFAccessorType.VEC4: 4,
+    gltf.GLTFAccessorType.MAT2: 4,
+    gltf.GLTFAccessorType.MAT3: 9,
+    gltf.GLTFAccessorType.MAT4: 16,
+}
+
+
+class GLTFData:
+    def __init__(self, path: pathlib.Path, gltf: gltf.GLTF, buffers: List[np.ndarray])->None:
+        '''
+        buffers: uint8
+        '''
+        self.path = path
+        self.gltf = gltf
+        self.buffers = buffers
+
+    def buffer_view(self, index: int)->np.ndarray:
+        '''
+        uint8 view of a bufferView. for images
+        '''
+        view = self.gltf.bufferViews[index]
+        buffer = self.buffers[view.buffer if view.buffer else 0]
+        return buffer[view.byteOffset:view.byteOffset + view.byteLength]
+
+    def accessor(self, index: int)->np.ndarray:
+        '''
+        (count,) for SCALAR, (count, element count) for others.
+        no copy unless the accessor has no bufferView.
+        '''
+        accessor = self.gltf.accessors[index]
+        dtype = component_dtype(accessor.componentType)
+        element_count = ELEMENT_COUNT[accessor.type]
+        shape = (accessor.count,) if element_count == 1 else (accessor.count, element_count)
+        if accessor.bufferView is None:
+            return np.zeros(shape, dtype=dtype)
+
+        view = self.gltf.bufferViews[accessor.bufferView]
+        buffer = self.buffers[view.buffer if view.buffer else 0]
+        stride = view.byteStride if view.byteStride else dtype.itemsize * element_count
+        strides = (stride,) if element_count == 1 else (stride, dtype.itemsize)
+        return np.ndarray(shape, dtype=dtype, buffer=buffer,  # type: ignore
+                          offset=view.byteOffset + (accessor.byteOffset or 0),
+                          strides=strides)
+
+
+def _map(path: pathlib.Path)->np.ndarray:
+    if path.stat().st_size == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode='r')
+
+
+def _load_buffer(base: pathlib.Path, buffer: gltf.GLTFBUffer)->np.ndarray:
+    if buffer.uri.startswith('data:'):
+        # data:application/octet-stream;base64,...
+        return np.frombuffer(base64.b64decode(buffer.uri.split(',', 1)[1]), dtype=np.uint8)
+    return _map(base / urllib.parse.unquote(buffer.uri))
+
+
+def read(path: pathlib.Path)->GLTFData:
+    path = pathlib.Path(path)
+    data = _map(path)
+    bin_chunk: Optional[np.ndarray] = None
+
+    if bytes(data[:4]) == b'glTF':
+        version, length = struct.unpack_from('<II', data, 4)
+        if version != 2:
+            raise NotImplementedError(f'glb version: {version}')
+        json_chunk: Optional[bytes] = None
+        pos = 12
+        while pos < length:
+            chunk_length, chunk_type = struct.unpack_from('<I4s', data, pos)
+            chunk = data[pos + 8:pos + 8 + chunk_length]
+            if chunk_type == b'JSON':
+                json_chunk = bytes(chunk)
+            elif chunk_type == b'BIN\x00':
+                bin_chunk = chunk
+            pos += 8 + chunk_length
+        if json_chunk is None:
+            raise ValueError(f'{path}: no JSON chunk')
+        gltf_root: gltf.GLTF = from_json(gltf.GLTF, json.loads(json_chunk.decode('utf-8')))
+    else:
+        gltf_root = from_json(gltf.GLTF, json.loads(bytes(data).decode('utf-8')))
+
+    buffers = []
+    for i, buffer in enumerate(gltf_root.buffers):
+        if buffer.uri is None:
+            # the first buffer without uri is the BIN chunk of a glb
+            if i != 0 or bin_chunk is None:
+                raise ValueError(f'{path}: buffer {i} has no uri and no BIN chunk')
+            buffers.append(bin_chunk)
+        else:
+            buffers.append(_load_buffer(path.parent, buffer))
+
+    return GLTFData(path, gltf_root, buffers)
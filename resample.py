@@ -0,0 +1,173 @@
+'''
+texture size budget. separable box / lanczos resampling with numpy.
+'''
+from typing import Tuple, Dict, List, NamedTuple
+import numpy as np
+
+from .scene import Scene, Image
+
+
+def box(x: np.ndarray)->np.ndarray:
+    return ((x >= -0.5) & (x < 0.5)).astype(np.float64)
+
+
+def lanczos3(x: np.ndarray)->np.ndarray:
+    return np.where(np.abs(x) < 3, np.sinc(x) * np.sinc(x / 3), 0)
+
+
+KERNELS = {
+    'box': (box, 0.5),
+    'lanczos': (lanczos3, 3.0),
+}
+
+
+def filter_weights(src: int, dst: int, kernel: str)->Tuple[np.ndarray, np.ndarray]:
+    '''
+    return: source indices (dst, taps) and normalized weights (dst, taps)
+    '''
+    f, support = KERNELS[kernel]
+    scale = src / dst
+    # the kernel is stretched when downsampling
+    stretch = max(scale, 1.0)
+    support *= stretch
+    centers = (np.arange(dst) + 0.5) * scale - 0.5
+    taps = int(np.ceil(support * 2)) + 1
+    indices = np.floor(centers - support).astype(np.int64)[:, np.newaxis] + np.arange(taps)
+    weights = f((indices - centers[:, np.newaxis]) / stretch)
+    total = weights.sum(axis=1, keepdims=True)
+    weights /= np.where(total == 0, 1, total)
+    return np.clip(indices, 0, src - 1), weights
+
+
+def block_mean(pixels: np.ndarray, fy: int, fx: int)->np.ndarray:
+    '''
+    average fy x fx blocks. the size must be a multiple of the block
+    '''
+    rows = pixels[0::fy].astype(np.float32)
+    for i in range(1, fy):
+        rows += pixels[i::fy]
+    result = rows[:, 0::fx].copy()
+    for i in range(1, fx):
+        result += rows[:, i::fx]
+    result *= 1.0 / (fx * fy)
+    return result
+
+
+def resample_rows(pixels: np.ndarray, dst: int, kernel: str)->np.ndarray:
+    '''
+    resample axis 0. gathering whole rows keeps the memory access contiguous
+    '''
+    indices, weights = filter_weights(pixels.shape[0], dst, kernel)
+    weights = weights.astype(np.float32).reshape(dst, indices.shape[1], *([1] * (pixels.ndim - 1)))
+    result = np.zeros((dst,) + pixels.shape[1:], dtype=np.float32)
+    for tap in range(indices.shape[1]):
+        result += pixels[indices[:, tap]] * weights[:, tap]
+    return result
+
+
+def resize(pixels: np.ndarray, width: int, height: int, kernel: str='lanczos')->np.ndarray:
+    '''
+    pixels: (height, width, 4)
+    '''
+    src_height, src_width = pixels.shape[:2]
+    if kernel == 'box' and src_width % width == 0 and src_height % height == 0:
+        # integer factor, average blocks
+        return block_mean(pixels, src_height // height, src_width // width)
+
+    # large reductions: average blocks down to twice the target first, then filter
+    fy = max(1, src_height // (height * 2))
+    fx = max(1, src_width // (width * 2))
+    if fx > 1 or fy > 1:
+        pad_y = -src_height % fy
+        pad_x = -src_width % fx
+        if pad_x or pad_y:
+            pixels = np.pad(pixels, ((0, pad_y), (0, pad_x), (0, 0)), mode='edge')
+        pixels = block_mean(pixels, fy, fx)
+        src_height, src_width = pixels.shape[:2]
+
+    # the axis with the larger reduction first
+    if height != src_height and src_height / height >= src_width / width:
+        pixels = resample_rows(pixels, height, kernel)
+    if width != src_width:
+        pixels = np.ascontiguousarray(resample_rows(
+            np.ascontiguousarray(pixels.transpose(1, 0, 2)), width, kernel).transpose(1, 0, 2))
+    if height != pixels.shape[0]:
+        pixels = resample_rows(pixels, height, kernel)
+    # lanczos overshoot
+    return np.clip(pixels, 0, 1)
+
+
+def power_of_two(n: int)->int:
+    '''
+    nearest in log scale
+    '''
+    if n <= 1:
+        return 1
+    lower = 1 << (n.bit_length() - 1)
+    upper = lower << 1
+    return lower if n * n <= lower * upper else upper
+
+
+def fit_size(width: int, height: int, max_size: int, pot: bool)->Tuple[int, int]:
+    if max_size > 0 and max(width, height) > max_size:
+        scale = max_size / max(width, height)
+        width = max(1, int(round(width * scale)))
+        height = max(1, int(round(height * scale)))
+    if pot:
+        width = power_of_two(width)
+        height = power_of_two(height)
+        if max_size > 0:
+            while width > max_size:
+                width >>= 1
+            while height > max_size:
+                height >>= 1
+    return width, height
+
+
+class TextureBudget(NamedTuple):
+    # 0 for no limit
+    max_size: int = 0
+    color_max_size: int = 0
+    normal_max_size: int = 0
+    power_of_two: bool = False
+    kernel: str = 'lanczos'
+
+
+def min_limit(*limits: int)->int:
+    active = [limit for limit in limits if limit > 0]
+    return min(active) if active else 0
+
+
+def apply_texture_budget(scene: Scene, budget: TextureBudget)->int:
+    '''
+    resize the images used by the scene materials in place.
+    an image used in several roles gets the largest of their limits.
+
+    return the resized image count
+    '''
+    limits: Dict[Image, int] = {}
+
+    def add(image: Image, role_limit: int):
+        limit = min_limit(budget.max_size, role_limit)
+        if image in limits:
+            current = limits[image]
+            limit = 0 if current == 0 or limit == 0 else max(current, limit)
+        limits[image] = limit
+
+    for mesh in scene.meshes:
+        for submesh in mesh.submeshes:
+            material = submesh.material
+            if not material:
+                continue
+            if material.color_texture:
+                add(material.color_texture, budget.color_max_size)
+            if material.normal_texture:
+                add(material.normal_texture, budget.normal_max_size)
+
+    resized = 0
+    for image, limit in limits.items():
+        width, height = fit_size(image.width, image.height, limit, budget.power_of_two)
+        if (width, height) != (image.width, image.height):
+            image.pixels = resize(image.pixels, width, height, budget.kernel)
+            resized += 1
+    return resized
@@ -0,0 +1,33 @@
+'''
+deduplicate the rows of integer key arrays. bpy independent
+'''
+from typing import Tuple
+import numpy as np
+
+# 64bit FNV-1a
+FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+FNV_PRIME = np.uint64(0x100000001b3)
+
+
+def unique_rows(keys: np.ndarray)->Tuple[np.ndarray, np.ndarray]:
+    '''
+    keys: integer (count, columns)
+
+    return (first, inverse)
+    first: index of the first row of each unique row
+    inverse: unique row index of each row
+    '''
+    # hash rows to uint64 and sort those instead of the rows
+    h = np.full(len(keys), FNV_OFFSET, dtype=np.uint64)
+    for column in keys.T:
+        h ^= column.astype(np.uint64)
+        h *= FNV_PRIME
+    _, first, inverse = np.unique(h, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    if not np.array_equal(keys[first[inverse]], keys):
+        # hash collision. compare whole rows
+        rows = np.ascontiguousarray(keys).view(
+            np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).ravel()
+        _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+    return first, inverse
@@ -0,0 +1,201 @@
+'''
+bpy independent scene representation.
+
+GLTFBuilder(bpy front end) fills a Scene,
+to_gltf(backend) converts it to gltf without bpy and mathutils.
+'''
+from typing import List, Optional, Iterable, Any, Dict
+import numpy as np
+
+from . import gltf
+
+
+def _empty_like(values: np.ndarray)->np.ndarray:
+    '''
+    zero length copy. a [:0] view would keep the original alive
+    '''
+    return np.empty((0,) + values.shape[1:], dtype=values.dtype)
+
+
+class Image:
+    def __init__(self, name: str, pixels: np.ndarray, repeat: bool=True)->None:
+        '''
+        pixels: float32 (height, width, 4) RGBA.
+        bottom to top line order, same as bpy.types.Image.pixels.
+        repeat: sampled with repeating wrap by some material
+        '''
+        self.name = name
+        self.pixels = pixels
+        self.repeat = repeat
+
+    @property
+    def width(self)->int:
+        return self.pixels.shape[1]
+
+    @property
+    def height(self)->int:
+        return self.pixels.shape[0]
+
+
+class Material:
+    def __init__(self, name: str,
+                 color_texture: Optional[Image]=None,
+                 normal_texture: Optional[Image]=None,
+                 normal_scale: float=1.0,
+                 alpha_mode: gltf.AlphaMode=gltf.AlphaMode.OPAQUE)->None:
+        self.name = name
+        self.color_texture = color_texture
+        self.normal_texture = normal_texture
+        self.normal_scale = normal_scale
+        self.alpha_mode = alpha_mode
+
+
+class Submesh:
+    def __init__(self, indices: np.ndarray, material: Optional[Material])->None:
+        '''
+        indices: uint32 (triangle count * 3,)
+        material: None for default material
+        '''
+        self.indices = indices
+        self.material = material
+
+
+class Mesh:
+    def __init__(self, name: str,
+                 positions: np.ndarray,
+                 normals: np.ndarray,
+                 uvs: Optional[np.ndarray],
+                 submeshes: List[Submesh],
+                 joints: Optional[np.ndarray]=None,
+                 weights: Optional[np.ndarray]=None,
+                 vertex_group_names: Optional[List[str]]=None)->None:
+        '''
+        positions, normals: float32 (vertex count, 3)
+        uvs: float32 (vertex count, 2)
+        joints: int32 (vertex count, 4). vertex group index, not joint index.
+        weights: float32 (vertex count, 4)
+        '''
+        self.name = name
+        self.positions = positions
+        self.normals = normals
+        self.uvs = uvs
+        self.submeshes = submeshes
+        self.joints = joints
+        self.weights = weights
+        self.vertex_group_names: List[str] = vertex_group_names if vertex_group_names else []
+        # float32 (target count, vertex count, 3). position deltas of morph targets in y-up
+        self.morph_targets: Optional[np.ndarray] = None
+
+    @property
+    def vertex_count(self)->int:
+        return len(self.positions)
+
+    def release(self):
+        '''
+        drop vertex arrays after the mesh is packed into the output buffer.
+        the mesh stays as the identity of the packed gltf mesh.
+        '''
+        self.positions = _empty_like(self.positions)
+        self.normals = _empty_like(self.normals)
+        if self.uvs is not None:
+            self.uvs = _empty_like(self.uvs)
+        if self.joints is not None:
+            self.joints = _empty_like(self.joints)
+        if self.weights is not None:
+            self.weights = _empty_like(self.weights)
+        if self.morph_targets is not None:
+            self.morph_targets = self.morph_targets[:, :0].copy()
+        for submesh in self.submeshes:
+            submesh.indices = _empty_like(submesh.indices)
+
+
+class MorphAnimation:
+    def __init__(self, times: np.ndarray, weights: np.ndarray)->None:
+        '''
+        times: float32 (frame count,). seconds
+        weights: float32 (frame count, target count). morph target weights of each frame
+        '''
+        self.times = times
+        self.weights = weights
+
+
+class Node:
+    def __init__(self, name: str, position: np.ndarray, parent: Any,
+                 matrix: Optional[np.ndarray]=None)->None:
+        '''
+        position: (3,). world position in y-up
+        matrix: float64 (4, 4). world matrix in y-up, column vector. overrides position
+        '''
+        self.name = name
+        if matrix is None:
+            matrix = np.identity(4, dtype=np.float64)
+            matrix[:3, 3] = position
+        self.matrix = matrix
+        self.children: List[Node] = []
+        self.mesh: Optional[Mesh] = None
+        self.skin: Optional[Skin] = None
+        self.parent = parent
+        # has animation. not a target of baking passes
+        self.animated = False
+        # float64 (n, 4, 4). the mesh is drawn once per matrix(EXT_mesh_gpu_instancing),
+        # in the space of this node
+        self.instances: Optional[np.ndarray] = None
+        # weights of the morph targets of the mesh over time
+        self.morph_animation: Optional[MorphAnimation] = None
+
+    @property
+    def position(self)->np.ndarray:
+        '''
+        world translation
+        '''
+        return self.matrix[:3, 3]
+
+    def __str__(self)->str:
+        return f'<{self.name}>'
+
+    def traverse(self)->Iterable[Any]:
+        '''
+        depth first, parent before children. no recursion, rigs can be deep
+        '''
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+
+class Skin:
+    def __init__(self, root: Node)->None:
+        self.root = root
+
+
+class SkinTable:
+    '''
+    joints of a skin, traversed once.
+
+    the nodes under the skin root when built. a streaming export builds it at extraction,
+    nodes added under the root later are not joints
+    '''
+
+    def __init__(self, skin: Skin)->None:
+        self.skin = skin
+        self.joints: List[Node] = list(skin.root.traverse())
+        # joint name => joint index. the first joint wins on a duplicated name
+        self.joint_map: Dict[str, int] = {}
+        for i, joint in enumerate(self.joints):
+            self.joint_map.setdefault(joint.name, i)
+
+    def get_node_indices(self, node_map: Dict[Node, int])->np.ndarray:
+        '''
+        node_map: node => gltf node index
+        return int32 (joint count,). gltf node index of each joint
+        '''
+        return np.array([node_map[joint] for joint in self.joints], dtype=np.int32)
+
+
+class Scene:
+    def __init__(self)->None:
+        self.nodes: List[Node] = []
+        self.root_nodes: List[Node] = []
+        self.meshes: List[Mesh] = []
+        self.skins: List[Skin] = []
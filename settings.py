@@ -0,0 +1,60 @@
+from typing import NamedTuple
+
+
+class ExportSettings(NamedTuple):
+    # write <name>.profile.json next to the output
+    profile: bool = False
+    # also write <name>.trace.json for chrome://tracing
+    profile_chrome_trace: bool = False
+    # record tracemalloc peak of each span. slow
+    profile_memory: bool = False
+    # pack each mesh into the output buffer right after extraction and release it.
+    # caps peak memory. skips the passes that need every mesh at once
+    stream_meshes: bool = False
+    # sample non-armature deformation(modifiers, shape keys) over the scene frame range
+    # into at most morph_max_targets morph targets and a weight animation
+    bake_deformation: bool = False
+    bake_frame_step: int = 1
+    morph_max_targets: int = 16
+    # max vertex error of the compressed deformation
+    morph_tolerance: float = 1e-3
+    # weld vertices within weld_tolerance, drop degenerate and duplicate triangles and unused vertices
+    cleanup_geometry: bool = False
+    weld_tolerance: float = 1e-5
+    # draw static nodes sharing a mesh as EXT_mesh_gpu_instancing instances of one node
+    gpu_instancing: bool = False
+    min_instances: int = 2
+    # bake the world matrix of static meshes into their vertices
+    apply_transforms: bool = False
+    # texture size limits in pixels. 0 for no limit
+    texture_max_size: int = 0
+    color_texture_max_size: int = 0
+    normal_texture_max_size: int = 0
+    texture_power_of_two: bool = False
+    # 'lanczos' or 'box'
+    texture_filter: str = 'lanczos'
+    # pack small non-repeating color textures into atlases, see atlas.is_atlas_target
+    texture_atlas: bool = False
+    atlas_size: int = 2048
+    # larger textures are not packed
+    atlas_max_texture_size: int = 512
+    # bake static meshes into world space and merge them by material
+    merge_meshes: bool = False
+    # split a merged primitive over this vertex count. 65535 keeps indices in uint16
+    merge_max_vertices: int = 65535
+    # split submeshes over this triangle count into octree chunks, one primitive each,
+    # so clients can frustum cull them. 0 to keep submeshes whole
+    chunk_max_triangles: int = 0
+    # remove mesh-less, skin-less nodes that are not joints
+    remove_empty_nodes: bool = False
+    # split the binary into several buffers. 'single', 'mesh', 'texture' or 'size'
+    buffer_partition: str = 'single'
+    # buffer size cap in bytes for 'size'
+    buffer_max_size: int = 256 * 1024 * 1024
+    # check the exported gltf and write <name>.validation.json
+    validate: bool = False
+    # write <name>.size.json, the bytes per attribute, mesh, texture and view
+    size_report: bool = False
+    # the same bytes for the same scene: objects by name, canonical json, bundles without timestamps.
+    # writes <name>.manifest.json of file hashes and skips files whose hash is unchanged
+    deterministic: bool = False
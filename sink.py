@@ -0,0 +1,331 @@
+'''
+output sinks below the writer.
+
+the writer hands each output file to a sink by its name relative to the gltf:
+a directory, memory, a zip or tar bundle, or a gzip/zstd compressed glb.
+'''
+import concurrent.futures
+import hashlib
+import io
+import json
+import pathlib
+import struct
+import tarfile
+import time
+import zipfile
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import zstandard  # type: ignore
+except ImportError:
+    zstandard = None
+
+# compressed in parallel blocks of this size
+BLOCK_SIZE = 1024 * 1024
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+# compression => file suffix
+COMPRESSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+# mtime 0, no flags, unknown os
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+# bundle entry time of deterministic output. the earliest zip time
+DETERMINISTIC_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def _deflate_block(block: memoryview, last: bool)->bytes:
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    # a full flush ends on a byte boundary, the next block continues the stream
+    return compressor.compress(block) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_FULL_FLUSH)
+
+
+def compress_gzip(data: bytes, executor: Optional[concurrent.futures.Executor]=None)->bytes:
+    '''
+    gzip member of independently deflated blocks(like pigz). zlib releases the gil
+    '''
+    view = memoryview(data)
+    blocks = [view[i:i + BLOCK_SIZE] for i in range(0, len(view), BLOCK_SIZE)] or [view]
+    last = [i == len(blocks) - 1 for i in range(len(blocks))]
+    if executor and len(blocks) > 1:
+        deflated = list(executor.map(_deflate_block, blocks, last))
+    else:
+        deflated = [_deflate_block(block, is_last) for block, is_last in zip(blocks, last)]
+    trailer = struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data) & 0xffffffff)
+    return b''.join([GZIP_HEADER] + deflated + [trailer])
+
+
+def compress(data: bytes, compression: str, executor: Optional[concurrent.futures.Executor]=None)->bytes:
+    if compression == 'gzip':
+        return compress_gzip(data, executor)
+    if compression == 'zstd':
+        if not zstandard:
+            raise ImportError('zstd requires the zstandard module')
+        # zstandard has its own worker threads
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=-1).compress(data)
+    raise ValueError(f'unknown compression: {compression}')
+
+
+class Sink:
+    # write may be called from several threads at once
+    concurrent = False
+
+    def write(self, name: str, parts: List[bytes]):
+        '''
+        name: relative to the gltf
+        parts: file content, concatenated
+        '''
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+    def abort(self):
+        '''
+        close after a failed or cancelled export. a bundle is removed, not left truncated
+        '''
+        self.close()
+
+
+class FileSink(Sink):
+    concurrent = True
+
+    def __init__(self, directory: pathlib.Path)->None:
+        self.directory = directory
+
+    def write(self, name: str, parts: List[bytes]):
+        with (self.directory / name).open('wb') as f:
+            for part in parts:
+                f.write(part)
+
+
+class MemorySink(Sink):
+    concurrent = True
+
+    def __init__(self)->None:
+        self.files: Dict[str, bytes] = {}
+
+    def write(self, name: str, parts: List[bytes]):
+        self.files[name] = b''.join(parts)
+
+
+class CompressedSink(Sink):
+    '''
+    compress each file into <name>.gz or <name>.zst of the inner sink
+    '''
+
+    def __init__(self, sink: Sink, compression: str,
+                 executor: Optional[concurrent.futures.Executor]=None)->None:
+        if compression not in COMPRESSIONS:
+            raise ValueError(f'unknown compression: {compression}')
+        self.sink = sink
+        self.compression = compression
+        self.executor = executor
+        self.concurrent = sink.concurrent
+
+    def write(self, name: str, parts: List[bytes]):
+        data = compress(b''.join(parts), self.compression, self.executor)
+        self.sink.write(name + COMPRESSIONS[self.compression], [data])
+
+    def close(self):
+        self.sink.close()
+
+    def abort(self):
+        self.sink.abort()
+
+
+class ManifestSink(Sink):
+    '''
+    record the size and sha256 of each file.
+
+    directory: where the inner sink writes the files as named. a file that previous lists
+    with the same hash and size, and that is still there, is not rewritten
+    '''
+
+    def __init__(self, sink: Sink, directory: Optional[pathlib.Path]=None,
+                 previous: Optional[Dict[str, Dict[str, Any]]]=None)->None:
+        self.sink = sink
+        self.directory = directory
+        self.previous = previous if previous else {}
+        self.concurrent = sink.concurrent
+        # name => {'bytes', 'sha256'}
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.skipped: List[str] = []
+
+    def write(self, name: str, parts: List[bytes]):
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part)
+        entry = {'bytes': sum(len(part) for part in parts), 'sha256': digest.hexdigest()}
+        self.files[name] = entry
+        if self.directory and self.previous.get(name) == entry:
+            path = self.directory / name
+            if path.is_file() and path.stat().st_size == entry['bytes']:
+                self.skipped.append(name)
+                return
+        self.sink.write(name, parts)
+
+    def close(self):
+        self.sink.close()
+
+    def abort(self):
+        self.sink.abort()
+
+
+def read_manifest(path: pathlib.Path)->Dict[str, Dict[str, Any]]:
+    '''
+    files of a manifest written by write_manifest. empty if missing or broken
+    '''
+    try:
+        return json.loads(path.read_text())['files']
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+def write_manifest(path: pathlib.Path, files: Dict[str, Dict[str, Any]])->bool:
+    '''
+    return False if the manifest is unchanged and not rewritten
+    '''
+    text = json.dumps({'files': files}, sort_keys=True, indent=2)
+    if path.is_file() and path.read_text() == text:
+        return False
+    path.write_text(text)
+    return True
+
+
+class ZipSink(Sink):
+    '''
+    deflated entries. zipfile compresses one entry at a time
+    deterministic: fixed entry times
+    '''
+
+    def __init__(self, path: pathlib.Path, deterministic: bool=False)->None:
+        self.path = path
+        self.zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        self.deterministic = deterministic
+
+    def write(self, name: str, parts: List[bytes]):
+        if self.deterministic:
+            info = zipfile.ZipInfo(name, DETERMINISTIC_DATE_TIME)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            self.zip.writestr(info, b''.join(parts))
+        else:
+            self.zip.writestr(name, b''.join(parts))
+
+    def close(self):
+        self.zip.close()
+
+    def abort(self):
+        self.zip.close()
+        self.path.unlink()
+
+
+class TarSink(Sink):
+    '''
+    compression: the whole tar is compressed at close
+    deterministic: entry mtime 0
+    '''
+
+    def __init__(self, path: pathlib.Path, compression: Optional[str]=None,
+                 executor: Optional[concurrent.futures.Executor]=None, deterministic: bool=False)->None:
+        if compression and compression not in COMPRESSIONS:
+            raise ValueError(f'unknown compression: {compression}')
+        self.path = path
+        self.compression = compression
+        self.executor = executor
+        self.deterministic = deterministic
+        self.buffer: Optional[io.BytesIO] = None
+        if compression:
+            self.buffer = io.BytesIO()
+            self.tar = tarfile.open(fileobj=self.buffer, mode='w')
+        else:
+            self.tar = tarfile.open(path, mode='w')
+
+    def write(self, name: str, parts: List[bytes]):
+        data = b''.join(parts)
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = 0 if self.deterministic else int(time.time())
+        self.tar.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        self.tar.close()
+        if self.buffer and self.compression:
+            data = compress(self.buffer.getvalue(), self.compression, self.executor)
+            self.buffer = None
+            with self.path.open('wb') as f:
+                f.write(data)
+
+    def abort(self):
+        self.tar.close()
+        self.buffer = None
+        if self.path.exists():
+            self.path.unlink()
+
+
+def _inner_path(path: pathlib.Path, name: str)->pathlib.Path:
+    '''
+    a.glb.zip => a.glb, a.zip => a.gltf
+    '''
+    inner = path.parent / name
+    if inner.suffix.lower() not in ('.gltf', '.glb'):
+        inner = path.parent / (name + '.gltf')
+    return inner
+
+
+def check_path(path: pathlib.Path, partition: str='single')->Tuple[Optional[str], str]:
+    '''
+    raise ValueError for a compressed output that is not a .glb or a tar,
+    or a compressed .glb with more than one buffer.
+    ImportError for zstd without the zstandard module.
+
+    a .gltf references its .bin and images by name, compressing each file would break the references.
+    the same for the extra buffers of a glb
+    partition: BufferManager.partition
+
+    return (compression, path name without the compression suffix)
+    '''
+    suffixes = [s.lower() for s in path.suffixes]
+    name = path.name
+    compression: Optional[str] = None
+    for key, suffix in COMPRESSIONS.items():
+        if suffixes[-1:] == [suffix]:
+            compression = key
+            name = name[:-len(suffix)]
+            suffixes = suffixes[:-1]
+
+    if compression and suffixes[-1:] not in (['.glb'], ['.tar']):
+        raise ValueError(f'{path.name}: only a .glb or a .tar can be compressed')
+    if compression and suffixes[-1:] == ['.glb'] and partition != 'single':
+        raise ValueError(f'{path.name}: a compressed .glb needs the single buffer partition, use a .tar')
+    if compression == 'zstd' and not zstandard:
+        raise ImportError('zstd requires the zstandard module')
+    return compression, name
+
+
+def open_sink(path: pathlib.Path, executor: Optional[concurrent.futures.Executor]=None,
+              deterministic: bool=False, partition: str='single')->Tuple[Sink, pathlib.Path]:
+    '''
+    choose a sink by the suffixes of path.
+
+    .gltf, .glb: files in the directory
+    .glb.gz, .glb.zst: compressed glb in the directory
+    .zip, .glb.zip: zip bundle
+    .tar, .tar.gz, .tar.zst, .glb.tar ...: tar bundle
+
+    executor: for parallel compression
+    deterministic: bundles without timestamps
+    partition: BufferManager.partition, see check_path
+
+    return (sink, gltf path). the gltf path is virtual inside a bundle
+    '''
+    compression, name = check_path(path, partition)
+    suffixes = [s.lower() for s in pathlib.Path(name).suffixes]
+
+    if suffixes[-1:] == ['.tar']:
+        return TarSink(path, compression, executor, deterministic), _inner_path(path, name[:-len('.tar')])
+    if compression:
+        return CompressedSink(FileSink(path.parent), compression, executor), path.parent / name
+    if suffixes[-1:] == ['.zip']:
+        return ZipSink(path, deterministic), _inner_path(path, name[:-len('.zip')])
+    return FileSink(path.parent), path
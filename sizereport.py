@@ -0,0 +1,156 @@
+'''
+where the bytes of an export went.
+
+computed from the gltf and its buffers only, so it is cheap enough for every export.
+'''
+import hashlib
+import json
+import pathlib
+from typing import Any, Dict, List, Set, Tuple
+from . import gltf
+from .merge import UINT16_MAX_VERTICES
+
+# rows of each sorted table
+TOP_COUNT = 20
+
+
+def _sorted_table(sizes: Dict[str, int])->List[Dict[str, Any]]:
+    rows = sorted(sizes.items(), key=lambda item: item[1], reverse=True)
+    return [{'name': name, 'bytes': size} for name, size in rows]
+
+
+def find_duplicate_views(data: gltf.GLTF, buffers: List[bytes])->List[Dict[str, Any]]:
+    '''
+    bufferViews with the same bytes. one per group, the others are waste
+    '''
+    groups: Dict[Tuple[int, bytes], List[int]] = {}
+    for i, view in enumerate(data.bufferViews):
+        blob = memoryview(buffers[view.buffer])[view.byteOffset:view.byteOffset + view.byteLength]
+        digest = hashlib.blake2b(blob, digest_size=16).digest()
+        groups.setdefault((view.byteLength, digest), []).append(i)
+    duplicates = [{
+        'views': [data.bufferViews[i].name for i in views],
+        'bytes': size,
+        'wasted_bytes': size * (len(views) - 1),
+    } for (size, _), views in groups.items() if len(views) > 1 and size]
+    duplicates.sort(key=lambda row: row['wasted_bytes'], reverse=True)
+    return duplicates
+
+
+def build_size_report(data: gltf.GLTF, buffers: List[bytes], json_size: int)->Dict[str, Any]:
+    '''
+    json_size: bytes of the json(or the glb json chunk)
+    '''
+    view_sizes = [view.byteLength for view in data.bufferViews]
+    # each view is counted once, the first owner wins
+    counted: Set[int] = set()
+
+    def count(accessor_index: int)->int:
+        view_index = data.accessors[accessor_index].bufferView
+        if view_index in counted:
+            return 0
+        counted.add(view_index)
+        return view_sizes[view_index]
+
+    attribute_bytes: Dict[str, int] = {}
+    mesh_bytes: Dict[str, int] = {}
+    meshes: List[Dict[str, Any]] = []
+    for mesh in data.meshes:
+        total = 0
+        corners = 0
+        positions: Set[int] = set()
+        uint16_savings = 0
+        for primitive in mesh.primitives:
+            for semantic, accessor_index in primitive.attributes.items():
+                size = count(accessor_index)
+                attribute_bytes[semantic] = attribute_bytes.get(semantic, 0) + size
+                total += size
+            for target in primitive.targets:
+                for semantic, accessor_index in target.items():
+                    size = count(accessor_index)
+                    attribute_bytes[f'TARGET_{semantic}'] = attribute_bytes.get(f'TARGET_{semantic}', 0) + size
+                    total += size
+            if primitive.indices is None:
+                continue
+            size = count(primitive.indices)
+            attribute_bytes['INDICES'] = attribute_bytes.get('INDICES', 0) + size
+            total += size
+
+            indices = data.accessors[primitive.indices]
+            corners += indices.count
+            position_index = primitive.attributes['POSITION']
+            positions.add(position_index)
+            # uint32 indices of a primitive that uint16 covers
+            if indices.componentType == gltf.GLTFAccessorComponentType.UNSIGNED_INT \
+                    and size and data.accessors[position_index].count <= UINT16_MAX_VERTICES:
+                uint16_savings += indices.count * 2
+
+        vertices = sum(data.accessors[i].count for i in positions)
+        mesh_bytes[mesh.name] = total
+        meshes.append({
+            'name': mesh.name,
+            'bytes': total,
+            'primitives': len(mesh.primitives),
+            'corners': corners,
+            'vertices': vertices,
+            # corners per unique vertex. near 1 means little sharing
+            'corner_vertex_ratio': corners / vertices if vertices else 0,
+            'uint16_index_savings': uint16_savings,
+        })
+
+    texture_bytes: Dict[str, int] = {}
+    for image in data.images:
+        size = view_sizes[image.bufferView] if image.bufferView not in counted else 0
+        counted.add(image.bufferView)
+        texture_bytes[image.name] = texture_bytes.get(image.name, 0) + size
+
+    other_bytes: Dict[str, int] = {}
+    for skin in data.skins:
+        other_bytes['inverseBindMatrices'] = other_bytes.get(
+            'inverseBindMatrices', 0) + count(skin.inverseBindMatrices)
+    for node in data.nodes:
+        if node.extensions and node.extensions.EXT_mesh_gpu_instancing:
+            for accessor_index in node.extensions.EXT_mesh_gpu_instancing.attributes.values():
+                other_bytes['EXT_mesh_gpu_instancing'] = other_bytes.get(
+                    'EXT_mesh_gpu_instancing', 0) + count(accessor_index)
+    for animation in data.animations:
+        for sampler in animation.samplers:
+            other_bytes['animations'] = other_bytes.get(
+                'animations', 0) + count(sampler.input) + count(sampler.output)
+    other_bytes['unreferenced'] = sum(size for i, size in enumerate(view_sizes) if i not in counted)
+
+    buffer_bytes = sum(len(b) for b in buffers)
+    duplicates = find_duplicate_views(data, buffers)
+    meshes.sort(key=lambda row: row['bytes'], reverse=True)
+    return {
+        'total_bytes': json_size + buffer_bytes,
+        'json_bytes': json_size,
+        'buffer_bytes': buffer_bytes,
+        # alignment padding between views
+        'padding_bytes': buffer_bytes - sum(view_sizes),
+        'mesh_bytes': sum(mesh_bytes.values()),
+        'texture_bytes': sum(texture_bytes.values()),
+        'attributes': _sorted_table(attribute_bytes),
+        'meshes': meshes,
+        'textures': _sorted_table(texture_bytes),
+        'other': _sorted_table(other_bytes),
+        'views': _sorted_table({f'{i}:{view.name}': view.byteLength
+                                for i, view in enumerate(data.bufferViews)})[:TOP_COUNT],
+        'duplicate_views': len(duplicates),
+        'duplicate_wasted_bytes': sum(row['wasted_bytes'] for row in duplicates),
+        'duplicates': duplicates[:TOP_COUNT],
+        'uint16_index_savings': sum(row['uint16_index_savings'] for row in meshes),
+    }
+
+
+def summary_counts(report: Dict[str, Any])->Dict[str, int]:
+    '''
+    the totals of report, for the counts of the profiler span
+    '''
+    return {key: report[key] for key in (
+        'total_bytes', 'json_bytes', 'mesh_bytes', 'texture_bytes',
+        'duplicate_views', 'duplicate_wasted_bytes', 'uint16_index_savings')}
+
+
+def write_report(path: pathlib.Path, report: Dict[str, Any]):
+    path.write_text(json.dumps(report, indent=2))
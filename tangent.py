@@ -0,0 +1,134 @@
+'''
+per vertex tangents for normal mapped primitives, vectorized.
+
+follows the MikkTSpace convention: the face tangent of each corner is projected
+on the vertex normal and weighted by the corner angle.
+like MikkTSpace, a vertex shared by faces of both uv orientations(a mirrored uv seam) is split
+by split_mirrored first, each copy gets the tangent and handedness of its side.
+'''
+from typing import Tuple
+import numpy as np
+
+# uv area below this is degenerate and adds no tangent
+UV_AREA_EPSILON = 1e-20
+
+
+def _project_normalize(vectors: np.ndarray, normals: np.ndarray)->np.ndarray:
+    '''
+    remove the normal component and normalize. zero stays zero
+    '''
+    projected = vectors - normals * np.einsum('ij,ij->i', vectors, normals)[:, None]
+    length = np.linalg.norm(projected, axis=1)
+    np.divide(projected, length[:, None], out=projected, where=length[:, None] > 0)
+    return projected
+
+
+def _fallback_tangents(normals: np.ndarray)->np.ndarray:
+    '''
+    any unit vector perpendicular to the normal
+    '''
+    axis = np.zeros_like(normals)
+    use_x = np.abs(normals[:, 0]) < 0.9
+    axis[use_x, 0] = 1
+    axis[~use_x, 1] = 1
+    return _project_normalize(axis, normals)
+
+
+def _uv_area(uvs: np.ndarray, triangles: np.ndarray)->np.ndarray:
+    '''
+    uvs: gltf uv. triangles: int64 (triangle count, 3)
+    return float64 (triangle count,). signed uv area * 2 in blender uv space, negative if mirrored
+    '''
+    uv = uvs[triangles].astype(np.float64)
+    # back to v up, as MikkTSpace sees blender uvs
+    uv[:, :, 1] *= -1
+    d1 = uv[:, 1] - uv[:, 0]
+    d2 = uv[:, 2] - uv[:, 0]
+    return d1[:, 0] * d2[:, 1] - d2[:, 0] * d1[:, 1]
+
+
+def split_mirrored(uvs: np.ndarray, indices: np.ndarray, vertex_count: int)->Tuple[np.ndarray, np.ndarray]:
+    '''
+    copy each vertex used by triangles of both uv orientations, the mirrored triangles take the copy.
+    uv degenerate triangles keep the vertex
+
+    uvs: float32 (vertex count, 2). gltf uv
+    indices: (triangle count * 3,)
+
+    return (source vertex of each vertex, indices). the copies follow the vertex count,
+    source is arange(vertex count) if nothing is split
+    '''
+    triangles = indices.reshape(-1, 3).astype(np.int64)
+    area = _uv_area(uvs, triangles)
+    corner_vertices = triangles.ravel()
+    positive = np.repeat(area > UV_AREA_EPSILON, 3)
+    negative = np.repeat(area < -UV_AREA_EPSILON, 3)
+    split = (np.bincount(corner_vertices[positive], minlength=vertex_count) > 0) & \
+        (np.bincount(corner_vertices[negative], minlength=vertex_count) > 0)
+    split_vertices = np.flatnonzero(split)
+    source = np.concatenate([np.arange(vertex_count), split_vertices])
+    if not len(split_vertices):
+        return source, indices
+
+    copies = np.full(vertex_count, -1, dtype=np.int64)
+    copies[split_vertices] = np.arange(vertex_count, len(source))
+    remapped = corner_vertices.copy()
+    moved = negative & split[corner_vertices]
+    remapped[moved] = copies[corner_vertices[moved]]
+    # the max of unsigned short is reserved(primitive restart)
+    dtype = indices.dtype if len(source) < np.iinfo(indices.dtype).max else np.uint32
+    return source, remapped.astype(dtype)
+
+
+def compute_tangents(positions: np.ndarray, normals: np.ndarray, uvs: np.ndarray,
+                     indices: np.ndarray)->np.ndarray:
+    '''
+    positions, normals: float32 (vertex count, 3)
+    uvs: float32 (vertex count, 2). gltf uv, v is flipped
+    indices: (triangle count * 3,). triangles of the normal mapped primitives, see split_mirrored
+
+    return float32 (vertex count, 4). xyz tangent, w handedness.
+    bitangent = cross(normal, tangent) * w
+    '''
+    vertex_count = len(positions)
+    triangles = indices.reshape(-1, 3).astype(np.int64)
+    p = positions[triangles].astype(np.float64)
+    uv = uvs[triangles].astype(np.float64)
+    # back to v up, as MikkTSpace sees blender uvs
+    uv[:, :, 1] *= -1
+    n = normals.astype(np.float64)
+    length = np.linalg.norm(n, axis=1)
+    np.divide(n, length[:, None], out=n, where=length[:, None] > 0)
+
+    # face tangents. the direction of increasing u
+    e1 = p[:, 1] - p[:, 0]
+    e2 = p[:, 2] - p[:, 0]
+    d1 = uv[:, 1] - uv[:, 0]
+    d2 = uv[:, 2] - uv[:, 0]
+    area = d1[:, 0] * d2[:, 1] - d2[:, 0] * d1[:, 1]
+    valid = np.abs(area) > UV_AREA_EPSILON
+    orientation = np.where(area > 0, 1.0, -1.0)
+    face_tangents = (e1 * d2[:, 1:2] - e2 * d1[:, 1:2]) * orientation[:, None]
+
+    # corners, projected on the vertex normal and weighted by the corner angle
+    corner_vertices = triangles.ravel()
+    corner_normals = n[corner_vertices]
+    corner_tangents = _project_normalize(np.repeat(face_tangents, 3, axis=0), corner_normals)
+    to_next = _project_normalize((np.roll(p, -1, axis=1) - p).reshape(-1, 3), corner_normals)
+    to_prev = _project_normalize((np.roll(p, 1, axis=1) - p).reshape(-1, 3), corner_normals)
+    angles = np.arccos(np.clip(np.einsum('ij,ij->i', to_next, to_prev), -1, 1))
+    angles *= np.repeat(valid, 3)
+
+    accumulated = np.stack([np.bincount(corner_vertices, weights=corner_tangents[:, i] * angles,
+                                        minlength=vertex_count) for i in range(3)], axis=1)
+    handedness = np.bincount(corner_vertices, weights=np.repeat(orientation, 3) * angles,
+                             minlength=vertex_count)
+
+    tangents = np.empty((vertex_count, 4), dtype=np.float32)
+    xyz = _project_normalize(accumulated, n)
+    missing = ~np.any(xyz, axis=1)
+    if missing.any():
+        xyz[missing] = _fallback_tangents(n[missing])
+    tangents[:, :3] = xyz
+    tangents[:, 3] = np.where(handedness < 0, -1, 1)
+    return tangents
@@ -0,0 +1,26 @@
+'''
+pytest setup, outside blender.
+
+the add-on is imported as a package by its directory name(io_scene_yup when installed),
+with the bpy stub of the benchmarks for the extraction modules.
+
+    python -m pytest tests
+'''
+import importlib
+import pathlib
+import sys
+from typing import Any
+
+_root = pathlib.Path(__file__).resolve().parent.parent
+if str(_root.parent) not in sys.path:
+    sys.path.insert(0, str(_root.parent))
+PACKAGE = _root.name
+importlib.import_module(PACKAGE)
+importlib.import_module(f'{PACKAGE}.benchmarks.stub').install()
+
+
+def load(name: str)->Any:
+    '''
+    a module of the add-on. load('to_gltf')
+    '''
+    return importlib.import_module(f'{PACKAGE}.{name}')
@@ -0,0 +1,111 @@
+'''
+atlas targets, samplers and uv remapping of a mesh whose submeshes share vertices.
+'''
+import pathlib
+import numpy as np
+
+from conftest import load
+
+atlas = load('atlas')
+gltf = load('gltf')
+scene = load('scene')
+to_gltf = load('to_gltf')
+
+
+def create_mesh()->object:
+    '''
+    two triangles on two atlas materials, sharing the edge 1-2. one morph target
+    '''
+    positions = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [1, 1, 0]], dtype=np.float32)
+    normals = np.tile(np.array([0, 0, 1], dtype=np.float32), (4, 1))
+    uvs = np.array([[0, 0], [1, 0], [0, -1], [1, -1]], dtype=np.float32)
+    materials = [scene.Material(f'm{i}', color_texture=scene.Image(
+        f'i{i}', np.full((8, 8, 4), i, dtype=np.float32), repeat=False)) for i in range(2)]
+    mesh = scene.Mesh('mesh', positions, normals, uvs, [
+        scene.Submesh(np.array([0, 1, 2], dtype=np.uint32), materials[0]),
+        scene.Submesh(np.array([1, 3, 2], dtype=np.uint32), materials[1]),
+    ])
+    mesh.morph_targets = (np.arange(12, dtype=np.float32).reshape(1, 4, 3) + 1) * 0.1
+    return mesh
+
+
+def test_shared_vertices_keep_morph_targets(tmp_path: pathlib.Path):
+    mesh = create_mesh()
+    positions = mesh.positions.copy()
+    targets = mesh.morph_targets.copy()
+    data = scene.Scene()
+    data.meshes.append(mesh)
+    node = scene.Node('node', np.zeros(3), None)
+    node.mesh = mesh
+    data.nodes.append(node)
+    data.root_nodes.append(node)
+
+    result = atlas.create_atlases(data, 64, 16, 2)
+
+    assert result.atlases == 1
+    # the shared edge is duplicated
+    assert mesh.vertex_count > 4
+    assert mesh.morph_targets.shape == (1, mesh.vertex_count, 3)
+    # the positions are unique, a duplicate finds its original by position
+    original = [int(np.flatnonzero((positions == p).all(axis=1))[0]) for p in mesh.positions]
+    np.testing.assert_array_equal(mesh.morph_targets, targets[:, original])
+
+    root, _ = to_gltf.to_gltf(data, tmp_path / 'a.gltf', tmp_path / 'a.bin',
+                              packer=to_gltf.MeshPacker(chunk_max_triangles=1))
+    primitives = root.meshes[0].primitives
+    assert len(primitives) == 2
+    for primitive in primitives:
+        position = root.accessors[primitive.attributes['POSITION']]
+        target = root.accessors[primitive.targets[0]['POSITION']]
+        assert target.count == position.count
+
+
+def create_scene(mesh: object)->object:
+    data = scene.Scene()
+    data.meshes.append(mesh)
+    node = scene.Node('node', np.zeros(3), None)
+    node.mesh = mesh
+    data.nodes.append(node)
+    data.root_nodes.append(node)
+    return data
+
+
+def test_repeat_textures_inside_the_unit_square(tmp_path: pathlib.Path):
+    mesh = create_mesh()
+    for submesh in mesh.submeshes:
+        submesh.material.color_texture.repeat = True
+    data = create_scene(mesh)
+    result = atlas.create_atlases(data, 64, 16, 2)
+
+    # the uvs stay within 0-1, the wrap is never used
+    assert result.atlases == 1
+    root, _ = to_gltf.to_gltf(data, tmp_path / 'a.gltf', tmp_path / 'a.bin')
+    assert len(root.textures) == 1
+    sampler = root.samplers[root.textures[0].sampler]
+    # the neighbour tiles do not bleed in
+    assert sampler.wrapS == sampler.wrapT == gltf.WrapMode.CLAMP_TO_EDGE
+
+
+def test_repeat_textures_outside_the_unit_square(tmp_path: pathlib.Path):
+    mesh = create_mesh()
+    for submesh in mesh.submeshes:
+        submesh.material.color_texture.repeat = True
+    mesh.uvs[3] = (2, -1)
+    data = create_scene(mesh)
+
+    # the second material repeats, only the first is left, nothing to pack with
+    assert atlas.is_atlas_target(mesh.submeshes[0].material, 16, True)
+    assert not atlas.is_atlas_target(mesh.submeshes[1].material, 16, False)
+    assert atlas.create_atlases(data, 64, 16, 2).atlases == 0
+    root, _ = to_gltf.to_gltf(data, tmp_path / 'a.gltf', tmp_path / 'a.bin')
+    assert [s.wrapS for s in root.samplers] == [gltf.WrapMode.REPEAT]
+
+
+def test_atlas_targets():
+    image = scene.Image('small', np.ones((8, 8, 4), dtype=np.float32), repeat=False)
+    large = scene.Image('large', np.ones((32, 32, 4), dtype=np.float32), repeat=False)
+    assert atlas.is_atlas_target(scene.Material('color', color_texture=image), 16)
+    assert not atlas.is_atlas_target(None, 16)
+    assert not atlas.is_atlas_target(scene.Material('plain'), 16)
+    assert not atlas.is_atlas_target(scene.Material('normal', color_texture=image, normal_texture=image), 16)
+    assert not atlas.is_atlas_target(scene.Material('large', color_texture=large), 16)
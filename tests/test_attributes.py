@@ -0,0 +1,80 @@
+'''
+the vertex attributes of each primitive, planned from its material.
+'''
+from typing import Any, Optional
+import numpy as np
+
+from conftest import load
+
+attributes = load('attributes')
+buffermanager = load('buffermanager')
+materialstore = load('materialstore')
+scene = load('scene')
+to_gltf = load('to_gltf')
+
+IMAGE = scene.Image('image', np.ones((4, 4, 4), dtype=np.float32))
+
+
+def test_plan_material():
+    assert attributes.plan_material(None) == attributes.AttributePlan(False, False)
+    assert attributes.plan_material(scene.Material('plain')) == attributes.AttributePlan(False, False)
+    assert attributes.plan_material(scene.Material('color', color_texture=IMAGE)) == \
+        attributes.AttributePlan(True, False)
+    assert attributes.plan_material(scene.Material('normal', normal_texture=IMAGE)) == \
+        attributes.AttributePlan(True, True)
+
+
+def test_select():
+    shared = {'POSITION': 0, 'NORMAL': 1, 'TANGENT': 2, 'TEXCOORD_0': 3}
+    assert attributes.AttributePlan().select(shared) == {'POSITION': 0, 'NORMAL': 1}
+    assert attributes.AttributePlan(True, False).select(shared) == {'POSITION': 0, 'NORMAL': 1, 'TEXCOORD_0': 3}
+    assert attributes.AttributePlan(True, True).select(shared) == shared
+
+
+def pack(*materials: Optional[Any])->Any:
+    '''
+    a triangle for each material, sharing the vertices
+    '''
+    positions = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=np.float32)
+    normals = np.tile(np.array([0, 0, 1], dtype=np.float32), (3, 1))
+    uvs = np.array([[0, 0], [1, 0], [0, -1]], dtype=np.float32)
+    mesh = scene.Mesh('mesh', positions, normals, uvs,
+                      [scene.Submesh(np.array([0, 1, 2], dtype=np.uint32), m) for m in materials])
+    buffer = buffermanager.BufferManager()
+    return to_gltf.to_mesh(mesh, {}, buffer, materialstore.MaterialStore()), buffer
+
+
+def test_primitive_attributes():
+    color = scene.Material('color', color_texture=IMAGE)
+    normal_mapped = scene.Material('normal', color_texture=IMAGE, normal_texture=IMAGE)
+    mesh, buffer = pack(None, color, normal_mapped)
+
+    # every material here is lit, NORMAL is always written
+    assert [sorted(p.attributes) for p in mesh.primitives] == [
+        ['NORMAL', 'POSITION'],
+        ['NORMAL', 'POSITION', 'TEXCOORD_0'],
+        ['NORMAL', 'POSITION', 'TANGENT', 'TEXCOORD_0'],
+    ]
+    # the primitives share one set of vertices
+    assert len({p.attributes['POSITION'] for p in mesh.primitives}) == 1
+
+
+def test_unused_uvs_are_not_written():
+    mesh, buffer = pack(None, scene.Material('plain'))
+
+    assert all('TEXCOORD_0' not in p.attributes for p in mesh.primitives)
+    assert not any(a.name.endswith('TEXCOORD_0') for a in buffer.accessors)
+
+
+def test_min_max_only_on_position():
+    mesh, buffer = pack(scene.Material('normal', normal_texture=IMAGE))
+
+    primitive, = mesh.primitives
+    for semantic, index in primitive.attributes.items():
+        accessor = buffer.accessors[index]
+        if semantic == 'POSITION':
+            assert accessor.min == [0, 0, 0] and accessor.max == [1, 1, 0]
+        else:
+            assert accessor.min is None and accessor.max is None
+    indices = buffer.accessors[primitive.indices]
+    assert indices.min is None and indices.max is None
@@ -0,0 +1,90 @@
+'''
+split_submesh on grids and degenerate inputs.
+'''
+import numpy as np
+
+from conftest import load
+
+chunk = load('chunk')
+
+
+def create_grid(n: int)->tuple:
+    '''
+    n x n quads, two triangles each
+    '''
+    x, y = np.meshgrid(np.arange(n + 1, dtype=np.float32), np.arange(n + 1, dtype=np.float32))
+    positions = np.stack([x.ravel(), np.zeros(x.size, dtype=np.float32), y.ravel()], axis=1)
+    a = (np.arange(n)[None, :] + np.arange(n)[:, None] * (n + 1)).ravel()
+    b = a + 1
+    c = a + n + 2
+    d = a + n + 1
+    indices = np.stack([a, b, c, c, d, a], axis=1).ravel().astype(np.uint32)
+    return positions, indices
+
+
+def merged_triangles(chunks: list)->np.ndarray:
+    '''
+    mesh vertex indices of all chunk triangles, rows sorted
+    '''
+    triangles = np.concatenate([c.vertices[c.indices.astype(np.int64)].reshape(-1, 3) for c in chunks])
+    return triangles[np.lexsort(triangles.T[::-1])]
+
+
+def sorted_rows(indices: np.ndarray)->np.ndarray:
+    triangles = indices.astype(np.int64).reshape(-1, 3)
+    return triangles[np.lexsort(triangles.T[::-1])]
+
+
+def test_small_submesh_is_not_split():
+    positions, indices = create_grid(4)
+    assert chunk.split_submesh(positions, indices, 32) is None
+
+
+def test_grid_keeps_every_triangle_and_winding():
+    positions, indices = create_grid(200)
+    max_triangles = 1000
+    chunks = chunk.split_submesh(positions, indices, max_triangles)
+
+    assert chunks is not None and len(chunks) > 1
+    assert all(len(c.indices) // 3 <= max_triangles for c in chunks)
+    # the same (a, b, c) rows: nothing lost, duplicated or rewound
+    np.testing.assert_array_equal(merged_triangles(chunks), sorted_rows(indices))
+    for c in chunks:
+        assert c.indices.dtype == np.uint16
+        # chunk vertices are unique and all used
+        assert len(np.unique(c.vertices)) == len(c.vertices)
+        assert len(np.unique(c.indices)) == len(c.vertices)
+
+
+def test_leaf_cell_overflow():
+    '''
+    all centroids in one finest cell. the cell is cut into consecutive ranges
+    '''
+    positions = np.zeros((3000, 3), dtype=np.float32)
+    positions[-1] = (1, 1, 1)
+    indices = np.arange(2997, dtype=np.uint32)
+    chunks = chunk.split_submesh(positions, indices, 100)
+
+    assert chunks is not None
+    assert [len(c.indices) // 3 for c in chunks] == [100] * 9 + [99]
+    np.testing.assert_array_equal(merged_triangles(chunks), sorted_rows(indices))
+
+
+def test_index_dtype_by_chunk_vertex_count():
+    '''
+    unshared triangles, 3 vertices each, all in one leaf cell
+    '''
+    triangle_count = 60000
+    positions = np.zeros((triangle_count * 3, 3), dtype=np.float32)
+    positions[-1] = (1, 1, 1)
+    indices = np.arange(triangle_count * 3, dtype=np.uint32)
+
+    large = chunk.split_submesh(positions, indices, 30000)
+    assert large is not None
+    # the last triangle has the far vertex, a cell of its own
+    assert [len(c.vertices) for c in large] == [90000, 89997, 3]
+    assert [c.indices.dtype for c in large] == [np.uint32, np.uint32, np.uint16]
+
+    small = chunk.split_submesh(positions, indices, 10000)
+    assert small is not None
+    assert all(c.indices.dtype == np.uint16 for c in small)
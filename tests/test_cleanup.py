@@ -0,0 +1,91 @@
+'''
+weld, degenerate and duplicate triangles, compaction. unique_rows.
+'''
+from typing import List, Optional
+import numpy as np
+
+from conftest import load
+
+cleanup = load('cleanup')
+rows = load('rows')
+scene = load('scene')
+
+TOLERANCE = 1e-3
+
+
+def create_mesh(positions: List[List[float]], triangles: List[List[int]],
+                normals: Optional[np.ndarray]=None)->object:
+    p = np.array(positions, dtype=np.float32)
+    if normals is None:
+        normals = np.tile(np.array([0, 0, 1], dtype=np.float32), (len(p), 1))
+    return scene.Mesh('mesh', p, normals, None,
+                      [scene.Submesh(np.array(triangles, dtype=np.uint32).ravel(), None)])
+
+
+def test_unique_rows():
+    keys = np.array([[1, 2], [3, 4], [1, 2], [5, 6], [3, 4]], dtype=np.int32)
+    first, inverse = rows.unique_rows(keys)
+
+    np.testing.assert_array_equal(keys[first[inverse]], keys)
+    assert sorted(first.tolist()) == [0, 1, 3]
+    assert inverse[0] == inverse[2] and inverse[1] == inverse[4]
+    assert len({inverse[0], inverse[1], inverse[3]}) == 3
+
+
+def test_weld_across_cell_border():
+    # the cell border is at 0.5 * TOLERANCE
+    border = 0.5 * TOLERANCE
+    mesh = create_mesh([[0, 0, 0], [1, 0, 0], [0, 1, 0],
+                        [border + 1e-5, 0, 0], [1, 0, 0], [0, 1, 0]],
+                       [[0, 1, 2], [3, 4, 5]])
+    mesh.positions[0, 0] = border - 1e-5
+    welded = cleanup.weld_vertices(mesh, TOLERANCE)
+
+    assert welded[0] == welded[3]
+    assert welded[1] == welded[4]
+
+
+def test_neighbour_cells_farther_than_tolerance_do_not_weld():
+    mesh = create_mesh([[0, 0, 0], [1.5 * TOLERANCE, 0, 0], [0, 1, 0]], [[0, 1, 2]])
+    welded = cleanup.weld_vertices(mesh, TOLERANCE)
+
+    assert len(np.unique(welded)) == 3
+
+
+def test_weld_needs_same_attributes():
+    mesh = create_mesh([[0, 0, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0]], [[0, 1, 2]])
+    mesh.normals[1] = (0, 1, 0)
+    mesh.joints = np.zeros((5, 4), dtype=np.int32)
+    mesh.joints[2, 0] = 1
+    mesh.weights = np.tile(np.array([1, 0, 0, 0], dtype=np.float32), (5, 1))
+    mesh.morph_targets = np.zeros((1, 5, 3), dtype=np.float32)
+    mesh.morph_targets[0, 3] = (0, 1, 0)
+    welded = cleanup.weld_vertices(mesh, TOLERANCE)
+
+    # 4 welds to 0, normal, joint and morph delta keep 1, 2, 3 apart
+    assert len(np.unique(welded)) == 4
+    assert welded[4] == welded[0]
+
+
+def test_clean_mesh():
+    mesh = create_mesh([[0, 0, 0], [1, 0, 0], [0, 1, 0], [1, 1, 0],
+                        [1e-4, 0, 0],  # welds to 0
+                        [5, 5, 5]],  # unused
+                       [[0, 1, 2],
+                        [1, 3, 2],
+                        [4, 1, 2],  # duplicate of the first after welding
+                        [2, 0, 1],  # the first, rotated
+                        [2, 1, 0],  # the first, reversed. kept
+                        [0, 4, 1],  # degenerate after welding
+                        [0, 1, 1]])  # degenerate
+    mesh.morph_targets = np.arange(2 * 6 * 3, dtype=np.float32).reshape(2, 6, 3)
+    mesh.morph_targets[:, 4] = mesh.morph_targets[:, 0]
+    targets = mesh.morph_targets.copy()
+    result = cleanup.clean_mesh(mesh, TOLERANCE)
+
+    assert result == cleanup.CleanupResult(1, 1, 2, 2, 1)
+    assert mesh.vertex_count == 4
+    np.testing.assert_array_equal(mesh.positions, [[0, 0, 0], [1, 0, 0], [0, 1, 0], [1, 1, 0]])
+    np.testing.assert_array_equal(mesh.morph_targets, targets[:, :4])
+    np.testing.assert_array_equal(mesh.submeshes[0].indices.reshape(-1, 3),
+                                  [[0, 1, 2], [1, 3, 2], [2, 1, 0]])
@@ -0,0 +1,58 @@
+'''
+deterministic export: the same scene twice gives the same bytes and manifest.
+'''
+import pathlib
+from typing import Any, Dict
+
+from conftest import load
+
+run = load('benchmarks.run')
+scene = load('scene')
+scenes = load('benchmarks.scenes')
+sink = load('sink')
+to_gltf = load('to_gltf')
+writer = load('writer')
+
+
+def export(path: pathlib.Path, s: Any)->Any:
+    '''
+    to_gltf and write through the sinks of a deterministic yup export.
+    return the manifest sink
+    '''
+    out, gltf_path = sink.open_sink(path, deterministic=True)
+    manifest = sink.ManifestSink(out, path.parent if isinstance(out, sink.FileSink) else None,
+                                 sink.read_manifest(path.parent / (gltf_path.stem + '.manifest.json')))
+    bin_path = gltf_path.parent / (gltf_path.stem + '.bin') if gltf_path.suffix == '.gltf' else None
+    root, buffers = to_gltf.to_gltf(s, gltf_path, bin_path)
+    writer.write(gltf_path, root, buffers, sink=manifest, canonical=True)
+    manifest.close()
+    sink.write_manifest(path.parent / (gltf_path.stem + '.manifest.json'), manifest.files)
+    return manifest
+
+
+def build(case: str)->Any:
+    return run.build_scene(run.Recorder(False), scenes.CASES[case](scene, 0.1))
+
+
+def read_files(directory: pathlib.Path)->Dict[str, bytes]:
+    return {path.name: path.read_bytes() for path in directory.iterdir()}
+
+
+def test_same_bytes(tmp_path: pathlib.Path):
+    for name in ('a', 'b'):
+        (tmp_path / name).mkdir()
+        export(tmp_path / name / 'scene.gltf', build('materials'))
+        export(tmp_path / name / 'bundle.zip', build('skinned'))
+
+    a = read_files(tmp_path / 'a')
+    assert sorted(a) == ['bundle.manifest.json', 'bundle.zip', 'scene.bin', 'scene.gltf', 'scene.manifest.json']
+    assert a == read_files(tmp_path / 'b')
+
+
+def test_manifest_skips_unchanged(tmp_path: pathlib.Path):
+    path = tmp_path / 'scene.gltf'
+    first = export(path, build('materials'))
+    second = export(path, build('materials'))
+
+    assert second.files == first.files
+    assert sorted(second.skipped) == ['scene.bin', 'scene.gltf']
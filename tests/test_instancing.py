@@ -0,0 +1,93 @@
+'''
+static nodes sharing a mesh become EXT_mesh_gpu_instancing instances.
+'''
+import pathlib
+from typing import Any
+import numpy as np
+
+from conftest import load
+
+instancing = load('instancing')
+reader = load('reader')
+scene = load('scene')
+to_gltf = load('to_gltf')
+transform = load('transform')
+
+
+def create_mesh(name: str)->Any:
+    positions = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=np.float32)
+    normals = np.tile(np.array([0, 0, 1], dtype=np.float32), (3, 1))
+    return scene.Mesh(name, positions, normals, None,
+                      [scene.Submesh(np.array([0, 1, 2], dtype=np.uint32), None)])
+
+
+def add_node(s: Any, name: str, parent: Any, mesh: Any=None, translation=(0, 0, 0))->Any:
+    node = scene.Node(name, np.array(translation, dtype=np.float32), parent)
+    node.mesh = mesh
+    s.nodes.append(node)
+    if parent:
+        parent.children.append(node)
+    else:
+        s.root_nodes.append(node)
+    if mesh and mesh not in s.meshes:
+        s.meshes.append(mesh)
+    return node
+
+
+def create_scene()->Any:
+    '''
+    group
+        a0, a1, a2: static, mesh a
+        skinned, animated: mesh a
+        b: mesh b
+    '''
+    s = scene.Scene()
+    a = create_mesh('a')
+    group = add_node(s, 'group', None)
+    for i in range(3):
+        add_node(s, f'a{i}', group, a, (i, 0, 0))
+    # a quarter turn around y
+    s.nodes[-1].matrix[:3, :3] = transform.rotation_from_quaternion(
+        np.array([[0, np.sqrt(0.5), 0, np.sqrt(0.5)]]))[0]
+    skinned = add_node(s, 'skinned', group, a, (0, 1, 0))
+    skinned.skin = scene.Skin(skinned)
+    s.skins.append(skinned.skin)
+    animated = add_node(s, 'animated', group, a, (0, 2, 0))
+    animated.animated = True
+    add_node(s, 'b', group, create_mesh('b'))
+    return s
+
+
+def test_create_instances(tmp_path: pathlib.Path):
+    s = create_scene()
+    result = instancing.create_instances(s, 2)
+
+    assert result == instancing.InstancingResult(3, 1, 3)
+    names = [node.name for node in s.nodes]
+    # the emptied nodes are pruned, the skinned and animated ones keep their mesh
+    assert names == ['group', 'skinned', 'animated', 'b', 'a.instances']
+    assert [node.name for node in s.nodes[0].children] == ['skinned', 'animated', 'b']
+    instances = s.nodes[-1]
+    assert instances in s.root_nodes
+    assert instances.mesh is s.meshes[0]
+    np.testing.assert_allclose(instances.instances[:, :3, 3], [[0, 0, 0], [1, 0, 0], [2, 0, 0]])
+
+    path = tmp_path / 'instances.glb'
+    root, buffers = to_gltf.to_gltf(s, path, None)
+    data = reader.GLTFData(path, root, [np.frombuffer(bytes(b), dtype=np.uint8) for b in buffers])
+
+    assert root.extensionsUsed == ['EXT_mesh_gpu_instancing']
+    assert root.extensionsRequired == ['EXT_mesh_gpu_instancing']
+    extension = root.nodes[-1].extensions.EXT_mesh_gpu_instancing
+    # no scale on any instance
+    assert set(extension.attributes) == {'TRANSLATION', 'ROTATION'}
+    np.testing.assert_allclose(data.accessor(extension.attributes['TRANSLATION']),
+                               [[0, 0, 0], [1, 0, 0], [2, 0, 0]])
+    np.testing.assert_allclose(data.accessor(extension.attributes['ROTATION']),
+                               [[0, 0, 0, 1], [0, 0, 0, 1], [0, np.sqrt(0.5), 0, np.sqrt(0.5)]], atol=1e-6)
+
+
+def test_below_min_instances():
+    s = create_scene()
+    assert instancing.create_instances(s, 4) == instancing.InstancingResult(0, 0, 0)
+    assert len(s.nodes) == 7
@@ -0,0 +1,84 @@
+'''
+materials with the same content share one gltf material, their submeshes one primitive.
+'''
+import pathlib
+from typing import Any
+import numpy as np
+
+from conftest import load
+
+gltf = load('gltf')
+reader = load('reader')
+scene = load('scene')
+to_gltf = load('to_gltf')
+
+
+def export(s: Any, chunk_max_triangles: int=0)->Any:
+    path = pathlib.Path('material.glb')
+    root, buffers = to_gltf.to_gltf(s, path, None, packer=to_gltf.MeshPacker(
+        chunk_max_triangles=chunk_max_triangles))
+    return reader.GLTFData(path, root, [np.frombuffer(bytes(b), dtype=np.uint8) for b in buffers])
+
+
+def create_scene()->Any:
+    '''
+    a quad of two triangles, each on a material that differs only by name
+    '''
+    image = scene.Image('color', np.ones((4, 4, 4), dtype=np.float32))
+    a = scene.Material('a', color_texture=image)
+    b = scene.Material('b', color_texture=image)
+    positions = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]], dtype=np.float32)
+    normals = np.tile(np.array([0, 0, 1], dtype=np.float32), (4, 1))
+    uvs = np.array([[0, 0], [1, 0], [1, -1], [0, -1]], dtype=np.float32)
+    mesh = scene.Mesh('quad', positions, normals, uvs, [
+        scene.Submesh(np.array([0, 1, 2], dtype=np.uint32), a),
+        scene.Submesh(np.array([2, 3, 0], dtype=np.uint32), b),
+    ])
+    node = scene.Node('quad', np.zeros(3), None)
+    node.mesh = mesh
+    s = scene.Scene()
+    s.nodes.append(node)
+    s.root_nodes.append(node)
+    s.meshes.append(mesh)
+    return s
+
+
+def test_same_content_one_material():
+    data = export(create_scene())
+
+    assert len(data.gltf.materials) == 1
+    assert data.gltf.materials[0].name == 'a'
+    assert len(data.gltf.textures) == 1
+    primitive, = data.gltf.meshes[0].primitives
+    assert primitive.material == 0
+    np.testing.assert_array_equal(data.accessor(primitive.indices), [0, 1, 2, 2, 3, 0])
+    np.testing.assert_allclose(data.accessor(primitive.attributes['POSITION'])[data.accessor(primitive.indices)],
+                               create_scene().meshes[0].positions[[0, 1, 2, 2, 3, 0]])
+
+
+def test_different_content_two_materials():
+    s = create_scene()
+    s.meshes[0].submeshes[1].material.alpha_mode = gltf.AlphaMode.BLEND
+    data = export(s)
+
+    assert len(data.gltf.materials) == 2
+    assert [p.material for p in data.gltf.meshes[0].primitives] == [0, 1]
+
+
+def test_merged_submeshes_chunked():
+    '''
+    the merged indices are split as one submesh, each chunk indexes its own vertices
+    '''
+    data = export(create_scene(), chunk_max_triangles=1)
+    expected = create_scene().meshes[0].positions[[0, 1, 2, 2, 3, 0]].reshape(2, 3, 3)
+
+    primitives = data.gltf.meshes[0].primitives
+    assert len(primitives) == 2
+    triangles = []
+    for primitive in primitives:
+        assert primitive.material == 0
+        positions = data.accessor(primitive.attributes['POSITION'])
+        triangles.append(positions[data.accessor(primitive.indices)])
+    triangles = np.array(triangles)
+    order = np.lexsort(triangles.reshape(2, -1).T[::-1])
+    np.testing.assert_allclose(triangles[order], expected[np.lexsort(expected.reshape(2, -1).T[::-1])])
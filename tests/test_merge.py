@@ -0,0 +1,86 @@
+'''
+merge of static meshes by material.
+'''
+import numpy as np
+
+from conftest import load
+
+merge = load('merge')
+scene = load('scene')
+
+
+def create_quad(materials: list, offset: int=0)->object:
+    '''
+    a triangle of the quad on xy for each material. normal +z
+    '''
+    positions = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]], dtype=np.float32) + (0, 0, offset)
+    normals = np.tile(np.array([0, 0, 1], dtype=np.float32), (4, 1))
+    triangles = [[0, 1, 2], [2, 3, 0]]
+    return scene.Mesh('quad', positions, normals, None,
+                      [scene.Submesh(np.array(triangles[i], dtype=np.uint32), material)
+                       for i, material in enumerate(materials)])
+
+
+def create_scene(meshes: list, matrices: list=None)->object:
+    data = scene.Scene()
+    for i, mesh in enumerate(meshes):
+        matrix = np.array(matrices[i], dtype=np.float64) if matrices else None
+        node = scene.Node(f'node{i}', np.zeros(3), None, matrix)
+        node.mesh = mesh
+        data.nodes.append(node)
+        data.root_nodes.append(node)
+        data.meshes.append(mesh)
+    return data
+
+
+def merged_meshes(data: object)->list:
+    return [node.mesh for node in data.nodes if node.mesh]
+
+
+def test_group_by_material():
+    a = scene.Material('a')
+    b = scene.Material('b')
+    data = create_scene([create_quad([a, b]), create_quad([b], 1), create_quad([a], 2)])
+    result = merge.merge_meshes(data)
+
+    assert result == merge.MergeResult(3, 4, 2)
+    meshes = merged_meshes(data)
+    assert [mesh.submeshes[0].material for mesh in meshes] == [a, b]
+    # the merged nodes stay as empty nodes
+    assert all(node.mesh is None for node in data.nodes[:3])
+    assert data.meshes == meshes
+    for mesh in meshes:
+        indices = mesh.submeshes[0].indices
+        assert indices.dtype == np.uint16
+        # unused vertices are dropped
+        assert len(np.unique(indices)) == mesh.vertex_count
+        assert len(indices) == 6
+    # a: the first triangle of quad 0 and of quad 2
+    np.testing.assert_allclose(meshes[0].positions[meshes[0].submeshes[0].indices],
+                               [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 0, 2], [1, 0, 2], [1, 1, 2]])
+
+
+def test_uint16_split():
+    n = 40000
+    positions = np.random.default_rng(0).random((n, 3)).astype(np.float32)
+    normals = np.tile(np.array([0, 0, 1], dtype=np.float32), (n, 1))
+    meshes = [scene.Mesh(f'mesh{i}', positions, normals, None,
+                         [scene.Submesh(np.arange(n - n % 3, dtype=np.uint32), None)]) for i in range(3)]
+    result = merge.merge_meshes(create_scene(meshes))
+
+    # 2 x 40000 does not fit 65535 vertices
+    assert result.merged_primitives == 3
+
+
+def test_mirrored_node_is_rewound():
+    data = create_scene([create_quad([None, None]), create_quad([None, None])],
+                        [np.identity(4), np.diag([-1.0, 1, 1, 1])])
+    merge.merge_meshes(data)
+    mesh, = merged_meshes(data)
+
+    triangles = mesh.positions[mesh.submeshes[0].indices.astype(np.int64).reshape(-1, 3)]
+    face_normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    assert len(face_normals) == 4
+    np.testing.assert_allclose(face_normals / np.linalg.norm(face_normals, axis=1, keepdims=True),
+                               np.tile((0, 0, 1), (4, 1)), atol=1e-6)
+    np.testing.assert_allclose(mesh.normals, np.tile((0, 0, 1), (mesh.vertex_count, 1)))
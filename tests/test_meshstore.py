@@ -0,0 +1,39 @@
+'''
+bone weights of stub vertices.
+'''
+import numpy as np
+
+from conftest import load
+
+meshstore = load('meshstore')
+stub = load('benchmarks.stub')
+
+
+def vertex(*weights: float)->object:
+    return stub.MeshVertex([stub.VertexGroupElement(group, weight) for group, weight in enumerate(weights)])
+
+
+def test_keep_four_heaviest_and_normalize():
+    vertices = [
+        vertex(0.1, 0.4, 0.05, 0.3, 0.2, 0.0),
+        vertex(0.0, 0.5),
+        vertex(),
+    ]
+    names = ['a', 'b', 'c', 'd', 'e', 'f']
+    bone_weights, overflow = meshstore.read_bone_weights(vertices, names, names)
+
+    assert overflow == 1
+    np.testing.assert_array_equal(bone_weights['groups'][0], [1, 3, 4, 0])
+    np.testing.assert_allclose(bone_weights['weights'][0], np.array([0.4, 0.3, 0.2, 0.1]), rtol=1e-6)
+    np.testing.assert_array_equal(bone_weights['groups'][1], [1, 0, 0, 0])
+    np.testing.assert_allclose(bone_weights['weights'][1], [1, 0, 0, 0])
+    np.testing.assert_array_equal(bone_weights['weights'][2], [0, 0, 0, 0])
+
+
+def test_non_bone_groups_are_ignored():
+    vertices = [vertex(0.2, 0.2, 0.6)]
+    bone_weights, overflow = meshstore.read_bone_weights(vertices, ['a', 'b', 'mask'], ['a', 'b'])
+
+    assert overflow == 0
+    np.testing.assert_array_equal(bone_weights['groups'][0, :2], [0, 1])
+    np.testing.assert_allclose(bone_weights['weights'][0], [0.5, 0.5, 0, 0])
@@ -0,0 +1,63 @@
+'''
+morph target compression of sampled deformation.
+'''
+import numpy as np
+
+from conftest import load
+
+morph = load('morph')
+
+
+def create_wave(frame_count: int=24, vertex_count: int=50)->np.ndarray:
+    '''
+    (frame count, vertex count, 3) deltas of two independent motions
+    '''
+    t = np.linspace(0, 2 * np.pi, frame_count)[:, None]
+    x = np.linspace(0, 1, vertex_count)[None, :]
+    deltas = np.zeros((frame_count, vertex_count, 3))
+    deltas[:, :, 1] = np.sin(t) * x
+    deltas[:, :, 2] = np.cos(2 * t) * x ** 2
+    return deltas.astype(np.float32)
+
+
+def reconstruct(result)->np.ndarray:
+    return np.einsum('ft,tvc->fvc', result.weights, result.targets)
+
+
+def test_two_motions_two_targets():
+    deltas = create_wave()
+    result = morph.compress_deformation(deltas, 16, 1e-4)
+
+    assert result is not None
+    assert result.targets.shape == (2, 50, 3)
+    assert result.weights.shape == (24, 2)
+    assert np.abs(result.weights).max() <= 1 + 1e-6
+    assert result.error <= 1e-4
+    np.testing.assert_allclose(reconstruct(result), deltas, atol=1e-4)
+
+
+def test_max_targets():
+    deltas = create_wave()
+    result = morph.compress_deformation(deltas, 1, 1e-4)
+
+    assert result is not None
+    assert len(result.targets) == 1
+    # the remaining motion is the error
+    assert result.error > 1e-4
+    assert np.sqrt(((reconstruct(result) - deltas) ** 2).sum(axis=2)).max() <= result.error + 1e-5
+
+
+def test_within_tolerance_is_not_baked():
+    deltas = create_wave() * 1e-4
+    assert morph.compress_deformation(deltas, 16, 1e-3) is None
+
+
+def test_static_deformation():
+    '''
+    a static modifier moves the vertices from the rest pose, the same on every frame
+    '''
+    positions = np.tile(np.random.default_rng(0).random((1, 50, 3)).astype(np.float32), (24, 1, 1))
+    assert morph.max_motion(positions) == 0
+
+    positions[5, 3] += (0, 0.5, 0)
+    np.testing.assert_allclose(morph.max_motion(positions), 0.5, rtol=1e-6)
@@ -0,0 +1,78 @@
+'''
+removal of nodes that carry nothing but a transform.
+'''
+from typing import Any
+import numpy as np
+
+from conftest import load
+
+prune = load('prune')
+scene = load('scene')
+
+
+def add_node(s: Any, name: str, parent: Any, translation=(0, 0, 0))->Any:
+    node = scene.Node(name, np.array(translation, dtype=np.float64), parent)
+    s.nodes.append(node)
+    if parent:
+        parent.children.append(node)
+    else:
+        s.root_nodes.append(node)
+    return node
+
+
+def create_mesh()->Any:
+    positions = np.zeros((3, 3), dtype=np.float32)
+    return scene.Mesh('mesh', positions, positions.copy(), None,
+                      [scene.Submesh(np.array([0, 1, 2], dtype=np.uint32), None)])
+
+
+def test_keep_mesh_skin_joint_animated():
+    '''
+    empty
+        pass
+            mesh
+        leaf
+    armature: skin
+        bone
+            empty bone child
+    animated
+    '''
+    s = scene.Scene()
+    empty = add_node(s, 'empty', None, (1, 0, 0))
+    passing = add_node(s, 'pass', empty, (1, 2, 0))
+    mesh = add_node(s, 'mesh', passing, (1, 2, 3))
+    mesh.mesh = create_mesh()
+    add_node(s, 'leaf', empty)
+    armature = add_node(s, 'armature', None)
+    armature.skin = scene.Skin(armature)
+    s.skins.append(armature.skin)
+    bone = add_node(s, 'bone', armature)
+    add_node(s, 'bone child', bone)
+    animated = add_node(s, 'animated', None)
+    animated.animated = True
+
+    assert prune.remove_empty_nodes(s) == 3
+
+    assert [node.name for node in s.nodes] == ['mesh', 'armature', 'bone', 'bone child', 'animated']
+    assert [node.name for node in s.root_nodes] == ['mesh', 'armature', 'animated']
+    assert mesh.parent is None
+    # the world matrix is kept
+    np.testing.assert_allclose(mesh.position, (1, 2, 3))
+    assert [node.name for node in armature.children] == ['bone']
+
+
+def test_candidates():
+    s = scene.Scene()
+    a = add_node(s, 'a', None)
+    add_node(s, 'b', None)
+
+    assert prune.remove_empty_nodes(s, [a]) == 1
+    assert [node.name for node in s.nodes] == ['b']
+
+
+def test_nothing_to_remove():
+    s = scene.Scene()
+    node = add_node(s, 'mesh', None)
+    node.mesh = create_mesh()
+    assert prune.remove_empty_nodes(s) == 0
+    assert s.nodes == [node]
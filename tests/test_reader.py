@@ -0,0 +1,60 @@
+'''
+export with to_gltf and write, read back with reader.read.
+'''
+import json
+import pathlib
+import numpy as np
+import pytest
+
+from conftest import load
+
+gltf = load('gltf')
+reader = load('reader')
+scene = load('scene')
+to_gltf = load('to_gltf')
+writer = load('writer')
+run = load('benchmarks.run')
+scenes = load('benchmarks.scenes')
+
+
+def export(case: str, path: pathlib.Path):
+    src = scenes.CASES[case](scene, 0.1)
+    dst = run.build_scene(run.Recorder(False), src)
+    bin_path = path.parent / (path.stem + '.bin') if path.suffix == '.gltf' else None
+    root, buffers = to_gltf.to_gltf(dst, path, bin_path)
+    writer.write(path, root, buffers)
+    return root, buffers
+
+
+@pytest.mark.parametrize('case', ['skinned', 'materials'])
+@pytest.mark.parametrize('name', ['round trip.gltf', 'round trip.glb'])
+def test_round_trip(tmp_path: pathlib.Path, case: str, name: str):
+    path = tmp_path / name
+    root, buffers = export(case, path)
+    expected = reader.GLTFData(path, root, [np.frombuffer(b, dtype=np.uint8) for b in buffers])
+
+    data = reader.read(path)
+
+    assert data.gltf.accessors == root.accessors
+    assert data.gltf.bufferViews == root.bufferViews
+    assert len(data.gltf.meshes) == len(root.meshes)
+    for i in range(len(root.accessors)):
+        np.testing.assert_array_equal(data.accessor(i), expected.accessor(i))
+    for image in root.images:
+        np.testing.assert_array_equal(data.buffer_view(image.bufferView),
+                                      expected.buffer_view(image.bufferView))
+
+
+def test_buffer_uri_is_percent_encoded(tmp_path: pathlib.Path):
+    root, _ = export('dense', tmp_path / 'round trip.gltf')
+
+    assert root.buffers[0].uri == 'round%20trip.bin'
+    assert (tmp_path / 'round trip.bin').exists()
+
+
+def test_gltf_buffer_without_uri(tmp_path: pathlib.Path):
+    path = tmp_path / 'no uri.gltf'
+    path.write_text(json.dumps({'asset': {'version': '2.0'}, 'buffers': [{'byteLength': 4}]}))
+
+    with pytest.raises(ValueError):
+        reader.read(path)
@@ -0,0 +1,97 @@
+'''
+texture budget sizes, box and lanczos downscale, and sampler dedup.
+'''
+import pathlib
+import numpy as np
+import pytest
+
+from conftest import load
+
+gltf = load('gltf')
+materialstore = load('materialstore')
+resample = load('resample')
+scene = load('scene')
+to_gltf = load('to_gltf')
+
+
+def create_pixels(width: int, height: int)->np.ndarray:
+    return np.random.default_rng(0).random((height, width, 4)).astype(np.float32)
+
+
+@pytest.mark.parametrize('kernel', ['box', 'lanczos'])
+@pytest.mark.parametrize('src, dst', [((64, 32), (16, 8)), ((100, 60), (37, 23)), ((1000, 10), (7, 3))])
+def test_resize_size(kernel: str, src: tuple, dst: tuple):
+    pixels = resample.resize(create_pixels(*src), dst[0], dst[1], kernel)
+
+    assert pixels.shape == (dst[1], dst[0], 4)
+    assert pixels.dtype == np.float32
+    assert pixels.min() >= 0 and pixels.max() <= 1
+
+
+@pytest.mark.parametrize('kernel', ['box', 'lanczos'])
+def test_resize_keeps_flat_color(kernel: str):
+    pixels = np.full((48, 80, 4), 0.25, dtype=np.float32)
+    np.testing.assert_allclose(resample.resize(pixels, 13, 7, kernel), 0.25, atol=1e-5)
+
+
+def test_box_integer_factor_is_block_mean():
+    pixels = create_pixels(8, 4)
+    expected = pixels.reshape(2, 2, 4, 2, 4).mean(axis=(1, 3))
+    np.testing.assert_allclose(resample.resize(pixels, 4, 2, 'box'), expected, atol=1e-6)
+
+
+def test_fit_size():
+    assert resample.fit_size(2048, 1024, 512, False) == (512, 256)
+    assert resample.fit_size(300, 200, 0, False) == (300, 200)
+    assert resample.fit_size(300, 200, 0, True) == (256, 256)
+    assert resample.fit_size(1000, 600, 512, True) == (512, 256)
+    assert [resample.power_of_two(n) for n in (1, 3, 5, 6, 90, 91)] == [1, 4, 4, 8, 64, 128]
+
+
+def test_texture_budget():
+    color = scene.Image('color', create_pixels(64, 64))
+    normal = scene.Image('normal', create_pixels(64, 32))
+    shared = scene.Image('shared', create_pixels(64, 64))
+    materials = [scene.Material('a', color_texture=color, normal_texture=normal),
+                 scene.Material('b', color_texture=shared),
+                 scene.Material('c', normal_texture=shared)]
+    positions = np.zeros((3, 3), dtype=np.float32)
+    mesh = scene.Mesh('mesh', positions, positions.copy(), None,
+                      [scene.Submesh(np.array([0, 1, 2], dtype=np.uint32), m) for m in materials])
+    s = scene.Scene()
+    s.meshes.append(mesh)
+
+    budget = resample.TextureBudget(max_size=48, color_max_size=16, normal_max_size=32)
+    assert resample.apply_texture_budget(s, budget) == 3
+    assert (color.width, color.height) == (16, 16)
+    assert (normal.width, normal.height) == (32, 16)
+    # the larger of the color and normal limits
+    assert (shared.width, shared.height) == (32, 32)
+
+
+def test_identical_samplers_collapse(tmp_path: pathlib.Path):
+    store = materialstore.MaterialStore()
+    sampler = gltf.GLTFSampler(magFilter=gltf.MagFilterType.NEAREST, minFilter=gltf.MinFilterType.NEAREST,
+                               wrapS=gltf.WrapMode.REPEAT, wrapT=gltf.WrapMode.REPEAT)
+    assert store.get_sampler_index(sampler) == 0
+    assert store.get_sampler_index(sampler._replace()) == 0
+    assert store.get_sampler_index(sampler._replace(wrapS=gltf.WrapMode.CLAMP_TO_EDGE)) == 1
+
+    # two textures, one sampler
+    images = [scene.Image(f'image{i}', create_pixels(4, 4)) for i in range(2)]
+    positions = np.zeros((3, 3), dtype=np.float32)
+    uvs = np.zeros((3, 2), dtype=np.float32)
+    mesh = scene.Mesh('mesh', positions, positions.copy(), uvs,
+                      [scene.Submesh(np.array([0, 1, 2], dtype=np.uint32),
+                                     scene.Material(f'm{i}', color_texture=image)) for i, image in enumerate(images)])
+    node = scene.Node('node', np.zeros(3), None)
+    node.mesh = mesh
+    s = scene.Scene()
+    s.nodes.append(node)
+    s.root_nodes.append(node)
+    s.meshes.append(mesh)
+    root, _ = to_gltf.to_gltf(s, tmp_path / 'a.gltf', tmp_path / 'a.bin')
+
+    assert len(root.textures) == 2
+    assert len(root.samplers) == 1
+    assert {t.sampler for t in root.textures} == {0}
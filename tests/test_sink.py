@@ -0,0 +1,80 @@
+'''
+output paths, compression and bundles left by a failed export.
+'''
+import gzip
+import pathlib
+import tarfile
+import zipfile
+import pytest
+
+from conftest import load
+
+sink = load('sink')
+
+
+@pytest.mark.parametrize('name, inner', [
+    ('a.gltf', 'a.gltf'),
+    ('a.glb.gz', 'a.glb'),
+    ('a.zip', 'a.gltf'),
+    ('a.glb.tar.gz', 'a.glb'),
+])
+def test_open_sink(tmp_path: pathlib.Path, name: str, inner: str):
+    s, gltf_path = sink.open_sink(tmp_path / name)
+    s.close()
+    assert gltf_path == tmp_path / inner
+
+
+@pytest.mark.parametrize('name', ['a.gltf.gz', 'a.gz', 'a.zst', 'a.gltf.zst'])
+def test_compressed_gltf_is_rejected(tmp_path: pathlib.Path, name: str):
+    # the compressed .bin would not match the uri in the gltf
+    with pytest.raises(ValueError):
+        sink.check_path(tmp_path / name)
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize('partition', ['mesh', 'texture', 'size'])
+def test_compressed_glb_needs_single_buffer(tmp_path: pathlib.Path, partition: str):
+    # the extra buffers would be written next to the output, uncompressed names in the glb
+    with pytest.raises(ValueError):
+        sink.open_sink(tmp_path / 'a.glb.gz', partition=partition)
+    # a tar bundles every buffer
+    s, _ = sink.open_sink(tmp_path / 'a.glb.tar.gz', partition=partition)
+    s.close()
+    sink.check_path(tmp_path / 'a.glb.gz', 'single')
+
+
+def test_zstd_without_zstandard(tmp_path: pathlib.Path, monkeypatch):
+    monkeypatch.setattr(sink, 'zstandard', None)
+    with pytest.raises(ImportError):
+        sink.open_sink(tmp_path / 'a.glb.zst')
+    assert not list(tmp_path.iterdir())
+
+
+def test_compressed_glb(tmp_path: pathlib.Path):
+    s, gltf_path = sink.open_sink(tmp_path / 'a.glb.gz')
+    s.write(gltf_path.name, [b'glTF', b'\x00' * 100])
+    s.close()
+    assert gzip.decompress((tmp_path / 'a.glb.gz').read_bytes()) == b'glTF' + b'\x00' * 100
+
+
+@pytest.mark.parametrize('name', ['a.zip', 'a.tar', 'a.tar.gz'])
+def test_abort_removes_bundle(tmp_path: pathlib.Path, name: str):
+    path = tmp_path / name
+    s, _ = sink.open_sink(path)
+    s.write('a.gltf', [b'{}'])
+    s.abort()
+    assert not path.exists()
+
+
+def test_close_bundles(tmp_path: pathlib.Path):
+    s, _ = sink.open_sink(tmp_path / 'a.zip')
+    s.write('a.gltf', [b'{}'])
+    s.close()
+    with zipfile.ZipFile(tmp_path / 'a.zip') as z:
+        assert z.read('a.gltf') == b'{}'
+
+    s, _ = sink.open_sink(tmp_path / 'a.tar.gz')
+    s.write('a.gltf', [b'{}'])
+    s.close()
+    with tarfile.open(tmp_path / 'a.tar.gz') as t:
+        assert t.extractfile('a.gltf').read() == b'{}'
@@ -0,0 +1,73 @@
+'''
+joint indices of a streamed skinned mesh against a mesh packed by to_gltf.
+'''
+import pathlib
+from typing import Any, List
+import numpy as np
+
+from conftest import load
+
+reader = load('reader')
+scene = load('scene')
+to_gltf = load('to_gltf')
+
+
+def create_scene()->Any:
+    '''
+    root with the joints a and b. the quad is weighted to b
+    '''
+    root = scene.Node('root', np.zeros(3, dtype=np.float32), None)
+    a = scene.Node('a', np.array([0, 1, 0], dtype=np.float32), root)
+    b = scene.Node('b', np.array([0, 2, 0], dtype=np.float32), root)
+    root.children.extend([a, b])
+    positions = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]], dtype=np.float32)
+    normals = np.tile(np.array([0, 0, 1], dtype=np.float32), (4, 1))
+    joints = np.zeros((4, 4), dtype=np.int32)
+    weights = np.array([[1, 0, 0, 0]] * 4, dtype=np.float32)
+    mesh = scene.Mesh('quad', positions, normals, None,
+                      [scene.Submesh(np.array([0, 1, 2, 2, 3, 0], dtype=np.uint32), None)],
+                      joints, weights, ['b'])
+    root.mesh = mesh
+    root.skin = scene.Skin(root)
+
+    s = scene.Scene()
+    s.nodes = [root, a, b]
+    s.root_nodes = [root]
+    s.meshes = [mesh]
+    s.skins = [root.skin]
+    return s
+
+
+def add_later_node(s: Any):
+    '''
+    an object exported after the mesh, under the joint a. shifts b in the traversal
+    '''
+    a = s.nodes[1]
+    later = scene.Node('later', np.zeros(3, dtype=np.float32), a)
+    a.children.append(later)
+    s.nodes.append(later)
+
+
+def joint_names(s: Any, packer: Any)->List[str]:
+    path = pathlib.Path('skin.glb')
+    root, buffers = to_gltf.to_gltf(s, path, None, packer=packer)
+    data = reader.GLTFData(path, root, [np.frombuffer(bytes(b), dtype=np.uint8) for b in buffers])
+    joints = data.accessor(root.meshes[0].primitives[0].attributes['JOINTS_0'])
+    skin = root.skins[0]
+    return [root.nodes[skin.joints[j]].name for j in joints[:, 0]]
+
+
+def test_streamed_joints_match():
+    s = create_scene()
+    add_later_node(s)
+    expected = joint_names(s, to_gltf.MeshPacker())
+
+    s = create_scene()
+    packer = to_gltf.MeshPacker()
+    # streaming packs the mesh at extraction, before the hierarchy is complete
+    packer.pack_mesh(s.meshes[0], s.skins[0])
+    add_later_node(s)
+    streamed = joint_names(s, packer)
+
+    assert expected == ['b'] * 4
+    assert streamed == expected
@@ -0,0 +1,133 @@
+'''
+tangents of a flat, a mirrored and a curved surface against their analytic direction,
+and the split of mirrored uv seams.
+'''
+import numpy as np
+
+from conftest import load
+
+buffermanager = load('buffermanager')
+materialstore = load('materialstore')
+scene = load('scene')
+tangent = load('tangent')
+to_gltf = load('to_gltf')
+
+# max angle between the computed and the analytic tangent
+MAX_DEGREES = 0.1
+
+
+def angle_degrees(a: np.ndarray, b: np.ndarray)->np.ndarray:
+    a = a / np.linalg.norm(a, axis=1)[:, None]
+    b = b / np.linalg.norm(b, axis=1)[:, None]
+    return np.degrees(np.arccos(np.clip(np.einsum('ij,ij->i', a, b), -1, 1)))
+
+
+def create_quad(mirrored: bool):
+    '''
+    unit quad on xy, normal +z. blender uv = (x, y), mirrored: (1 - x, y)
+    '''
+    positions = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]], dtype=np.float32)
+    normals = np.tile(np.array([0, 0, 1], dtype=np.float32), (4, 1))
+    u = 1 - positions[:, 0] if mirrored else positions[:, 0]
+    # gltf v is flipped
+    uvs = np.stack([u, -positions[:, 1]], axis=1)
+    indices = np.array([0, 1, 2, 2, 3, 0], dtype=np.uint32)
+    return positions, normals, uvs, indices
+
+
+def test_flat_quad():
+    tangents = tangent.compute_tangents(*create_quad(False))
+
+    np.testing.assert_allclose(tangents, np.tile([1, 0, 0, 1], (4, 1)), atol=1e-6)
+
+
+def test_mirrored_quad():
+    tangents = tangent.compute_tangents(*create_quad(True))
+
+    # u runs along -x, v still along +y: bitangent = cross(normal, tangent) * w = +y
+    np.testing.assert_allclose(tangents, np.tile([-1, 0, 0, -1], (4, 1)), atol=1e-6)
+
+
+def test_sphere():
+    # latitude band without the poles, the seam column is duplicated
+    lon = np.linspace(0, 2 * np.pi, 33)
+    lat = np.linspace(-1.2, 1.2, 17)
+    lon_grid, lat_grid = np.meshgrid(lon, lat)
+    lon_grid = lon_grid.ravel()
+    lat_grid = lat_grid.ravel()
+    positions = np.stack([np.cos(lat_grid) * np.cos(lon_grid),
+                          np.cos(lat_grid) * np.sin(lon_grid),
+                          np.sin(lat_grid)], axis=1).astype(np.float32)
+    normals = positions.copy()
+    uvs = np.stack([lon_grid / (2 * np.pi), -(lat_grid + 1.2) / 2.4], axis=1).astype(np.float32)
+    columns = len(lon)
+    quads = []
+    for row in range(len(lat) - 1):
+        for column in range(columns - 1):
+            i = row * columns + column
+            quads.append([i, i + 1, i + 1 + columns, i + 1 + columns, i + columns, i])
+    indices = np.array(quads, dtype=np.uint32).ravel()
+
+    tangents = tangent.compute_tangents(positions, normals, uvs, indices)
+
+    # increasing longitude
+    expected = np.stack([-np.sin(lon_grid), np.cos(lon_grid), np.zeros_like(lon_grid)], axis=1)
+    degrees = angle_degrees(tangents[:, :3], expected)
+    # the seam vertices have faces on one side only, their tangent follows the chord
+    seam = (np.arange(len(positions)) % columns == 0) | (np.arange(len(positions)) % columns == columns - 1)
+    assert degrees[~seam].max() < MAX_DEGREES
+    assert degrees[seam].max() < np.degrees(lon[1]) / 2
+    np.testing.assert_allclose(np.linalg.norm(tangents[:, :3], axis=1), 1, atol=1e-5)
+    # latitude increases with v
+    assert (tangents[:, 3] == 1).all()
+
+
+def create_mirrored_seam():
+    '''
+    two quads on xy sharing the edge x = 1. u mirrors at the edge: 0, 1, 0 along x
+    '''
+    x = np.array([0, 1, 2, 0, 1, 2], dtype=np.float32)
+    y = np.array([0, 0, 0, 1, 1, 1], dtype=np.float32)
+    positions = np.stack([x, y, np.zeros(6, dtype=np.float32)], axis=1)
+    normals = np.tile(np.array([0, 0, 1], dtype=np.float32), (6, 1))
+    uvs = np.stack([1 - np.abs(x - 1), -y], axis=1)
+    indices = np.array([0, 1, 4, 4, 3, 0, 1, 2, 5, 5, 4, 1], dtype=np.uint32)
+    return positions, normals, uvs, indices
+
+
+def test_split_mirrored_seam():
+    positions, normals, uvs, indices = create_mirrored_seam()
+    source, split = tangent.split_mirrored(uvs, indices, len(positions))
+
+    # the seam vertices 1 and 4 are copied for the mirrored quad
+    np.testing.assert_array_equal(source, [0, 1, 2, 3, 4, 5, 1, 4])
+    np.testing.assert_array_equal(split, [0, 1, 4, 4, 3, 0, 6, 2, 5, 5, 7, 6])
+
+    tangents = tangent.compute_tangents(positions[source], normals[source], uvs[source], split)
+    left = [0, 1, 3, 4]
+    right = [2, 5, 6, 7]
+    np.testing.assert_allclose(tangents[left], np.tile([1, 0, 0, 1], (4, 1)), atol=1e-6)
+    np.testing.assert_allclose(tangents[right], np.tile([-1, 0, 0, -1], (4, 1)), atol=1e-6)
+
+
+def test_no_split_without_mirror():
+    positions, normals, uvs, indices = create_quad(False)
+    source, split = tangent.split_mirrored(uvs, indices, len(positions))
+
+    np.testing.assert_array_equal(source, np.arange(4))
+    assert split is indices
+
+
+def test_to_mesh_splits_mirrored_seam():
+    positions, normals, uvs, indices = create_mirrored_seam()
+    material = scene.Material('normal mapped', normal_texture=scene.Image(
+        'normal', np.ones((4, 4, 4), dtype=np.float32)))
+    mesh = scene.Mesh('seam', positions, normals, uvs, [scene.Submesh(indices, material)])
+    buffer = buffermanager.BufferManager()
+    gltf_mesh = to_gltf.to_mesh(mesh, {}, buffer, materialstore.MaterialStore())
+
+    primitive, = gltf_mesh.primitives
+    assert buffer.accessors[primitive.attributes['POSITION']].count == 8
+    assert buffer.accessors[primitive.attributes['TANGENT']].count == 8
+    # the source mesh is left as is
+    assert mesh.vertex_count == 6
@@ -0,0 +1,145 @@
+'''
+trs decomposition, local matrices and baking world matrices into vertices.
+'''
+import pathlib
+import numpy as np
+
+from conftest import load
+
+transform = load('transform')
+scene = load('scene')
+to_gltf = load('to_gltf')
+
+
+def compose(translation, rotation, scale)->np.ndarray:
+    '''
+    rotation: (x, y, z, w)
+    '''
+    m = np.identity(4)
+    m[:3, :3] = transform.rotation_from_quaternion(np.array([rotation], dtype=np.float64))[0] * scale
+    m[:3, 3] = translation
+    return m
+
+
+def create_quad(name: str='quad')->object:
+    '''
+    on xy, counter clockwise seen from +z, normal +z
+    '''
+    positions = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]], dtype=np.float32)
+    normals = np.tile(np.array([0, 0, 1], dtype=np.float32), (4, 1))
+    return scene.Mesh(name, positions, normals, None,
+                      [scene.Submesh(np.array([0, 1, 2, 2, 3, 0], dtype=np.uint32), None)])
+
+
+def create_scene(matrices: list, mesh: object=None)->object:
+    '''
+    a root node for each matrix
+    '''
+    data = scene.Scene()
+    for i, m in enumerate(matrices):
+        node = scene.Node(f'node{i}', np.zeros(3), None, np.array(m, dtype=np.float64))
+        node.mesh = mesh if mesh else create_quad()
+        data.nodes.append(node)
+        data.root_nodes.append(node)
+        if node.mesh not in data.meshes:
+            data.meshes.append(node.mesh)
+    return data
+
+
+def face_normals(mesh: object)->np.ndarray:
+    p = mesh.positions[mesh.submeshes[0].indices.astype(np.int64).reshape(-1, 3)]
+    n = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+    return n / np.linalg.norm(n, axis=1, keepdims=True)
+
+
+def test_decompose_round_trip():
+    rotation = np.array([0.1, 0.7, -0.3, 0.6])
+    rotation /= np.linalg.norm(rotation)
+    matrices = np.array([
+        compose((1, 2, 3), rotation, (2, 3, 4)),
+        compose((0, 0, 0), (0, 0, 0, 1), (-1, 1, 1)),
+        compose((-5, 0, 1), rotation, (-2, 0.5, 3)),
+    ])
+    trs = transform.decompose(matrices)
+
+    assert trs.exact.all()
+    recomposed = np.array([compose(t, r, s) for t, r, s in zip(trs.translation, trs.rotation, trs.scale)])
+    np.testing.assert_allclose(recomposed, matrices, atol=1e-9)
+    # a mirror is a negative x scale
+    np.testing.assert_allclose(trs.scale[1], (-1, 1, 1))
+    assert trs.scale[2, 0] < 0
+
+
+def test_shear_is_not_exact():
+    m = np.identity(4)
+    m[0, 1] = 0.5
+    assert not transform.decompose(m[None]).exact[0]
+
+
+def test_local_matrices():
+    parent = scene.Node('parent', np.zeros(3), None, compose((1, 2, 3), (0, 0.6, 0, 0.8), (2, 2, 2)))
+    child = scene.Node('child', np.zeros(3), parent, compose((4, 0, 0), (0.6, 0, 0, 0.8), (1, -1, 1)))
+    local = transform.get_local_matrices([parent, child])
+
+    np.testing.assert_allclose(local[0], parent.matrix)
+    np.testing.assert_allclose(parent.matrix @ local[1], child.matrix, atol=1e-12)
+
+
+def test_singular_parent(tmp_path: pathlib.Path):
+    parent = scene.Node('parent', np.zeros(3), None, np.diag([0.0, 1, 1, 1]))
+    child = scene.Node('child', np.zeros(3), parent, compose((0, 2, 0), (0, 0, 0, 1), (1, 1, 1)))
+    parent.children.append(child)
+    data = scene.Scene()
+    data.nodes.extend([parent, child])
+    data.root_nodes.append(parent)
+
+    local = transform.get_local_matrices(data.nodes)
+    assert np.isfinite(local).all()
+    np.testing.assert_allclose(parent.matrix @ local[1], parent.matrix @ child.matrix, atol=1e-12)
+
+    gltf, _ = to_gltf.to_gltf(data, tmp_path / 'a.gltf', tmp_path / 'a.bin')
+    # the local matrix is not unique, written as a matrix
+    assert gltf.nodes[1].matrix is not None
+    assert gltf.nodes[1].translation is None
+
+
+def test_zero_scale_normals():
+    normals = np.array([[0, 0, 1], [1, 0, 0]], dtype=np.float32)
+    m = np.diag([1.0, 1, 0, 1])
+    transformed = transform.transform_normals(m, normals)
+
+    np.testing.assert_allclose(transformed[0], (0, 0, 1))
+    # flattened onto the normal plane, no direction left
+    np.testing.assert_allclose(transformed[1], (0, 0, 0))
+
+    data = create_scene([m])
+    assert transform.apply_transforms(data) == 1
+    np.testing.assert_allclose(data.meshes[0].normals, np.tile((0, 0, 1), (4, 1)))
+
+
+def test_mirrored_node_keeps_faces_outside():
+    data = create_scene([np.diag([-1.0, 1, 1, 1])])
+    assert transform.apply_transforms(data) == 1
+    mesh = data.nodes[0].mesh
+
+    np.testing.assert_allclose(mesh.normals, np.tile((0, 0, 1), (4, 1)))
+    # the winding is reversed, the face normal follows the vertex normal
+    np.testing.assert_allclose(face_normals(mesh), np.tile((0, 0, 1), (2, 1)), atol=1e-6)
+    np.testing.assert_array_equal(data.nodes[0].matrix, np.identity(4))
+
+
+def test_shared_mesh_is_copied():
+    mesh = create_quad()
+    data = create_scene([compose((1, 0, 0), (0, 0, 0, 1), (1, 1, 1)),
+                         compose((0, 0, 5), (0, 0, 0, 1), (-1, 1, 1))], mesh)
+    positions = mesh.positions.copy()
+    assert transform.apply_transforms(data) == 2
+
+    first, second = data.nodes[0].mesh, data.nodes[1].mesh
+    assert first is not second
+    assert len(data.meshes) == 2
+    np.testing.assert_allclose(first.positions, positions + (1, 0, 0))
+    np.testing.assert_allclose(second.positions, positions * (-1, 1, 1) + (0, 0, 5))
+    # only the mirrored copy is rewound
+    np.testing.assert_array_equal(first.submeshes[0].indices, [0, 1, 2, 2, 3, 0])
+    np.testing.assert_allclose(face_normals(second), np.tile((0, 0, 1), (2, 1)), atol=1e-6)
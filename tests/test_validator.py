@@ -0,0 +1,86 @@
+'''
+small broken gltfs, one violation code each.
+'''
+import pathlib
+from typing import Any, List
+import numpy as np
+
+from conftest import load
+
+reader = load('reader')
+scene = load('scene')
+to_gltf = load('to_gltf')
+validator = load('validator')
+
+
+def create_data()->Any:
+    '''
+    a skinned quad. root and child are the joints
+    '''
+    root = scene.Node('root', np.zeros(3, dtype=np.float32), None)
+    child = scene.Node('child', np.array([0, 1, 0], dtype=np.float32), root)
+    root.children.append(child)
+    positions = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]], dtype=np.float32)
+    normals = np.tile(np.array([0, 0, 1], dtype=np.float32), (4, 1))
+    joints = np.array([[0, 1, 0, 0]] * 4, dtype=np.int32)
+    weights = np.array([[0.5, 0.5, 0, 0]] * 4, dtype=np.float32)
+    mesh = scene.Mesh('quad', positions, normals, None,
+                      [scene.Submesh(np.array([0, 1, 2, 2, 3, 0], dtype=np.uint32), None)],
+                      joints, weights, ['root', 'child'])
+    root.mesh = mesh
+    root.skin = scene.Skin(root)
+
+    s = scene.Scene()
+    s.nodes = [root, child]
+    s.root_nodes = [root]
+    s.meshes = [mesh]
+    s.skins = [root.skin]
+    path = pathlib.Path('quad.glb')
+    root_gltf, buffers = to_gltf.to_gltf(s, path, None)
+    return reader.GLTFData(path, root_gltf, [np.frombuffer(bytearray(b), dtype=np.uint8) for b in buffers])
+
+
+def codes(data: Any)->List[str]:
+    return [v.code for v in validator.validate(data)]
+
+
+def attribute(data: Any, semantic: str)->int:
+    return data.gltf.meshes[0].primitives[0].attributes[semantic]
+
+
+def replace_accessor(data: Any, index: int, **kw: Any):
+    data.gltf.accessors[index] = data.gltf.accessors[index]._replace(**kw)
+
+
+def test_clean_export():
+    assert codes(create_data()) == []
+
+
+def test_misaligned_offset():
+    data = create_data()
+    replace_accessor(data, attribute(data, 'POSITION'), byteOffset=2)
+    assert 'MISALIGNED_OFFSET' in codes(data)
+
+
+def test_stale_min_max():
+    data = create_data()
+    replace_accessor(data, attribute(data, 'POSITION'), max=[2.0, 1.0, 0.0])
+    assert 'STALE_MIN_MAX' in codes(data)
+
+
+def test_joint_out_of_range():
+    data = create_data()
+    data.accessor(attribute(data, 'JOINTS_0'))[0, 0] = 2
+    assert 'JOINT_OUT_OF_RANGE' in codes(data)
+
+
+def test_non_normalized_weights():
+    data = create_data()
+    data.accessor(attribute(data, 'WEIGHTS_0'))[1] = (0.5, 0.2, 0, 0)
+    assert 'NON_NORMALIZED_WEIGHTS' in codes(data)
+
+
+def test_index_out_of_range():
+    data = create_data()
+    data.accessor(data.gltf.meshes[0].primitives[0].indices)[3] = 4
+    assert 'INDEX_OUT_OF_RANGE' in codes(data)
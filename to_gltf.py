@@ -1,153 +1,384 @@
 import pathlib
-import ctypes
-from typing import Tuple, List, Optional
+import urllib.parse
+from typing import Tuple, List, Optional, Dict, Any
+import numpy as np
 
 from . import gltf
 from .buffermanager import BufferManager
 from .materialstore import MaterialStore
-from .gltfbuilder import GLTFBuilder, Node, Skin, Any
-from .meshstore import Mesh
-
-
-class Matrix4(ctypes.LittleEndianStructure):
-    _fields_ = [
-        ("_11", ctypes.c_float),
-        ("_12", ctypes.c_float),
-        ("_13", ctypes.c_float),
-        ("_14", ctypes.c_float),
-        ("_21", ctypes.c_float),
-        ("_22", ctypes.c_float),
-        ("_23", ctypes.c_float),
-        ("_24", ctypes.c_float),
-        ("_31", ctypes.c_float),
-        ("_32", ctypes.c_float),
-        ("_33", ctypes.c_float),
-        ("_34", ctypes.c_float),
-        ("_41", ctypes.c_float),
-        ("_42", ctypes.c_float),
-        ("_43", ctypes.c_float),
-        ("_44", ctypes.c_float),
-    ]
-
-    @staticmethod
-    def identity()->Any:
-        return Matrix4(1.0, 0.0, 0.0, 0.0,
-                       0.0, 1.0, 0.0, 0.0,
-                       0.0, 0.0, 1.0, 0.0,
-                       0.0, 0.0, 0.0, 1.0)
-
-    @staticmethod
-    def translation(x: float, y: float, z: float)->Any:
-        return Matrix4(1.0, 0.0, 0.0, 0.0,
-                       0.0, 1.0, 0.0, 0.0,
-                       0.0, 0.0, 1.0, 0.0,
-                       x, y, z, 1.0)
-
-
-def to_mesh(mesh: Mesh, buffer: BufferManager, material_store: MaterialStore)->gltf.GLTFMesh:
-    primitives: List[gltf.GLTFMeshPrimitive] = []
-    for i, submesh in enumerate(mesh.submeshes):
-        if i == 0:
-            # attributes
-            attributes = {
-                'POSITION': buffer.push_bytes(f'{mesh.name}.POSITION',
-                                              mesh.positions.values, mesh.positions.min, mesh.positions.max),
-                'NORMAL': buffer.push_bytes(f'{mesh.name}.NORMAL',
-                                            mesh.normals.values, mesh.normals.min, mesh.normals.max)
-            }
-
-            if mesh.uvs:
-                attributes['TEXCOORD_0'] = buffer.push_bytes(
-                    f'{mesh.name}.TEXCOORD_0', mesh.uvs.values, mesh.uvs.min, mesh.uvs.max)
-
-            if mesh.joints and mesh.weights:
-                attributes['JOINTS_0'] = buffer.push_bytes(
-                    f'{mesh.name}.JOINTS_0', mesh.joints)
-                attributes['WEIGHTS_0'] = buffer.push_bytes(
-                    f'{mesh.name}.WEIGHTS_0', mesh.weights)
-
-        # submesh indices
-        indices_accessor_index = buffer.push_bytes(
-            f'{mesh.name}.INDICES', memoryview(submesh.indices))
-
-        try:
-            material = mesh.materials[submesh.material_index]
-        except IndexError:
-            material = None
+from .chunk import split_submesh
+from .tangent import compute_tangents, split_mirrored
+from .attributes import AttributePlan, plan_material
+from .scene import Scene, Node, Skin, SkinTable, Mesh
+from .profiler import Profiler
+from . import transform
+
+
+def get_min_max(values: np.ndarray)->Tuple[List[float], List[float]]:
+    return values.min(axis=0).tolist(), values.max(axis=0).tolist()
+
+
+def to_joints(mesh: Mesh, joint_map: Dict[str, int])->np.ndarray:
+    '''
+    vertex group index to joint index
+    joint_map: SkinTable.joint_map
+    '''
+    group_index_to_joint_index = np.zeros(
+        max(1, len(mesh.vertex_group_names)), dtype=np.uint16)
+    group_index_to_joint_index[:len(mesh.vertex_group_names)] = [
+        joint_map.get(vertex_group, 0) for vertex_group in mesh.vertex_group_names]
+    return group_index_to_joint_index[mesh.joints]
+
+
+def push_attributes(name: str, mesh: Mesh, joints: Optional[np.ndarray], buffer: BufferManager,
+                    vertices: Optional[np.ndarray]=None, tangents: Optional[np.ndarray]=None,
+                    uvs: bool=True)->Dict[str, int]:
+    '''
+    joints: to_joints of the mesh. None if not skinned
+    vertices: push only these vertices. None for all
+    tangents: compute_tangents of the mesh. None without normal map
+    uvs: push TEXCOORD_0 if the mesh has uvs
+
+    only POSITION has min/max, the one the spec requires
+    '''
+    def select(values: np.ndarray)->np.ndarray:
+        return values if vertices is None else values[vertices]
+
+    positions = select(mesh.positions)
+    position_min, position_max = get_min_max(positions)
+    attributes = {
+        'POSITION': buffer.push_array(f'{name}.POSITION',
+                                      positions, position_min, position_max),
+        'NORMAL': buffer.push_array(f'{name}.NORMAL', select(mesh.normals))
+    }
+
+    if tangents is not None:
+        attributes['TANGENT'] = buffer.push_array(f'{name}.TANGENT', select(tangents))
+
+    if uvs and mesh.uvs is not None:
+        attributes['TEXCOORD_0'] = buffer.push_array(
+            f'{name}.TEXCOORD_0', select(mesh.uvs))
 
+    if joints is not None and mesh.weights is not None:
+        attributes['JOINTS_0'] = buffer.push_array(
+            f'{name}.JOINTS_0', select(joints))
+        attributes['WEIGHTS_0'] = buffer.push_array(
+            f'{name}.WEIGHTS_0', select(mesh.weights))
+
+    return attributes
+
+
+def push_targets(name: str, mesh: Mesh, buffer: BufferManager,
+                 vertices: Optional[np.ndarray]=None)->List[Dict[str, int]]:
+    '''
+    POSITION of each morph target
+    vertices: push only these vertices. None for all
+    '''
+    if mesh.morph_targets is None:
+        return []
+    targets: List[Dict[str, int]] = []
+    for i, deltas in enumerate(mesh.morph_targets):
+        if vertices is not None:
+            deltas = deltas[vertices]
+        delta_min, delta_max = get_min_max(deltas)
+        targets.append({'POSITION': buffer.push_array(
+            f'{name}.target{i}.POSITION', deltas, delta_min, delta_max)})
+    return targets
+
+
+def select_vertices(mesh: Mesh, source: np.ndarray)->Mesh:
+    '''
+    a copy of the vertex arrays indexed by source, without submeshes.
+    the vertices of to_mesh after split_mirrored
+    '''
+    def select(values: Optional[np.ndarray])->Optional[np.ndarray]:
+        return values[source] if values is not None else None
+
+    selected = Mesh(mesh.name, mesh.positions[source], mesh.normals[source], select(mesh.uvs), [],
+                    select(mesh.joints), select(mesh.weights), mesh.vertex_group_names)
+    if mesh.morph_targets is not None:
+        selected.morph_targets = mesh.morph_targets[:, source]
+    return selected
+
+
+def to_mesh(mesh: Mesh, joint_map: Dict[str, int], buffer: BufferManager, material_store: MaterialStore,
+            chunk_max_triangles: int=0)->gltf.GLTFMesh:
+    '''
+    joint_map: SkinTable.joint_map. empty if not skinned
+    chunk_max_triangles: split larger submeshes into spatial chunks.
+    each chunk is a primitive with its own vertices. 0 to keep submeshes whole
+    '''
+    # submeshes that end up on the same gltf material are drawn as one primitive
+    material_indices: Dict[int, List[np.ndarray]] = {}
+    # the attributes each primitive's material uses
+    plans: Dict[int, AttributePlan] = {}
+    for submesh in mesh.submeshes:
         gltf_material_index = material_store.get_material_index(
-            material, buffer)
+            submesh.material, buffer)
+        material_indices.setdefault(gltf_material_index, []).append(submesh.indices)
+        plans[gltf_material_index] = plans.get(gltf_material_index, AttributePlan()).union(
+            plan_material(submesh.material))
+    normal_mapped = [i for i, plan in plans.items() if plan.tangents]
+    use_uvs = any(plan.uvs for plan in plans.values())
+
+    # from the triangles of the normal mapped primitives only
+    tangents = None
+    if normal_mapped and mesh.uvs is not None:
+        groups = [material_indices[i] for i in normal_mapped]
+        source, split_indices = split_mirrored(
+            mesh.uvs, np.concatenate([indices for group in groups for indices in group]), mesh.vertex_count)
+        if len(source) > mesh.vertex_count:
+            # a copy for the mirrored side of uv seams
+            mesh = select_vertices(mesh, source)
+            ends = np.cumsum([len(indices) for group in groups for indices in group])
+            parts = iter(np.split(split_indices, ends[:-1]))
+            for i, group in zip(normal_mapped, groups):
+                material_indices[i] = [next(parts) for _ in group]
+        tangents = compute_tangents(mesh.positions, mesh.normals, mesh.uvs, np.concatenate(
+            [indices for i in normal_mapped for indices in material_indices[i]]))
 
-        primitives.append(gltf.GLTFMeshPrimitive(
-            attributes=attributes,
-            indices=indices_accessor_index,
-            material=gltf_material_index,
-            mode=gltf.GLTFMeshPrimitiveTopology.TRIANGLES,
-            targets=[]
-        ))
+    joints = None
+    if joint_map and mesh.joints is not None and mesh.weights is not None:
+        joints = to_joints(mesh, joint_map)
+
+    primitives: List[gltf.GLTFMeshPrimitive] = []
+    # attributes of all vertices, shared by the whole submeshes
+    shared: Optional[Dict[str, int]] = None
+    shared_targets: List[Dict[str, int]] = []
+    for gltf_material_index, group in material_indices.items():
+        indices = group[0] if len(group) == 1 else np.concatenate(group)
+        plan = plans[gltf_material_index]
+        chunks = None
+        if chunk_max_triangles:
+            chunks = split_submesh(mesh.positions, indices, chunk_max_triangles)
+
+        if chunks is None:
+            if shared is None:
+                shared = push_attributes(mesh.name, mesh, joints, buffer, tangents=tangents, uvs=use_uvs)
+                shared_targets = push_targets(mesh.name, mesh, buffer)
+            attributes = plan.select(shared)
+            parts = [(attributes, shared_targets, buffer.push_array(f'{mesh.name}.INDICES', indices))]
+        else:
+            parts = []
+            for chunk in chunks:
+                name = f'{mesh.name}.chunk{len(primitives) + len(parts)}'
+                attributes = push_attributes(name, mesh, joints, buffer, chunk.vertices,
+                                             tangents if plan.tangents else None, plan.uvs)
+                parts.append((attributes, push_targets(name, mesh, buffer, chunk.vertices),
+                              buffer.push_array(f'{name}.INDICES', chunk.indices)))
+
+        for attributes, targets, indices_accessor_index in parts:
+            primitives.append(gltf.GLTFMeshPrimitive(
+                attributes=attributes,
+                indices=indices_accessor_index,
+                material=gltf_material_index,
+                mode=gltf.GLTFMeshPrimitiveTopology.TRIANGLES,
+                targets=targets
+            ))
 
     #print(position_accessor_index, indices_accessor_index)
     return gltf.GLTFMesh(
         name=mesh.name,
-        primitives=primitives
+        primitives=primitives,
+        weights=[0.0] * len(mesh.morph_targets) if mesh.morph_targets is not None else []
     )
 
 
-def to_gltf(self: GLTFBuilder, gltf_path: pathlib.Path, bin_path: Optional[pathlib.Path])->Tuple[gltf.GLTF, bytearray]:
-    # create buffer
-    buffer = BufferManager()
+class MeshPacker:
+    '''
+    pack meshes into the output buffer.
+
+    streaming export packs each mesh right after extraction,
+    to_gltf packs the rest.
+    '''
 
-    # material
-    material_store = MaterialStore()
+    def __init__(self, profiler: Optional[Profiler]=None, buffer: Optional[BufferManager]=None,
+                 chunk_max_triangles: int=0)->None:
+        self.profiler = profiler if profiler else Profiler()
+        self.buffer = buffer if buffer else BufferManager()
+        self.chunk_max_triangles = chunk_max_triangles
+        self.material_store = MaterialStore(self.profiler)
+        self.meshes: List[gltf.GLTFMesh] = []
+        self.mesh_map: Dict[Mesh, int] = {}
+        self.skin_tables: Dict[Skin, SkinTable] = {}
 
-    meshes: List[gltf.GLTFMesh] = []
-    for store in self.mesh_stores:
-        skin = self.get_skin_for_store(store)
-        bone_names: List[str] = []
+    def get_skin_table(self, skin: Skin)->SkinTable:
+        '''
+        built once, by the first mesh packed with the skin or by to_gltf
+        '''
+        table = self.skin_tables.get(skin)
+        if not table:
+            table = SkinTable(skin)
+            self.skin_tables[skin] = table
+        return table
+
+    def pack_mesh(self, mesh: Mesh, skin: Optional[Skin])->int:
+        if mesh in self.mesh_map:
+            return self.mesh_map[mesh]
+
+        joint_map: Dict[str, int] = {}
         if skin:
-            bone_names = [joint.name for joint in skin.root.traverse()]
-        meshes.append(to_mesh(store.freeze(
-            bone_names), buffer, material_store))
+            joint_map = self.get_skin_table(skin).joint_map
+        with self.profiler.span('pack_mesh', mesh=mesh.name, unique_vertices=mesh.vertex_count) as span:
+            offset = self.buffer.byte_length
+            index = len(self.meshes)
+            with self.buffer.group('mesh'):
+                self.meshes.append(to_mesh(mesh, joint_map, self.buffer, self.material_store,
+                                           self.chunk_max_triangles))
+            span.counts['bytes'] = self.buffer.byte_length - offset
+        self.mesh_map[mesh] = index
+        return index
+
+
+def to_instancing(node: Node, buffer: BufferManager)->gltf.EXTMeshGpuInstancing:
+    '''
+    TRANSLATION, ROTATION and SCALE accessors from node.instances.
+    ROTATION and SCALE are omitted if identity
+    '''
+    assert node.instances is not None
+    trs = transform.decompose(node.instances)
+    attributes = {
+        'TRANSLATION': buffer.push_array(f'{node.name}.TRANSLATION', trs.translation.astype(np.float32)),
+    }
+    if not np.allclose(trs.rotation, (0, 0, 0, 1)):
+        attributes['ROTATION'] = buffer.push_array(f'{node.name}.ROTATION', trs.rotation.astype(np.float32))
+    if not np.allclose(trs.scale, (1, 1, 1)):
+        attributes['SCALE'] = buffer.push_array(f'{node.name}.SCALE', trs.scale.astype(np.float32))
+    return gltf.EXTMeshGpuInstancing(attributes=attributes)
+
+
+def to_morph_animation(nodes: List[Node], node_map: Dict[Node, int], buffer: BufferManager)->gltf.GLTFAnimation:
+    '''
+    one animation that plays the morph target weights of all nodes
+    '''
+    channels: List[gltf.GLTFAnimationChannel] = []
+    samplers: List[gltf.GLTFAnimationSampler] = []
+    for node in nodes:
+        animation = node.morph_animation
+        assert animation
+        times = animation.times
+        input_index = buffer.push_array(f'{node.name}.weights.input', times,
+                                        [float(times.min())], [float(times.max())])
+        # frame major, the weights of all targets for each frame
+        output_index = buffer.push_array(f'{node.name}.weights.output', animation.weights.ravel())
+        channels.append(gltf.GLTFAnimationChannel(
+            sampler=len(samplers),
+            target=gltf.GLTFAnimationChannelTarget(node=node_map[node], path='weights')))
+        samplers.append(gltf.GLTFAnimationSampler(input=input_index, output=output_index))
+    return gltf.GLTFAnimation(name='deformation', channels=channels, samplers=samplers)
+
+
+def get_buffer_uri(gltf_path: pathlib.Path, bin_path: Optional[pathlib.Path], index: int)->Optional[str]:
+    '''
+    bin_path for the first buffer(None to embed in glb), <name>.<index>.bin for the others.
+    percent-encoded
+    '''
+    if index == 0:
+        return urllib.parse.quote(bin_path.relative_to(gltf_path.parent).as_posix()) if bin_path else None
+    return urllib.parse.quote(f'{gltf_path.stem}.{index}.bin')
+
+
+def to_gltf(self: Scene, gltf_path: pathlib.Path, bin_path: Optional[pathlib.Path],
+            profiler: Optional[Profiler]=None,
+            packer: Optional[MeshPacker]=None)->Tuple[gltf.GLTF, List[bytearray]]:
+    '''
+    packer: holds meshes already packed by a streaming export, and the buffer partition
+
+    return gltf and the bytes of each gltf.buffers
+    '''
+    if not profiler:
+        profiler = Profiler()
+    if not packer:
+        packer = MeshPacker(profiler)
+    buffer = packer.buffer
+    material_store = packer.material_store
+
+    # a streamed mesh built the table of its skin when it was packed, its JOINTS_0 index that table.
+    # the others are built here, after the hierarchy is final
+    skin_tables = {skin: packer.get_skin_table(skin) for skin in self.skins}
+    node_map = {node: i for i, node in enumerate(self.nodes)}
+    # joints are kept by every pass, see prune.get_joints
+    assert all(joint in node_map for table in skin_tables.values() for joint in table.joints)
+    skin_map = {skin: i for i, skin in enumerate(self.skins)}
+
+    mesh_skin_map: Dict[Mesh, Skin] = {
+        node.mesh: node.skin for node in self.nodes if node.mesh and node.skin}
+
+    for mesh in self.meshes:
+        packer.pack_mesh(mesh, mesh_skin_map.get(mesh))
+    meshes = packer.meshes
+
+    local_matrices = transform.get_local_matrices(self.nodes)
+    trs = transform.decompose(local_matrices)
+    # the local matrix under a singular parent is not unique, written as is
+    exact = trs.exact & ~transform.is_singular(transform.get_parent_world_matrices(self.nodes))
+
+    def to_gltf_node(i: int, node: Node):
+        translation: Optional[Tuple[float, float, float]] = None
+        rotation: Optional[Tuple[float, float, float, float]] = None
+        scale: Optional[Tuple[float, float, float]] = None
+        matrix: Optional[List[float]] = None
+        if exact[i]:
+            translation = tuple(trs.translation[i].tolist())  # type: ignore
+            if not np.allclose(trs.rotation[i], (0, 0, 0, 1)):
+                rotation = tuple(trs.rotation[i].tolist())  # type: ignore
+            if not np.allclose(trs.scale[i], (1, 1, 1)):
+                scale = tuple(trs.scale[i].tolist())  # type: ignore
+        else:
+            matrix = local_matrices[i].T.ravel().tolist()
+
+        extensions = None
+        if node.instances is not None:
+            extensions = gltf.GLTFNodeExtensions(
+                EXT_mesh_gpu_instancing=to_instancing(node, buffer))
 
-    def to_gltf_node(node: Node):
-        p = node.get_local_position()
         return gltf.GLTFNode(
             name=node.name,
-            children=[self.nodes.index(child) for child in node.children],
-            translation=(p.x, p.y, p.z),
-            mesh=self.mesh_stores.index(node.mesh) if node.mesh else None,
-            skin=self.skins.index(node.skin) if node.skin else None
+            children=[node_map[child] for child in node.children],
+            translation=translation,
+            rotation=rotation,
+            scale=scale,
+            matrix=matrix,
+            mesh=packer.mesh_map[node.mesh] if node.mesh else None,
+            skin=skin_map[node.skin] if node.skin else None,
+            extensions=extensions
         )
 
     def to_gltf_skin(skin: Skin):
-        joints = [joint for joint in skin.root.traverse()]
+        table = skin_tables[skin]
 
-        matrices = (Matrix4 * len(joints))()
-        for i, _ in enumerate(joints):
-            p = joints[i].position
-            matrices[i] = Matrix4.translation(-p.x, -p.y, -p.z)
-        matrix_index = buffer.push_bytes(f'{skin.root.name}.inverseBindMatrices',
-                                         memoryview(matrices))  # type: ignore
+        # the bind pose is the current pose. column major
+        matrices = transform.invert_affine(
+            transform.get_world_matrices(table.joints)).transpose(0, 2, 1)
+        matrix_index = buffer.push_array(f'{skin.root.name}.inverseBindMatrices',
+                                         matrices.astype(np.float32))
 
         return gltf.GLTFSkin(
             name=skin.root.name,
             inverseBindMatrices=matrix_index,
-            skeleton=self.nodes.index(skin.root),
-            joints=[self.nodes.index(joint) for joint in joints]
+            skeleton=node_map[skin.root],
+            joints=table.get_node_indices(node_map).tolist()
         )
 
     scene = gltf.GLTFScene(
         name='scene',
-        nodes=[self.nodes.index(node) for node in self.root_nodes]
+        nodes=[node_map[node] for node in self.root_nodes]
     )
 
-    nodes = [to_gltf_node(node) for node in self.nodes]
+    nodes = [to_gltf_node(i, node) for i, node in enumerate(self.nodes)]
     skins = [to_gltf_skin(skin) for skin in self.skins]
+    morph_nodes = [node for node in self.nodes if node.morph_animation and node.mesh]
+    animations = [to_morph_animation(morph_nodes, node_map, buffer)] if morph_nodes else []
+
+    # no fallback for clients without the extension
+    extensions = ['EXT_mesh_gpu_instancing'] if any(node.instances is not None for node in self.nodes) else []
 
-    uri: Optional[str] = str(bin_path.relative_to(
-        gltf_path.parent)) if bin_path else None
+    buffers = buffer.compact()
     gltf_root = gltf.GLTF(
-        buffers=[gltf.GLTFBUffer(uri, len(buffer.buffer.data))],
+        extensionsUsed=extensions,
+        extensionsRequired=extensions,
+        buffers=[gltf.GLTFBUffer(get_buffer_uri(gltf_path, bin_path, i), len(b.data))
+                 for i, b in enumerate(buffers)],
         bufferViews=buffer.views,
         images=material_store.images,
         samplers=material_store.samplers,
@@ -157,7 +388,8 @@ def to_gltf(self: GLTFBuilder, gltf_path: pathlib.Path, bin_path: Optional[pathl
         meshes=meshes,
         nodes=nodes,
         scenes=[scene],
-        skins=skins
+        skins=skins,
+        animations=animations
     )
 
-    return gltf_root, buffer.buffer.data
+    return gltf_root, [b.data for b in buffers]
@@ -0,0 +1,258 @@
+'''
+batched 4x4 transforms. column vectors, m @ v.
+'''
+from typing import List, Dict, NamedTuple
+import numpy as np
+
+from .scene import Scene, Node, Mesh, Submesh
+
+
+# blender z-up to gltf y-up. (x, y, z) => (x, z, -y)
+Z_UP_TO_Y_UP = np.array([
+    [1, 0, 0, 0],
+    [0, 0, 1, 0],
+    [0, -1, 0, 0],
+    [0, 0, 0, 1],
+], dtype=np.float64)
+# relative determinant below this is singular, see is_singular
+SINGULAR_EPSILON = 1e-9
+
+
+def matrix_from_z_up(m: np.ndarray)->np.ndarray:
+    return Z_UP_TO_Y_UP @ m @ Z_UP_TO_Y_UP.T
+
+
+def translation_matrix(position: np.ndarray)->np.ndarray:
+    m = np.identity(4, dtype=np.float64)
+    m[:3, 3] = position
+    return m
+
+
+def get_world_matrices(nodes: List[Node])->np.ndarray:
+    '''
+    (node count, 4, 4)
+    '''
+    if not nodes:
+        return np.zeros((0, 4, 4), dtype=np.float64)
+    return np.array([node.matrix for node in nodes], dtype=np.float64)
+
+
+def is_singular(m: np.ndarray)->np.ndarray:
+    '''
+    m: (n, 4, 4)
+    return: (n,) bool. the 3x3 part is not invertible, a zero scale or a flattened axis.
+    the determinant relative to the column lengths, independent of the scale
+    '''
+    linear = m[:, :3, :3]
+    det = np.abs(np.linalg.det(linear))
+    return det <= SINGULAR_EPSILON * np.prod(np.linalg.norm(linear, axis=1), axis=1)
+
+
+def invert_affine(m: np.ndarray)->np.ndarray:
+    '''
+    m: (n, 4, 4) with the last row (0, 0, 0, 1)
+    inverse of the 3x3 part and -inverse @ translation, in one batch.
+    a singular 3x3 part takes the pseudo inverse
+    '''
+    inverse = np.zeros_like(m)
+    singular = is_singular(m)
+    linear = np.empty_like(m[:, :3, :3])
+    linear[~singular] = np.linalg.inv(m[~singular, :3, :3])
+    if singular.any():
+        linear[singular] = np.linalg.pinv(m[singular, :3, :3])
+    inverse[:, :3, :3] = linear
+    inverse[:, :3, 3] = -(linear @ m[:, :3, 3, None])[:, :, 0]
+    inverse[:, 3, 3] = 1
+    return inverse
+
+
+def get_parent_world_matrices(nodes: List[Node])->np.ndarray:
+    '''
+    (node count, 4, 4). identity for root nodes
+    '''
+    if not nodes:
+        return np.zeros((0, 4, 4), dtype=np.float64)
+    return np.array([node.parent.matrix if node.parent else np.identity(4)
+                     for node in nodes], dtype=np.float64)
+
+
+def get_local_matrices(nodes: List[Node])->np.ndarray:
+    '''
+    inverse(parent world) @ world for all nodes in one batch.
+    under a singular parent(zero scale) the pseudo inverse, see invert_affine
+    (node count, 4, 4)
+    '''
+    world = get_world_matrices(nodes)
+    if not nodes:
+        return world
+    return invert_affine(get_parent_world_matrices(nodes)) @ world
+
+
+def quaternion_from_rotation(r: np.ndarray)->np.ndarray:
+    '''
+    r: (n, 3, 3) orthonormal
+    return: (n, 4) x, y, z, w
+    '''
+    m00 = r[:, 0, 0]
+    m11 = r[:, 1, 1]
+    m22 = r[:, 2, 2]
+    q = np.empty((len(r), 4), dtype=np.float64)
+    q[:, 3] = np.sqrt(np.maximum(0, 1 + m00 + m11 + m22)) * 0.5
+    q[:, 0] = np.copysign(np.sqrt(np.maximum(0, 1 + m00 - m11 - m22)) * 0.5, r[:, 2, 1] - r[:, 1, 2])
+    q[:, 1] = np.copysign(np.sqrt(np.maximum(0, 1 - m00 + m11 - m22)) * 0.5, r[:, 0, 2] - r[:, 2, 0])
+    q[:, 2] = np.copysign(np.sqrt(np.maximum(0, 1 - m00 - m11 + m22)) * 0.5, r[:, 1, 0] - r[:, 0, 1])
+    return q / np.linalg.norm(q, axis=1, keepdims=True)
+
+
+def rotation_from_quaternion(q: np.ndarray)->np.ndarray:
+    '''
+    q: (n, 4) x, y, z, w
+    return: (n, 3, 3)
+    '''
+    x, y, z, w = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    r = np.empty((len(q), 3, 3), dtype=np.float64)
+    r[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    r[:, 0, 1] = 2 * (x * y - z * w)
+    r[:, 0, 2] = 2 * (x * z + y * w)
+    r[:, 1, 0] = 2 * (x * y + z * w)
+    r[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    r[:, 1, 2] = 2 * (y * z - x * w)
+    r[:, 2, 0] = 2 * (x * z - y * w)
+    r[:, 2, 1] = 2 * (y * z + x * w)
+    r[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    return r
+
+
+class TRS(NamedTuple):
+    translation: np.ndarray  # (n, 3)
+    rotation: np.ndarray  # (n, 4) x, y, z, w
+    scale: np.ndarray  # (n, 3)
+    # False if the matrix has shear or projection and can not be written as TRS
+    exact: np.ndarray  # (n,) bool
+
+
+def decompose(m: np.ndarray, tolerance: float=1e-5)->TRS:
+    '''
+    m: (n, 4, 4)
+    '''
+    translation = m[:, :3, 3]
+    linear = m[:, :3, :3]
+    scale = np.linalg.norm(linear, axis=1)
+    # mirror
+    scale[np.linalg.det(linear) < 0, 0] *= -1
+    safe_scale = np.where(scale == 0, 1, scale)
+    rotation = quaternion_from_rotation(linear / safe_scale[:, np.newaxis, :])
+
+    recomposed = rotation_from_quaternion(rotation) * scale[:, np.newaxis, :]
+    exact = np.all(np.abs(recomposed - linear) <= tolerance * np.maximum(1, np.abs(linear)), axis=(1, 2)) & \
+        np.all(np.abs(m[:, 3, :] - (0, 0, 0, 1)) <= tolerance, axis=1)
+    return TRS(translation, rotation, scale, exact)
+
+
+def transform_points(m: np.ndarray, points: np.ndarray)->np.ndarray:
+    '''
+    m: (4, 4) or (n, 4, 4) per point
+    points: (n, 3)
+    '''
+    if m.ndim == 2:
+        return (points @ m[:3, :3].T + m[:3, 3]).astype(points.dtype)
+    return (np.einsum('nij,nj->ni', m[:, :3, :3], points) + m[:, :3, 3]).astype(points.dtype)
+
+
+def transform_normals(m: np.ndarray, normals: np.ndarray)->np.ndarray:
+    '''
+    m: (4, 4) or (n, 4, 4) per normal. normals are transformed by inverse transpose and normalized
+    normals: (n, 3)
+
+    the inverse transpose is the cofactor matrix / det. the cofactor matrix with the sign of det
+    gives the same direction and is defined for a zero scale, the normal of a flattened mesh
+    '''
+    linear = m[..., :3, :3].astype(np.float64)
+    x = linear[..., :, 0]
+    y = linear[..., :, 1]
+    z = linear[..., :, 2]
+    # columns of the cofactor matrix
+    yz = np.cross(y, z)
+    zx = np.cross(z, x)
+    xy = np.cross(x, y)
+    sign = np.where(np.einsum('...i,...i->...', x, yz) < 0, -1.0, 1.0)[..., None]
+    n = (yz * normals[:, 0:1] + zx * normals[:, 1:2] + xy * normals[:, 2:3]) * sign
+    length = np.linalg.norm(n, axis=1, keepdims=True)
+    return (n / np.where(length == 0, 1, length)).astype(normals.dtype)
+
+
+def is_mirrored(m: np.ndarray)->np.ndarray:
+    '''
+    m: (n, 4, 4)
+    return: (n,) bool. negative determinant, the triangle winding flips
+    '''
+    return np.linalg.det(m[:, :3, :3]) < 0
+
+
+def reverse_winding(indices: np.ndarray)->np.ndarray:
+    '''
+    indices: (triangle count * 3,). (a, b, c) => (c, b, a)
+    '''
+    return indices.reshape(-1, 3)[:, ::-1].ravel()
+
+
+def is_bakeable(node: Node)->bool:
+    '''
+    a static mesh without skin or instances
+    '''
+    if not node.mesh or node.skin or node.mesh.joints is not None:
+        return False
+    if node.instances is not None:
+        return False
+    current = node
+    while current:
+        if current.animated:
+            return False
+        current = current.parent
+    return True
+
+
+def apply_transforms(scene: Scene)->int:
+    '''
+    bake the world matrix of static, non-skinned mesh nodes into their vertices
+    and reset the node to identity.
+
+    return the baked node count
+    '''
+    nodes = [node for node in scene.nodes if is_bakeable(node)]
+    if not nodes:
+        return 0
+
+    # a mesh shared by nodes is copied for each node
+    users: Dict[Mesh, int] = {}
+    for node in scene.nodes:
+        if node.mesh:
+            users[node.mesh] = users.get(node.mesh, 0) + 1
+
+    meshes = [node.mesh for node in nodes]
+    vertex_counts = np.array([mesh.vertex_count for mesh in meshes])  # type: ignore
+    matrices = get_world_matrices(nodes)
+    mirrored = is_mirrored(matrices)
+    per_vertex = np.repeat(matrices, vertex_counts, axis=0)
+    positions = transform_points(per_vertex, np.concatenate([mesh.positions for mesh in meshes]))  # type: ignore
+    normals = transform_normals(per_vertex, np.concatenate([mesh.normals for mesh in meshes]))  # type: ignore
+    splits = np.cumsum(vertex_counts)[:-1]
+
+    for node, mesh, p, n, flip in zip(nodes, meshes, np.split(positions, splits), np.split(normals, splits),
+                                      mirrored.tolist()):
+        if users[mesh] > 1:
+            users[mesh] -= 1
+            baked = Mesh(mesh.name, p, n, mesh.uvs, [Submesh(s.indices, s.material)  # type: ignore
+                                                     for s in mesh.submeshes])  # type: ignore
+            scene.meshes.append(baked)
+            node.mesh = baked
+        else:
+            mesh.positions = p  # type: ignore
+            mesh.normals = n  # type: ignore
+        if flip:
+            # a mirrored matrix turns the faces inside out
+            for submesh in node.mesh.submeshes:  # type: ignore
+                submesh.indices = reverse_winding(submesh.indices)
+        node.matrix = np.identity(4, dtype=np.float64)
+
+    return len(nodes)
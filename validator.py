@@ -0,0 +1,257 @@
+'''
+validate exported gltf with numpy reductions.
+
+    violations = validate_file(path)
+    violations = validate(GLTFData(path, gltf, [np.frombuffer(b, dtype=np.uint8) for b in buffers]))
+'''
+import json
+import pathlib
+from enum import Enum
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+
+from . import gltf
+from .reader import GLTFData, read, component_dtype, ELEMENT_COUNT
+
+
+class Severity(Enum):
+    ERROR = 'ERROR'
+    WARNING = 'WARNING'
+
+
+class Violation(NamedTuple):
+    severity: Severity
+    code: str
+    # json pointer like path. accessors[3]
+    path: str
+    message: str
+
+    def to_dict(self)->Dict[str, Any]:
+        return {
+            'severity': self.severity.value,
+            'code': self.code,
+            'path': self.path,
+            'message': self.message,
+        }
+
+
+# relative tolerance of accessor min/max and weight sums
+TOLERANCE = 1e-4
+WEIGHT_TOLERANCE = 2e-3
+
+
+class Validator:
+    def __init__(self, data: GLTFData)->None:
+        self.data = data
+        self.gltf = data.gltf
+        self.violations: List[Violation] = []
+        # accessor index => array. None if the accessor itself is invalid
+        self.arrays: Dict[int, Optional[np.ndarray]] = {}
+
+    def error(self, code: str, path: str, message: str):
+        self.violations.append(Violation(Severity.ERROR, code, path, message))
+
+    def warning(self, code: str, path: str, message: str):
+        self.violations.append(Violation(Severity.WARNING, code, path, message))
+
+    def check_index(self, path: str, index: Optional[int], items: List[Any], name: str)->bool:
+        if index is None:
+            return False
+        if index < 0 or index >= len(items):
+            self.error('INVALID_INDEX', path, f'{name} {index} out of range({len(items)})')
+            return False
+        return True
+
+    def validate_buffer_views(self):
+        for i, view in enumerate(self.gltf.bufferViews):
+            path = f'bufferViews[{i}]'
+            buffer = view.buffer if view.buffer else 0
+            if not self.check_index(path, buffer, self.data.buffers, 'buffer'):
+                continue
+            length = len(self.data.buffers[buffer])
+            if view.byteOffset + view.byteLength > length:
+                self.error('BUFFER_VIEW_TOO_LONG', path,
+                           f'byteOffset {view.byteOffset} + byteLength {view.byteLength} > buffer length {length}')
+            if view.byteStride is not None and (view.byteStride < 4 or view.byteStride > 252 or view.byteStride % 4):
+                self.error('INVALID_BYTE_STRIDE', path, f'byteStride {view.byteStride}')
+
+    def validate_accessor(self, i: int)->Optional[np.ndarray]:
+        if i in self.arrays:
+            return self.arrays[i]
+        self.arrays[i] = None
+
+        accessor = self.gltf.accessors[i]
+        path = f'accessors[{i}]'
+        if accessor.bufferView is None:
+            return None
+        if not self.check_index(path, accessor.bufferView, self.gltf.bufferViews, 'bufferView'):
+            return None
+        view = self.gltf.bufferViews[accessor.bufferView]
+        dtype = component_dtype(accessor.componentType)
+        element_size = dtype.itemsize * ELEMENT_COUNT[accessor.type]
+        byte_offset = accessor.byteOffset or 0
+
+        if byte_offset % dtype.itemsize or (view.byteOffset + byte_offset) % dtype.itemsize:
+            self.error('MISALIGNED_OFFSET', path,
+                       f'byteOffset {view.byteOffset} + {byte_offset} is not a multiple of {dtype.itemsize}')
+            return None
+        stride = view.byteStride if view.byteStride else element_size
+        if stride < element_size:
+            self.error('INVALID_BYTE_STRIDE', path, f'byteStride {stride} < element size {element_size}')
+            return None
+        end = byte_offset + stride * (accessor.count - 1) + element_size if accessor.count else 0
+        if end > view.byteLength:
+            self.error('ACCESSOR_TOO_LONG', path, f'accessor ends at {end} > bufferView byteLength {view.byteLength}')
+            return None
+        buffer = view.buffer if view.buffer else 0
+        if buffer >= len(self.data.buffers) or view.byteOffset + view.byteLength > len(self.data.buffers[buffer]):
+            # reported by validate_buffer_views
+            return None
+
+        values = self.data.accessor(i)
+        self.arrays[i] = values
+        if accessor.componentType == gltf.GLTFAccessorComponentType.FLOAT and len(values):
+            if not np.isfinite(values).all():
+                self.error('NOT_FINITE', path, 'contains NaN or infinity')
+                return values
+        self.validate_min_max(path, accessor, values)
+        return values
+
+    def validate_min_max(self, path: str, accessor: gltf.GLTFAccessor, values: np.ndarray):
+        if accessor.min is None and accessor.max is None:
+            return
+        if not len(values):
+            return
+        values_2d = values.reshape(len(values), -1)
+        for name, declared, actual in (('min', accessor.min, values_2d.min(axis=0)),
+                                       ('max', accessor.max, values_2d.max(axis=0))):
+            if declared is None:
+                continue
+            declared_array = np.array(declared, dtype=np.float64)
+            if declared_array.shape != actual.shape:
+                self.error('INVALID_MIN_MAX', path, f'{name} has {len(declared)} components')
+                continue
+            if not np.allclose(declared_array, actual, rtol=TOLERANCE, atol=TOLERANCE):
+                self.error('STALE_MIN_MAX', path, f'{name} {declared} != {actual.tolist()}')
+
+    def get_mesh_skins(self)->Dict[int, List[int]]:
+        '''
+        mesh index => skin indices of the nodes that use it
+        '''
+        mesh_skins: Dict[int, List[int]] = {}
+        for node in self.gltf.nodes:
+            if node.mesh is not None and node.skin is not None:
+                mesh_skins.setdefault(node.mesh, []).append(node.skin)
+        return mesh_skins
+
+    def validate_primitive(self, path: str, prim: gltf.GLTFMeshPrimitive, skins: List[int]):
+        vertex_count = None
+        for semantic, accessor_index in prim.attributes.items():
+            attribute_path = f'{path}.attributes.{semantic}'
+            if not self.check_index(attribute_path, accessor_index, self.gltf.accessors, 'accessor'):
+                continue
+            accessor = self.gltf.accessors[accessor_index]
+            values = self.validate_accessor(accessor_index)
+            if vertex_count is None:
+                vertex_count = accessor.count
+            elif accessor.count != vertex_count:
+                self.error('ATTRIBUTE_COUNT_MISMATCH', attribute_path,
+                           f'count {accessor.count} != {vertex_count}')
+            if values is None or not len(values):
+                continue
+
+            if semantic == 'POSITION' and (accessor.min is None or accessor.max is None):
+                self.error('POSITION_MIN_MAX_REQUIRED', attribute_path, 'POSITION requires min and max')
+            elif semantic == 'NORMAL':
+                length = np.linalg.norm(values, axis=1)
+                bad = np.count_nonzero(np.abs(length - 1) > WEIGHT_TOLERANCE)
+                if bad:
+                    self.warning('NON_UNIT_NORMAL', attribute_path, f'{bad} normals are not unit length')
+            elif semantic.startswith('JOINTS_'):
+                if not skins:
+                    self.error('JOINTS_WITHOUT_SKIN', attribute_path, 'no node with skin uses this mesh')
+                    continue
+                max_joint = int(values.max())
+                for skin_index in skins:
+                    if 0 <= skin_index < len(self.gltf.skins):
+                        joint_count = len(self.gltf.skins[skin_index].joints)
+                        if max_joint >= joint_count:
+                            self.error('JOINT_OUT_OF_RANGE', attribute_path,
+                                       f'joint {max_joint} >= skins[{skin_index}] joint count {joint_count}')
+            elif semantic == 'WEIGHTS_0':
+                weights = values.astype(np.float64)
+                if accessor.componentType != gltf.GLTFAccessorComponentType.FLOAT:
+                    weights /= np.iinfo(values.dtype).max
+                if (weights < 0).any():
+                    self.error('NEGATIVE_WEIGHT', attribute_path, 'contains negative weights')
+                total = weights.sum(axis=1)
+                if 'WEIGHTS_1' in prim.attributes:
+                    continue
+                bad = np.count_nonzero(np.abs(total - 1) > WEIGHT_TOLERANCE)
+                if bad:
+                    self.error('NON_NORMALIZED_WEIGHTS', attribute_path,
+                               f'{bad} vertices have weight sums other than 1')
+
+        if prim.indices is None or vertex_count is None:
+            return
+        indices_path = f'{path}.indices'
+        if not self.check_index(indices_path, prim.indices, self.gltf.accessors, 'accessor'):
+            return
+        indices = self.validate_accessor(prim.indices)
+        if indices is None or not len(indices):
+            return
+        max_index = int(indices.max())
+        if max_index >= vertex_count:
+            self.error('INDEX_OUT_OF_RANGE', indices_path, f'index {max_index} >= vertex count {vertex_count}')
+        if max_index == np.iinfo(indices.dtype).max:
+            self.error('PRIMITIVE_RESTART_INDEX', indices_path, f'index {max_index} is reserved')
+        mode = prim.mode if prim.mode else gltf.GLTFMeshPrimitiveTopology.TRIANGLES
+        if mode == gltf.GLTFMeshPrimitiveTopology.TRIANGLES and len(indices) % 3:
+            self.error('INVALID_INDEX_COUNT', indices_path, f'{len(indices)} is not a multiple of 3')
+
+    def validate_nodes(self):
+        for i, node in enumerate(self.gltf.nodes):
+            path = f'nodes[{i}]'
+            self.check_index(path, node.mesh, self.gltf.meshes, 'mesh')
+            self.check_index(path, node.skin, self.gltf.skins, 'skin')
+            for child in node.children:
+                self.check_index(path, child, self.gltf.nodes, 'child')
+        for i, skin in enumerate(self.gltf.skins):
+            path = f'skins[{i}]'
+            for joint in skin.joints:
+                self.check_index(path, joint, self.gltf.nodes, 'joint')
+            if self.check_index(path, skin.inverseBindMatrices, self.gltf.accessors, 'accessor'):
+                accessor = self.gltf.accessors[skin.inverseBindMatrices]
+                self.validate_accessor(skin.inverseBindMatrices)
+                if accessor.count < len(skin.joints):
+                    self.error('INVERSE_BIND_MATRICES_COUNT', path,
+                               f'{accessor.count} inverseBindMatrices < {len(skin.joints)} joints')
+        for i, image in enumerate(self.gltf.images):
+            self.check_index(f'images[{i}]', image.bufferView, self.gltf.bufferViews, 'bufferView')
+
+    def validate(self)->List[Violation]:
+        self.validate_buffer_views()
+        self.validate_nodes()
+        mesh_skins = self.get_mesh_skins()
+        for i, mesh in enumerate(self.gltf.meshes):
+            for j, prim in enumerate(mesh.primitives):
+                self.validate_primitive(f'meshes[{i}].primitives[{j}]', prim, mesh_skins.get(i, []))
+        for i in range(len(self.gltf.accessors)):
+            self.validate_accessor(i)
+        return self.violations
+
+
+def validate(data: GLTFData)->List[Violation]:
+    return Validator(data).validate()
+
+
+def validate_file(path: pathlib.Path)->List[Violation]:
+    return validate(read(path))
+
+
+def write_report(path: pathlib.Path, violations: List[Violation]):
+    path.write_text(json.dumps({
+        'errors': sum(1 for v in violations if v.severity == Severity.ERROR),
+        'warnings': sum(1 for v in violations if v.severity == Severity.WARNING),
+        'violations': [v.to_dict() for v in violations],
+    }, indent=2))
@@ -0,0 +1,65 @@
+import concurrent.futures
+import pathlib
+import struct
+import urllib.parse
+from typing import Optional, List
+from . import gltf
+from .profiler import Profiler
+from .sink import Sink, FileSink
+
+
+def write(path: pathlib.Path, gltf: gltf.GLTF, buffers: List[bytes],
+          profiler: Optional[Profiler]=None, sink: Optional[Sink]=None, canonical: bool=False):
+    '''
+    .gltf: write json to path and each buffer to its uri
+    .glb: write json and the first buffer(without uri) chunks to path, the others to their uri
+
+    sink: where the files go. files in path.parent by default
+    canonical: canonical json
+    '''
+    if not profiler:
+        profiler = Profiler()
+    if not sink:
+        sink = FileSink(path.parent)
+
+    with profiler.span('to_json') as span:
+        json_bytes = gltf.to_json(canonical).encode('utf-8')
+        span.counts['bytes'] = len(json_bytes)
+
+    with profiler.span('write', bytes=len(json_bytes) + sum(len(b) for b in buffers), buffers=len(buffers)):
+        _write(path, json_bytes, gltf, buffers, sink)
+
+
+def _write(path: pathlib.Path, json_bytes: bytes, gltf: gltf.GLTF, buffers: List[bytes], sink: Sink):
+    ext = path.suffix.lower()
+    if ext == '.gltf':
+        parts = [json_bytes]
+    elif ext == '.glb':
+        glb_bytes = buffers[0] if buffers and not gltf.buffers[0].uri else b''
+        parts = _glb_parts(json_bytes, glb_bytes)
+    else:
+        raise NotImplementedError()
+
+    files = [(path.name, parts)] + [(urllib.parse.unquote(b.uri), [data])
+                                    for b, data in zip(gltf.buffers, buffers) if b.uri]
+    if not sink.concurrent:
+        for name, file_parts in files:
+            sink.write(name, file_parts)
+        return
+
+    # file writes release the gil
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, len(files))) as executor:
+        futures = [executor.submit(sink.write, name, file_parts) for name, file_parts in files]
+        for future in futures:
+            future.result()
+
+
+def _glb_parts(json_bytes: bytes, bin_bytes: bytes)->List[bytes]:
+    if len(json_bytes)%4!=0:
+        json_padding_size = (4 - len(json_bytes) % 4)
+        json_bytes += b' ' * json_padding_size
+    json_header =  struct.pack(b'I', len(json_bytes)) + b'JSON'
+    bin_header = struct.pack(b'I', len(bin_bytes)) + b'BIN\x00'
+    header = b'glTF' + struct.pack('II', 2, 12+len(json_header)+len(json_bytes)+len(bin_header)+len(bin_bytes))
+    #
+    return [header, json_header, json_bytes, bin_header, bin_bytes]
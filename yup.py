@@ -1,62 +1,318 @@
+import concurrent.futures
+import contextlib
 import pathlib
+import threading
+from typing import Optional, List, Iterator, Tuple
 import bpy
-import struct
+import numpy as np
 from .gltfbuilder import GLTFBuilder
-from .to_gltf import to_gltf
+from .morph import MorphBake
+from .to_gltf import to_gltf, MeshPacker
+from .buffermanager import BufferManager
+from .writer import write
+from .sink import check_path, open_sink, FileSink, ManifestSink, read_manifest, write_manifest
+from .profiler import Profiler, Span
+from .scene import Scene, Image
+from .settings import ExportSettings
+from .transform import apply_transforms
+from .atlas import create_atlases
+from .resample import TextureBudget, apply_texture_budget
+from .merge import merge_meshes
+from .prune import remove_empty_nodes
+from .instancing import create_instances
+from .cleanup import clean_meshes
+from .reader import GLTFData
+from . import validator
+from . import sizereport
 
 
-def get_objects(selected_only: bool):
+def get_objects(selected_only: bool, sort: bool=False):
+    '''
+    sort: by name. selection and link order vary between runs
+    '''
     if selected_only:
-        return bpy.context.selected_objects
+        objects = list(bpy.context.selected_objects)
     else:
-        return [o for o in bpy.data.scenes[0].objects if not o.parent]
-
-
-def export(path: pathlib.Path, selected_only: bool):
-
-    # object mode
-    if bpy.context.mode != 'OBJECT':
-        bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
-
-    #
-    # gather items
-    #
-    builder = GLTFBuilder()
-    objects = get_objects(selected_only)
-    builder.export_objects(objects)
-
-    ext = path.suffix.lower()
-
-    #
-    # export
-    #
-    bin_path = path.parent / (path.stem + ".bin")
-    gltf, bin_bytes = to_gltf(builder, path, bin_path if ext!='.glb' else None)
-
-    #
-    # write
-    #
-    json_bytes = gltf.to_json().encode('utf-8')
-
-    if ext == '.gltf':
-        with path.open('wb') as f:
-            f.write(json_bytes)
-        with bin_path.open('wb') as f:
-            f.write(bin_bytes)
-    elif ext == '.glb':
-        with path.open('wb') as f:
-            if len(json_bytes)%4!=0:
-                json_padding_size = (4 - len(json_bytes) % 4)
-                print(f'add json_padding_size: {json_padding_size}')
-                json_bytes += b' ' * json_padding_size
-            json_header =  struct.pack(b'I', len(json_bytes)) + b'JSON'
-            bin_header = struct.pack(b'I', len(bin_bytes)) + b'BIN\x00'
-            header = b'glTF' + struct.pack('II', 2, 12+len(json_header)+len(json_bytes)+len(bin_header)+len(bin_bytes))
+        objects = [o for o in bpy.data.scenes[0].objects if not o.parent]
+    if sort:
+        objects.sort(key=lambda o: o.name)
+    return objects
+
+
+def skip_mesh_passes(settings: ExportSettings)->Tuple[ExportSettings, List[str]]:
+    '''
+    streamed meshes are already packed. passes that rewrite meshes or textures can not run
+
+    return (settings without them, the names of the skipped passes)
+    '''
+    skipped = [name for name in ('cleanup_geometry', 'texture_atlas', 'apply_transforms', 'merge_meshes')
+               if getattr(settings, name)]
+    if (settings.texture_max_size or settings.color_texture_max_size
+            or settings.normal_texture_max_size or settings.texture_power_of_two):
+        skipped.append('texture_budget')
+    return settings._replace(
+        cleanup_geometry=False, texture_atlas=False, apply_transforms=False, merge_meshes=False,
+        texture_max_size=0, color_texture_max_size=0, normal_texture_max_size=0,
+        texture_power_of_two=False), skipped
+
+
+def count_objects(objects: List[bpy.types.Object])->int:
+    return sum(1 + count_objects(o.children) for o in objects)
+
+
+def get_images(scene: Scene)->List[Image]:
+    images: List[Image] = []
+    for mesh in scene.meshes:
+        for submesh in mesh.submeshes:
+            material = submesh.material
+            if not material:
+                continue
+            for image in (material.color_texture, material.normal_texture):
+                if image and image not in images:
+                    images.append(image)
+    return images
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+# share of extract in ExportJob.progress
+EXTRACT_PROGRESS = 0.5
+
+
+class ExportJob:
+    '''
+    export in two phases.
+
+    extract: reads bpy on the main thread. a generator, so a modal operator can time slice it.
+    finish: bpy independent passes, texture encoding and writing. can run on a worker thread.
+
+        job = ExportJob(path, selected_only, settings)
+        for progress in job.extract():
+            pass
+        job.finish()
+    '''
+
+    def __init__(self, path: pathlib.Path, selected_only: bool, settings: Optional[ExportSettings]=None)->None:
+        self.path = path
+        self.selected_only = selected_only
+        self.settings = settings if settings else ExportSettings()
+        # an unsupported output fails before the extraction
+        check_path(path, self.settings.buffer_partition)
+        # streaming reports its peak memory
+        self.profiler = Profiler(self.settings.profile_memory or self.settings.stream_meshes)
+        self.packer = MeshPacker(self.profiler, BufferManager(
+            self.settings.buffer_partition, self.settings.buffer_max_size),
+            self.settings.chunk_max_triangles)
+        self.scene: Optional[Scene] = None
+        # 0 to 1
+        self.progress = 0.0
+        self.cancel_event = threading.Event()
+        # tracing and the export span, open from extract to finish
+        self.stack = contextlib.ExitStack()
+        self.span: Optional[Span] = None
+
+    def cancel(self):
+        '''
+        thread safe. extract or finish raises ExportCancelled at the next check
+        '''
+        self.cancel_event.set()
+
+    def check_cancel(self):
+        if self.cancel_event.is_set():
+            raise ExportCancelled()
+
+    def extract(self)->Iterator[float]:
+        '''
+        yield progress after each object
+        '''
+        self.stack.enter_context(self.profiler.tracing())
+        self.span = self.stack.enter_context(self.profiler.span('export', path=str(self.path)))
+        try:
+            # object mode
+            if bpy.context.mode != 'OBJECT':
+                bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
+
             #
-            f.write(header)
-            f.write(json_header)
-            f.write(json_bytes)
-            f.write(bin_header)
-            f.write(bin_bytes)
-    else:
-        raise NotImplementedError()
+            # gather items
+            #
+            bake = None
+            if self.settings.bake_deformation:
+                bake = MorphBake(self.settings.bake_frame_step, self.settings.morph_max_targets,
+                                 self.settings.morph_tolerance)
+            builder = GLTFBuilder(self.profiler, self.packer if self.settings.stream_meshes else None, bake,
+                                  sort_children=self.settings.deterministic)
+            objects = get_objects(self.selected_only, self.settings.deterministic)
+            total = max(1, count_objects(objects))
+            with contextlib.closing(builder.iter_export_objects(objects)) as steps:
+                for count in steps:
+                    self.check_cancel()
+                    self.progress = count / total * EXTRACT_PROGRESS
+                    yield self.progress
+            self.scene = builder.to_scene()
+        except BaseException:
+            self.stack.close()
+            raise
+
+    def finish(self):
+        '''
+        no bpy access after extract
+        '''
+        try:
+            self._finish()
+        finally:
+            self.stack.close()
+
+        if self.settings.profile:
+            self.profiler.write_report(self.path.parent / (self.path.stem + '.profile.json'))
+            if self.settings.profile_chrome_trace:
+                self.profiler.write_chrome_trace(self.path.parent / (self.path.stem + '.trace.json'))
+
+    def _finish(self):
+        path = self.path
+        settings = self.settings
+        profiler = self.profiler
+        packer = self.packer
+        scene = self.scene
+        assert scene
+
+        #
+        # optimize
+        #
+        if settings.stream_meshes:
+            with profiler.span('skip_mesh_passes') as span:
+                settings, skipped = skip_mesh_passes(settings)
+                span.counts['skipped'] = skipped
+
+        if settings.cleanup_geometry:
+            with profiler.span('cleanup_geometry', meshes=len(scene.meshes)) as span:
+                cleanup_result = clean_meshes(scene, settings.weld_tolerance)
+                span.counts['cleaned_meshes'] = cleanup_result.meshes
+                span.counts['welded_vertices'] = cleanup_result.welded_vertices
+                span.counts['degenerate_triangles'] = cleanup_result.degenerate_triangles
+                span.counts['duplicate_triangles'] = cleanup_result.duplicate_triangles
+                span.counts['unused_vertices'] = cleanup_result.unused_vertices
+
+        self.check_cancel()
+        budget = TextureBudget(
+            max_size=settings.texture_max_size,
+            color_max_size=settings.color_texture_max_size,
+            normal_max_size=settings.normal_texture_max_size,
+            power_of_two=settings.texture_power_of_two,
+            kernel=settings.texture_filter,
+        )
+        if budget.max_size or budget.color_max_size or budget.normal_max_size or budget.power_of_two:
+            with profiler.span('texture_budget') as span:
+                span.counts['resized'] = apply_texture_budget(scene, budget)
+
+        self.check_cancel()
+        if settings.texture_atlas:
+            with profiler.span('texture_atlas') as span:
+                atlas_result = create_atlases(
+                    scene, settings.atlas_size, settings.atlas_max_texture_size)
+                span.counts['images'] = atlas_result.images
+                span.counts['atlases'] = atlas_result.atlases
+                span.counts['materials'] = atlas_result.materials
+                span.counts['atlas_materials'] = atlas_result.atlas_materials
+
+        self.check_cancel()
+        if settings.gpu_instancing:
+            with profiler.span('gpu_instancing') as span:
+                instancing_result = create_instances(scene, settings.min_instances)
+                span.counts['instances'] = instancing_result.instances
+                span.counts['instance_nodes'] = instancing_result.instance_nodes
+                span.counts['removed_nodes'] = instancing_result.removed_nodes
+
+        self.check_cancel()
+        if settings.apply_transforms:
+            with profiler.span('apply_transforms') as span:
+                span.counts['nodes'] = apply_transforms(scene)
+
+        self.check_cancel()
+        if settings.merge_meshes:
+            with profiler.span('merge_meshes') as span:
+                result = merge_meshes(scene, settings.merge_max_vertices)
+                span.counts['nodes'] = result.nodes
+                span.counts['primitives'] = result.primitives
+                span.counts['merged_primitives'] = result.merged_primitives
+
+        self.check_cancel()
+        if settings.remove_empty_nodes:
+            with profiler.span('remove_empty_nodes', nodes=len(scene.nodes)) as span:
+                span.counts['removed'] = remove_empty_nodes(scene)
+
+        self.progress = 0.6
+
+        #
+        # export
+        #
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            packer.material_store.encode_textures(get_images(scene), executor, self.check_cancel)
+        self.progress = 0.75
+
+        self.check_cancel()
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            # path may be a bundle or a compressed file. gltf_path is the gltf in it
+            sink, gltf_path = open_sink(path, executor, settings.deterministic, settings.buffer_partition)
+            manifest_path = gltf_path.parent / (gltf_path.stem + '.manifest.json')
+            manifest = None
+            if settings.deterministic:
+                # unchanged files are skipped only where they are written as named
+                manifest = ManifestSink(sink, path.parent if isinstance(sink, FileSink) else None,
+                                        read_manifest(manifest_path))
+                sink = manifest
+            try:
+                ext = gltf_path.suffix.lower()
+                bin_path = gltf_path.parent / (gltf_path.stem + ".bin")
+                with profiler.span('to_gltf') as span:
+                    gltf, buffers = to_gltf(scene, gltf_path, bin_path if ext!='.glb' else None, profiler, packer)
+                    span.counts['bytes'] = sum(len(b) for b in buffers)
+                    span.counts['buffers'] = len(buffers)
+
+                self.progress = 0.85
+
+                #
+                # write
+                #
+                self.check_cancel()
+                write(gltf_path, gltf, buffers, profiler, sink, settings.deterministic)
+                with profiler.span('close_sink'):
+                    sink.close()
+            except BaseException:
+                # no truncated bundle is left behind
+                sink.abort()
+                raise
+        if manifest:
+            with profiler.span('write_manifest', files=len(manifest.files)) as span:
+                span.counts['skipped'] = len(manifest.skipped)
+                span.counts['skipped_files'] = manifest.skipped
+                write_manifest(manifest_path, manifest.files)
+        self.progress = 0.95
+
+        if settings.validate:
+            with profiler.span('validate') as span:
+                data = GLTFData(gltf_path, gltf, [np.frombuffer(b, dtype=np.uint8) for b in buffers])
+                violations = validator.validate(data)
+                span.counts['violations'] = len(violations)
+            for v in violations:
+                print(f'{v.severity.value}: {v.path}: {v.code}: {v.message}')
+            validator.write_report(gltf_path.parent / (gltf_path.stem + '.validation.json'), violations)
+
+        if settings.size_report:
+            with profiler.span('size_report') as span:
+                report = sizereport.build_size_report(
+                    gltf, buffers, len(gltf.to_json(settings.deterministic).encode('utf-8')))
+                span.counts.update(sizereport.summary_counts(report))
+            sizereport.write_report(gltf_path.parent / (gltf_path.stem + '.size.json'), report)
+        self.progress = 1.0
+
+
+def export(path: pathlib.Path, selected_only: bool, settings: Optional[ExportSettings]=None):
+    '''
+    blocking export
+    '''
+    job = ExportJob(path, selected_only, settings)
+    for _ in job.extract():
+        pass
+    job.finish()